@@ -389,6 +389,7 @@ class MultiTestRunAggregator:
             "videoStartTime": "мс",
             "playerInitTime": "мс",
             "popupAppearTime": "мс",
+            "popupAppearWallTime": "мс",
             "iframeCpLoadTime": "мс",
             "lcp": "мс",
             "ttfb": "мс",
@@ -400,12 +401,39 @@ class MultiTestRunAggregator:
             "rebufferDuration": "мс",
             "viduPopupAppearTime": "мс",
             "retryPaymentLoadTime": "мс",
+            "criticalPathTime": "мс",
+            "networkQuietWaitTime": "мс",
+            "payFormNetworkQuietWaitTime": "мс",
+            "timeToFirstFrame": "мс",
+            "firstFrameAfterPlay": "мс",
+            "qoeAvgSegmentLoadTime": "мс",
+            "qoeManifestLoadTime": "мс",
+            "tlsTime": "мс",
+            "domContentLoadedTime": "мс",
+            "loadTime": "мс",
+            "loadTimeSaving": "мс",
             
             # Безразмерные метрики
             "cls": "",
             "performance_score": "",
             "pagePerformanceIndex": "",
             "rebufferCount": "",
+            "networkRequests": "",
+            "networkBytes": "байт",
+            "qoeSegmentsLoaded": "",
+            "qoeBitrateSwitches": "",
+            "qoeDroppedFrames": "",
+            "qoeErrors": "",
+            "qoeFatalErrors": "",
+            "qoeAvgThroughput": "кбит/с",
+            "qoeMinThroughput": "кбит/с",
+            "qoeAvgBitrate": "кбит/с",
+            "qoeLastBitrate": "кбит/с",
+            "qoeStallRatio": "%",
+            "qoeDroppedFramesRatio": "%",
+            "transferBytes": "байт",
+            "transferBytesSaving": "байт",
+            "cachedResources": "",
             
             # Процентные метрики
             "true_percentage": "%",
@@ -415,9 +443,10 @@ class MultiTestRunAggregator:
     def _get_metric_display_name(self, metric_name: str) -> str:
         """Возвращает человекочитаемое имя для метрики"""
         names = {
-            "videoStartTime": "Загрузка первого кадра видео",
+            "videoStartTime": "Готовность плеера",
             "playerInitTime": "Загрузка плеера",
             "popupAppearTime": "Появление формы блокировки",
+            "popupAppearWallTime": "Реальное ожидание формы блокировки",
             "iframeCpLoadTime": "Загрузка формы оплаты",
             "lcp": "Largest Contentful Paint",
             "ttfb": "Time to First Byte",
@@ -430,6 +459,26 @@ class MultiTestRunAggregator:
             "connectTime": "Connect Time",
             "rebufferCount": "Rebuffer Count",
             "rebufferDuration": "Rebuffer Duration",
+            "networkRequests": "Сетевых запросов",
+            "networkBytes": "Передано по сети",
+            "criticalPathTime": "Критический путь загрузки",
+            "networkQuietWaitTime": "Ожидание сетевой тишины",
+            "payFormNetworkQuietWaitTime": "Ожидание сетевой тишины перед формой оплаты",
+            "timeToFirstFrame": "Первый кадр от начала навигации",
+            "firstFrameAfterPlay": "Первый кадр после Play",
+            "qoeStallRatio": "Доля времени в буферизации",
+            "qoeSegmentsLoaded": "Загружено сегментов",
+            "qoeAvgSegmentLoadTime": "Загрузка сегмента (среднее)",
+            "qoeAvgThroughput": "Пропускная способность (среднее)",
+            "qoeMinThroughput": "Пропускная способность (минимум)",
+            "qoeManifestLoadTime": "Загрузка манифеста",
+            "qoeBitrateSwitches": "Переключения качества",
+            "qoeAvgBitrate": "Средний битрейт",
+            "qoeLastBitrate": "Итоговый битрейт",
+            "qoeDroppedFrames": "Пропущенные кадры",
+            "qoeDroppedFramesRatio": "Доля пропущенных кадров",
+            "qoeErrors": "Ошибки hls.js",
+            "qoeFatalErrors": "Фатальные ошибки hls.js",
             "popupAvailable": "Доступность попапа",
             "popupClickSuccess": "Успешность клика по попапу",
             "buttonsCpAvailable": "Доступность кнопок оплаты",
@@ -438,13 +487,20 @@ class MultiTestRunAggregator:
             "viduPopupSuccess": "Успешность попапа Vidu",
             "retryPaymentSuccess": "Успешность повторной оплаты",
             "is_problematic_page": "Проблемная страница",
+            "tlsTime": "TLS Time",
+            "domContentLoadedTime": "DOMContentLoaded",
+            "loadTime": "Событие load",
+            "transferBytes": "Передано (Resource Timing)",
+            "cachedResources": "Ресурсов из кэша",
+            "loadTimeSaving": "Выигрыш повторного визита (load)",
+            "transferBytesSaving": "Сэкономлено трафика при повторном визите",
         }
         return names.get(metric_name, metric_name)
     
     def get_clustered_summaries(self, test_name: str, cluster_by: list = None) -> dict:
         """Возвращает сводки, сгруппированные по указанным параметрам"""
         if cluster_by is None:
-            cluster_by = ["device", "throttling", "geoposition", "browser_type"]
+            cluster_by = ["device", "throttling", "geoposition", "browser_type", "start_mode"]
         
         cache_key = f"{test_name}_{'_'.join(sorted(cluster_by))}"
         if cache_key in self.cluster_cache:
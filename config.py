@@ -10,6 +10,155 @@ BASE_URL = "https://calls7.com"
 # === Путь до хромиума, установить после установки версии с кодеками ===
 CHROMIUM_PATH = "/opt/chromium/chrome"
 
+# === Lighthouse ===
+LIGHTHOUSE_WORKERS = 2
+"""Количество параллельных аудитов Lighthouse в фоновой очереди"""
+
+LIGHTHOUSE_TIMEOUT_SEC = 60
+"""Таймаут одного аудита Lighthouse (сек)"""
+
+LIGHTHOUSE_RESULT_TIMEOUT_SEC = 120
+"""Сколько ждать результат аудита из очереди при финализации отчёта (сек)"""
+
+LIGHTHOUSE_DEVICE_PROFILES: Dict[str, dict] = {
+    "Desktop": {
+        "formFactor": "desktop",
+        "screenEmulation": {"mobile": False, "width": 1920, "height": 1080, "deviceScaleFactor": 1, "disabled": False},
+        "emulatedUserAgent": (
+            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+            "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+        ),
+        "cpuSlowdownMultiplier": 1,
+    },
+    "Mobile": {
+        # Соответствует Playwright-профилю "Pixel 5", который использует фикстура page
+        "formFactor": "mobile",
+        "screenEmulation": {"mobile": True, "width": 393, "height": 851, "deviceScaleFactor": 2.75, "disabled": False},
+        "cpuSlowdownMultiplier": 4,
+    },
+}
+"""Эмуляция устройства в Lighthouse для каждого значения DEVICES"""
+
+CDP_NETWORK_CONDITIONS: Dict[str, dict] = {
+    "Slow_4G": {
+        "offline": False,
+        "latency": 400,
+        "downloadThroughput": 700 * 1024,
+        "uploadThroughput": 700 * 1024,
+        "connectionType": "cellular4g",
+    },
+}
+"""Параметры Network.emulateNetworkConditions (CDP, только Chromium) для значений THROTTLING_MODES; режим без записи сеть не ограничивает"""
+
+LIGHTHOUSE_THROTTLING_PROFILES: Dict[str, dict] = {
+    "No_throttling": {"throttlingMethod": "provided"},
+    # Те же параметры, что CDP_NETWORK_CONDITIONS: 400 мс задержки, 700 КБ/с
+    "Slow_4G": {"throttlingMethod": "simulate", "rttMs": 400, "throughputKbps": 700 * 8},
+}
+"""Эмуляция сети в Lighthouse для каждого значения THROTTLING_MODES"""
+
+LIGHTHOUSE_ARTIFACTS_DIR = "reports/lighthouse"
+"""Каталог полных отчётов Lighthouse для проблемных страниц (gzip, имя по sha256)"""
+
+LIGHTHOUSE_CACHE_DIR = ".cache/lighthouse"
+"""Каталог дискового кэша результатов Lighthouse"""
+
+LIGHTHOUSE_CACHE_TTL_SEC = 6 * 60 * 60
+"""Время жизни записи кэша Lighthouse (сек). 0 — кэш отключён"""
+
+LIGHTHOUSE_CACHE_MAX_ENTRIES = 500
+"""Максимальное число записей в кэше Lighthouse (LRU)"""
+
+# === QoE ВИДЕО ===
+QOE_EVENT_BUFFER_SIZE = 500
+"""Размер кольцевого буфера событий движка QoE в странице"""
+
+FIRST_FRAME_TIMEOUT_MS = 30000
+"""Сколько ждать отрисовки первого кадра после старта воспроизведения, мс"""
+
+# === УСКОРЕННОЕ ПОЯВЛЕНИЕ ПОПАПА ===
+POPUP_FAST_FORWARD_MODES: List[str] = ["off", "clock", "playback"]
+"""Режимы ожидания попапа: реальное время, перемотка таймеров страницы, ускорение воспроизведения"""
+
+POPUP_FAST_FORWARD_STEP_MS = 1000
+"""Шаг перемотки таймеров страницы в режиме clock, мс (точность popupAppearTime)"""
+
+POPUP_FAST_FORWARD_MAX_MS = 120000
+"""Максимальное симулированное время ожидания попапа, мс"""
+
+POPUP_FAST_FORWARD_PLAYBACK_RATE = 16
+"""Скорость воспроизведения в режиме playback (максимум для Chromium — 16)"""
+
+# === КОНВЕЙЕР ШАГОВ ===
+STEP_TIMEOUTS_SEC: Dict[str, float] = {
+    "main_page": 60,
+    "film_page": 90,
+    "lighthouse_results": LIGHTHOUSE_RESULT_TIMEOUT_SEC * 2,
+    "video_start": 45,
+    "popup": 150,
+    "video_qoe": 15,
+    "pay_page": 30,
+    "pay_buttons": 60,
+    "pay_form": 60,
+    "after_payment_popup": 60,
+    "after_return_without_payment": 120,
+    "cache_cold": 90,
+    "cache_warm": 120,
+}
+"""Бюджет времени шагов конвейера сценария, сек"""
+
+# === СЕТЕВАЯ ТИШИНА ===
+NETWORK_QUIET_WINDOW_MS = 500
+"""Сколько миллисекунд подряд не должно быть учитываемых запросов"""
+
+NETWORK_QUIET_TIMEOUT_MS = 15000
+"""Максимальное ожидание сетевой тишины, мс"""
+
+NETWORK_QUIET_POLL_MS = 50
+"""Период проверки состояния сети, мс"""
+
+NETWORK_QUIET_LONG_POLL_MS = 10000
+"""Запрос, висящий дольше этого времени, считается long-poll и не учитывается, мс"""
+
+NETWORK_QUIET_IGNORE_RESOURCE_TYPES: List[str] = ["media", "websocket", "eventsource", "texttrack"]
+"""Типы ресурсов Playwright, не влияющие на сетевую тишину"""
+
+NETWORK_QUIET_IGNORE_PATTERNS: List[str] = [
+    r"\.m3u8(\?|$)",                                   # HLS-манифесты
+    r"\.(ts|m4s|m4a|m4v|aac|mp4|vtt)(\?|$)",           # медиасегменты и субтитры
+    r"/(long-?poll|poll|comet)\b",                     # long-poll
+    r"/(collect|beacon|pixel|track|events?)(\?|/|$)",  # маячки аналитики
+    r"google-analytics\.com|googletagmanager\.com|doubleclick\.net",
+    r"mc\.yandex\.(ru|com)|top-fwz1\.mail\.ru|vk\.com/rtrg",
+]
+"""Шаблоны URL (регулярные выражения), не влияющие на сетевую тишину"""
+
+# === АДАПТИВНЫЕ ТАЙМАУТЫ ===
+ADAPTIVE_TIMEOUTS_FILE = ".cache/latency/sketches.json"
+"""Файл с историей задержек ожиданий (скетчи по домену, ожиданию, устройству и сети)"""
+
+LATENCY_SKETCH_ACCURACY = 0.01
+"""Относительная точность квантилей скетча задержек"""
+
+ADAPTIVE_TIMEOUT_QUANTILE = 0.999
+"""Квантиль истории задержек, от которого считается таймаут"""
+
+ADAPTIVE_TIMEOUT_SAFETY_FACTOR = 1.5
+"""Запас: таймаут = квантиль × этот множитель"""
+
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 30
+"""Минимум успешных замеров, после которого таймаут становится адаптивным"""
+
+ADAPTIVE_TIMEOUT_MIN_MS = 2000
+"""Нижняя граница адаптивного таймаута, мс (сверху — исходный жёсткий таймаут)"""
+
+# === СНИМКИ СОСТОЯНИЯ (ТЁПЛЫЙ СТАРТ) ===
+STORAGE_STATE_DIR = ".cache/storage_state"
+"""Каталог снимков storage_state по домену и устройству"""
+
+STORAGE_STATE_TTL_SEC = 60 * 60
+"""Время жизни снимка состояния (сек); по истечении выполняется новый прогрев"""
+
 # === КОНФИГУРАЦИЯ СЕЛЕКТОРОВ ===
 SELECTORS: Dict[str, str] = {
     "film_card": "a[href*='/chernyy-zamok/']",
@@ -45,6 +194,7 @@ METRIC_WEIGHTS: Dict[str, float] = {
 # Пороговые значения метрик: (хорошее, плохое)
 METRIC_THRESHOLDS: Dict[str, Tuple[float, float]] = {
     "videoStartTime": (5000, 15000),
+    "firstFrameAfterPlay": (1000, 4000),
     "popupAppearTime": (30000, 90000),     
     "iframeCpLoadTime": (1000, 5000),     
     "playerInitTime": (1000, 5000),      
@@ -57,6 +207,9 @@ METRIC_THRESHOLDS: Dict[str, Tuple[float, float]] = {
     "pagePerformanceIndex": (85, 70),     
     "rebufferCount": (0, 3),              
     "rebufferDuration": (0, 5000),
+    "qoeStallRatio": (1, 5),
+    "qoeDroppedFramesRatio": (1, 5),
+    "qoeAvgSegmentLoadTime": (2000, 6000),
 }
 
 def grade_metric(value: float, metric_name: str) -> str:
@@ -111,6 +264,144 @@ BROWSERS: List[str] = ["chromium", "firefox", "webkit"]
 PAY_METHODS: List[str] = ["card", "sbp"]
 """Методы оплаты для тестирования"""
 
+START_MODES: List[str] = ["cold", "warm"]
+"""Режимы старта: cold — пустой контекст, warm — контекст из снимка storage_state"""
+
+# === ПЛАНИРОВАНИЕ МАТРИЦЫ ===
+MATRIX_DIMENSIONS: List[str] = ["device", "throttling", "geo", "browser_type", "pay_method", "start_mode", "get_film_url"]
+"""Параметры тестов, по которым строится покрывающий массив (--matrix-strength)"""
+
+MATRIX_MUST_COVER: List[Dict[str, str]] = [
+    {"device": "Desktop", "throttling": "No_throttling", "browser_type": "chromium", "pay_method": "card", "start_mode": "cold"},
+    {"device": "Mobile", "throttling": "Slow_4G", "browser_type": "chromium", "pay_method": "sbp", "start_mode": "cold"},
+]
+"""Комбинации, которые всегда входят в сокращённую матрицу (недостающие параметры подбираются планировщиком)"""
+
+# === ПОСЛЕДОВАТЕЛЬНАЯ ВЫБОРКА ФИЛЬМОВ ===
+SEQUENTIAL_KEY_METRICS: List[str] = ["film_page.videoStartTime", "film_page.playerInitTime"]
+"""Ключевые метрики (шаг.метрика), по которым оценивается точность кластера"""
+
+SEQUENTIAL_REL_TOLERANCE = 0.2
+"""Допустимая относительная ширина доверительного интервала (ширина / среднее)"""
+
+SEQUENTIAL_CONFIDENCE = 0.95
+"""Уровень доверия интервала"""
+
+SEQUENTIAL_MIN_SAMPLES = 10
+"""Минимум значений метрики в кластере до проверки остановки"""
+
+SEQUENTIAL_BATCH_SIZE = 5
+"""Через сколько фильмов кластера пересчитывается решение об остановке"""
+
+# === ИСТОРИЯ ПРОГОНОВ И ПЛАНИРОВЩИК ОЧЕРЕДИ ===
+RUN_HISTORY_FILE = ".cache/history/runs.json"
+"""Файл истории прогонов (статус, длительность и ключевые метрики по каждому тесту)"""
+
+RUN_HISTORY_MAX_RUNS = 20
+"""Сколько последних прогонов хранить для каждого теста"""
+
+SCHEDULER_RECENT_FAILURE_DAYS = 7
+"""Падение не старше этого числа дней поднимает тест в начало очереди"""
+
+SCHEDULER_STALE_DAYS = 3
+"""Тест, не запускавшийся столько дней, считается давно не проверенным"""
+
+SCHEDULER_REGRESSION_METRICS: List[str] = ["film_page.videoStartTime", "film_page.playerInitTime", "pay_page.iframeCpLoadTime"]
+"""Метрики (шаг.метрика), по которым ищутся регрессии"""
+
+SCHEDULER_REGRESSION_RATIO = 1.3
+"""Регрессия: последнее значение больше медианы предыдущих прогонов в это число раз"""
+
+SCHEDULER_DEFAULT_TEST_SEC = 180
+"""Оценка длительности теста без истории, если история пуста, сек"""
+
+# === HTTP БЕЗ БРАУЗЕРА ===
+HTTP_TIMEOUT_SEC = 30
+"""Таймаут одного HTTP-запроса асинхронного клиента, сек"""
+
+HTTP_MAX_CONNECTIONS_PER_HOST = 8
+"""Сколько keep-alive соединений с одним хостом держит пул асинхронного клиента"""
+
+HTTP_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+)
+"""User-Agent асинхронного клиента (как у браузерных контекстов тестов)"""
+
+CATALOG_CONCURRENCY = 8
+"""Сколько страниц каталога загружается параллельно при обходе без браузера"""
+
+CATALOG_RATE_LIMIT_RPS = 5.0
+"""Средняя частота запросов к каталогу, запросов в секунду"""
+
+CATALOG_RATE_BURST = 10
+"""Допустимый всплеск запросов к каталогу сверх средней частоты"""
+
+# === HTTP-ПРОБА ФИЛЬМОВ ===
+PROBE_HISTORY_FILE = ".cache/history/probes.json"
+"""История HTTP-проб фильмов (отдельно от браузерных прогонов, чтобы не искажать оценки длительности тестов)"""
+
+PROBE_CONCURRENCY = 16
+"""Сколько страниц фильмов проба загружает параллельно"""
+
+PROBE_RATE_LIMIT_RPS = 20.0
+"""Средняя частота запросов пробы, запросов в секунду"""
+
+PROBE_RATE_BURST = 20
+"""Допустимый всплеск запросов пробы сверх средней частоты"""
+
+PROBE_SLOW_TTFB_MS = 1500
+"""TTFB страницы фильма, начиная с которого проба считает фильм проблемным, мс"""
+
+PROBE_MIN_HTML_BYTES = 2048
+"""HTML страницы фильма меньше этого размера считается сломанной страницей (заглушка, пустой ответ), байт"""
+
+PROBE_REGRESSION_METRICS: List[str] = ["probe.ttfb", "probe.manifestTtfb"]
+"""Метрики пробы, рост которых относительно истории считается аномалией"""
+
+# === КАТАЛОГ ФИЛЬМОВ ===
+CATALOG_DIR = "data/catalogs"
+"""Каталоги фильмов по доменам (<домен>.json): стабильные ID, страницы листинга с ETag/Last-Modified"""
+
+CATALOG_FILE_NAMES: Dict[str, str] = {
+    "calls7.com": "films",
+    "tests.goodmovie.net": "goodmovie_films",
+}
+"""Имена файлов списка фильмов в data/ для доменов (остальные — <домен>_films)"""
+
+CATALOG_UNCHANGED_PAGES_STOP = 2
+"""Обновление каталога останавливается после стольких подряд страниц, совпавших со снимком (0 — обходить все)"""
+
+CATALOG_FULL_REFRESH_DAYS = 7
+"""Раз в столько дней каталог обходится полностью, без досрочной остановки"""
+
+SCHEDULER_NEW_FILM_DAYS = 7
+"""Фильмы, появившиеся в каталоге за столько дней, идут в очереди по истории первыми среди непроверенных"""
+
+# === ИНДЕКС АТРИБУТОВ ФИЛЬМОВ ===
+FILM_INDEX_FILE = ".cache/films/index.sqlite3"
+"""SQLite-индекс атрибутов фильмов (сценарий, плеер, длительность, вес страницы) для стратифицированной выборки"""
+
+FILM_WEIGHT_BUCKETS_KB = [1024, 3072, 8192]
+"""Границы корзин веса страницы фильма, КБ: 0 — до 1 МБ, 1 — 1–3 МБ, 2 — 3–8 МБ, 3 — больше"""
+
+FILM_DURATION_BUCKETS_SEC = [1800, 5400, 9000]
+"""Границы корзин длительности видео, сек: 0 — до 30 мин, 1 — до 1.5 ч, 2 — до 2.5 ч, 3 — длиннее"""
+
+FILM_SAMPLE_STRATA = ["scenario", "weight_bucket"]
+"""Атрибуты страт по умолчанию для --film-sample"""
+
+# === ЧЕКПОИНТЫ СЕССИИ ===
+CHECKPOINT_DIR = ".cache/checkpoints"
+"""Каталог чекпоинтов сессий (<session_id>.jsonl) для возобновления через --resume"""
+
+# === ШАРДИРОВАНИЕ ===
+SHARD_COST_STEP_SEC = 30
+"""Шаг округления оценки длительности теста при разбиении на шарды (устойчивость плана к мелким расхождениям истории), сек"""
+
+SHARD_HISTORY_FILE = ".cache/history/shard_runs.json"
+"""Общая история прогонов для --shard-history: куда merge объединяет истории шардов (файл раздаётся всем машинам)"""
+
 # === Отчёт ===
 REPORT_OUTPUT = "report.json"
 """Имя файла для сохранения отчетов по умолчанию"""
@@ -14,13 +14,33 @@ from collections import Counter, defaultdict, deque
 import statistics
 from typing import Dict, Any, Tuple, List, Optional
 import json
+import sqlite3
 from pathlib import Path
 import requests
 import config
+# Хуки сбора и их помощники получают pytest.Config в параметре config — нужные им константы импортируются по имени
 from config import (
-    DEVICES, THROTTLING_MODES, GEO_LOCATIONS, BROWSERS, PAY_METHODS, CHROMIUM_PATH
+    DEVICES, THROTTLING_MODES, GEO_LOCATIONS, BROWSERS, PAY_METHODS, START_MODES, CHROMIUM_PATH,
+    MATRIX_DIMENSIONS, MATRIX_MUST_COVER, SCHEDULER_NEW_FILM_DAYS, PROBE_HISTORY_FILE
 )
 import aggregator
+from utils.lighthouse_queue import LighthouseAuditQueue
+from utils.lighthouse_cache import LighthouseCache
+from utils.video_qoe import install_video_qoe
+from utils.network_quiescence import attach_network_quiescence
+from utils.adaptive_timeouts import AdaptiveTimeouts
+from utils.storage_state import StorageStateStore
+from utils.matrix_planner import covering_array
+from utils.sequential_sampler import SequentialSampler, stratified_order
+from utils.run_history import RunHistory, report_metrics
+from utils.scheduler import PriorityScheduler, TIER_NAMES, parse_duration
+from utils.checkpoint import CheckpointStore, RESUMED_STATUSES, new_session_id
+from utils.allure_units import report_unit_result
+from utils.sharding import assign_shards, parse_shard, plan_fingerprint
+from utils.film_stream import FilmStream, iter_film_urls
+from utils.film_catalog import recently_added_urls
+from utils.film_index import FilmIndex
+from utils.http_probe import probe_anomalies
 
 
 # === КОНФИГУРАЦИЯ ГЕОЛОКАЦИЙ ===
@@ -94,6 +114,136 @@ def pytest_addoption(parser: pytest.Parser) -> None:
         choices=PAY_METHODS,
         help="Метод оплаты для тестирования"    
     )
+    parser.addoption(
+        "--lighthouse-cache-ttl",
+        action="store",
+        type=int,
+        default=config.LIGHTHOUSE_CACHE_TTL_SEC,
+        help="Время жизни кэша результатов Lighthouse в секундах (0 — кэш отключён)"
+    )
+    parser.addoption(
+        "--film-batch-size",
+        action="store",
+        type=int,
+        default=1,
+        help="Сколько фильмов из --film-list проходить подряд в одном контексте (главная страница — один раз на пакет)"
+    )
+    parser.addoption(
+        "--film-stream",
+        action="store",
+        default="off",
+        choices=["on", "off"],
+        help="Потоковый режим для --film-list: один тест на конфигурацию, фильмы читаются по одному во время прогона"
+    )
+    parser.addoption(
+        "--popup-fast-forward",
+        action="store",
+        default="off",
+        choices=config.POPUP_FAST_FORWARD_MODES,
+        help="Ускорить появление попапа: clock — перемотка таймеров страницы, playback — ускорение видео"
+    )
+    parser.addoption(
+        "--adaptive-timeouts",
+        action="store",
+        default="on",
+        choices=["on", "off"],
+        help="Таймауты ожиданий по истории задержек (p99.9 × запас); off — только жёсткие таймауты"
+    )
+    parser.addoption(
+        "--start-mode",
+        action="store",
+        default="cold",
+        choices=START_MODES + ["both"],
+        help="Старт сценария: cold — пустой контекст, warm — из снимка storage_state без главной страницы, "
+             "both — оба режима отдельным измерением матрицы (только для классов с BASE_URL)"
+    )
+    parser.addoption(
+        "--cache-compare",
+        action="store",
+        default="off",
+        choices=["on", "off"],
+        help="Дополнительно замерить страницу фильма с холодным и тёплым кэшем в отдельных контекстах"
+    )
+    parser.addoption(
+        "--matrix-strength",
+        action="store",
+        type=int,
+        default=0,
+        help="Сила покрывающего массива по параметрам матрицы: 2 — pairwise, 3 — 3-wise, 0 — полная матрица"
+    )
+    parser.addoption(
+        "--matrix-seed",
+        action="store",
+        type=int,
+        default=0,
+        help="Зерно генератора для покрывающего массива (одинаковое зерно — одинаковый план)"
+    )
+    parser.addoption(
+        "--sequential-sampling",
+        action="store",
+        default="off",
+        choices=["on", "off"],
+        help="Для --film-list: стратифицированный случайный порядок фильмов и остановка кластера, когда оценка метрик устоялась"
+    )
+    parser.addoption(
+        "--sampling-seed",
+        action="store",
+        type=int,
+        default=0,
+        help="Зерно перемешивания фильмов при последовательной выборке"
+    )
+    parser.addoption(
+        "--schedule",
+        action="store",
+        default="file",
+        choices=["file", "history"],
+        help="Порядок тестов: file — как в списке, history — по истории прогонов (падения, давно не запускавшиеся, случайные)"
+    )
+    parser.addoption(
+        "--time-budget",
+        action="store",
+        type=parse_duration,
+        default=None,
+        help="Бюджет времени сессии (например, 2h, 90m, 3600): берутся самые приоритетные тесты, которые в него укладываются"
+    )
+    parser.addoption(
+        "--shard",
+        action="store",
+        type=parse_shard,
+        default=None,
+        help="Запустить часть i из N матрицы (например, 2/4): разбиение детерминировано и сбалансировано по --shard-history"
+    )
+    parser.addoption(
+        "--shard-history",
+        action="store",
+        default=None,
+        help="Общая для всех машин история прогонов для оценок длительности в --shard (без неё оценки равные, по числу фильмов)"
+    )
+    parser.addoption(
+        "--session-id",
+        action="store",
+        default=None,
+        help="Имя сессии для чекпоинта завершённых тестов (по умолчанию — время запуска)"
+    )
+    parser.addoption(
+        "--resume",
+        action="store",
+        default=None,
+        help="Продолжить сессию с указанным именем: завершённые тесты пропускаются, их отчёты берутся из чекпоинта"
+    )
+    parser.addoption(
+        "--film-sample",
+        action="store",
+        type=int,
+        default=0,
+        help="Для --film-list: по N фильмов из каждой страты индекса фильмов (сценарий × вес страницы), 0 — весь список"
+    )
+    parser.addoption(
+        "--film-sample-by",
+        action="store",
+        default=",".join(config.FILM_SAMPLE_STRATA),
+        help="Атрибуты страт для --film-sample через запятую: domain, scenario, player_type, weight_bucket, duration_bucket"
+    )
 
 # === ФИКСТУРЫ ДЛЯ ПАРАМЕТРОВ ТЕСТИРОВАНИЯ ===
 @pytest.fixture()
@@ -136,6 +286,12 @@ def pay_method(request: pytest.FixtureRequest) -> str:
     """Возвращает метод оплаты для тестирования."""
     return request.config.getoption("--pay-method")
 
+@pytest.fixture
+def start_mode(request: pytest.FixtureRequest) -> str:
+    """Возвращает режим старта сценария (cold/warm); без параметризации при --start-mode both — cold."""
+    mode = request.config.getoption("--start-mode")
+    return "cold" if mode == "both" else mode
+
 # === УТИЛИТЫ ДЛЯ РАБОТЫ С ФАЙЛАМИ ===
 def load_film_urls(film_list_path: str, limit: Optional[int] = None) -> List[str]:
     """
@@ -152,24 +308,7 @@ def load_film_urls(film_list_path: str, limit: Optional[int] = None) -> List[str
         FileNotFoundError: если файл не существует
         ValueError: если формат файла не поддерживается
     """
-    path = Path(film_list_path)
-    if not path.exists():
-        raise FileNotFoundError(f"Файл не найден: {film_list_path}")
-
-    if path.suffix == ".json":
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            urls = data.get("urls", data) if isinstance(data, dict) else data
-    elif path.suffix == ".txt":
-        with open(path, "r", encoding="utf-8") as f:
-            urls = [line.strip() for line in f if line.strip()]
-    else:
-        raise ValueError(f"Поддерживаются только .json и .txt, получено: {path.suffix}")
-    
-    if limit is not None:
-        urls = urls[:limit]
-
-    return urls
+    return list(iter_film_urls(film_list_path, limit))
 
 # === ДИНАМИЧЕСКАЯ ПАРАМЕТРИЗАЦИЯ ТЕСТОВ ===
 def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
@@ -200,6 +339,11 @@ def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
             metafunc.parametrize("browser_type", BROWSERS, scope="session")
         if "pay_method" in metafunc.fixturenames:
             metafunc.parametrize("pay_method", PAY_METHODS, scope="function")
+    # Тёплый старт — явное измерение матрицы (--start-mode both) и только для классов с BASE_URL:
+    # без главной страницы домена снимок storage_state не построить
+    if (metafunc.config.getoption("--start-mode") == "both" and "start_mode" in metafunc.fixturenames
+            and getattr(metafunc.cls, "BASE_URL", None)):
+        metafunc.parametrize("start_mode", START_MODES, scope="function")
 
     # Обработка URL фильмов
     film_url = metafunc.config.getoption("--film-url")
@@ -207,14 +351,30 @@ def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
     film_limit = metafunc.config.getoption("--film-limit")
     
     if "get_film_url" in metafunc.fixturenames:
-        if film_list:
+        if film_list and metafunc.config.getoption("--film-stream") == "on":
+            # Потоковый режим: фильмы не умножаются на матрицу при сборе
+            metafunc.parametrize("get_film_url", [FilmStream(film_list, film_limit)], scope="function", ids=["stream"])
+        elif film_list:
             urls = load_film_urls(film_list, limit=film_limit)
-            metafunc.parametrize(
-                "get_film_url",
-                urls,
-                scope="function",
-                ids=lambda x: x.split("/")[-2]  # человекочитаемые ID
-            )
+            if metafunc.config.getoption("--film-sample") > 0:
+                urls = _film_sample(metafunc.config, film_list, urls)
+            batch_size = metafunc.config.getoption("--film-batch-size")
+            if batch_size > 1:
+                # Пакетный режим: один тест — несколько фильмов в одном контексте
+                batches = [urls[i:i + batch_size] for i in range(0, len(urls), batch_size)]
+                metafunc.parametrize(
+                    "get_film_url",
+                    batches,
+                    scope="function",
+                    ids=[f"batch{i}-{len(batch)}films" for i, batch in enumerate(batches)]
+                )
+            else:
+                metafunc.parametrize(
+                    "get_film_url",
+                    urls,
+                    scope="function",
+                    ids=lambda x: x.split("/")[-2]  # человекочитаемые ID
+                )
         elif film_url:
             metafunc.parametrize("get_film_url", [film_url], scope="function")
         else:
@@ -222,6 +382,25 @@ def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
             metafunc.parametrize("get_film_url", [None], scope="function")
 
 
+def _film_sample(config: pytest.Config, film_list: str, urls: List[str]) -> List[str]:
+    """Стратифицированная выборка фильмов списка по индексу (одна на сессию для всех тестовых функций)."""
+    if film_list not in _film_samples:
+        per_stratum = config.getoption("--film-sample")
+        by = [name.strip() for name in config.getoption("--film-sample-by").split(",") if name.strip()]
+        index = FilmIndex()
+        try:
+            unknown = len(index.missing(urls))
+            sample = index.sample(per_stratum, by, urls=urls, seed=config.getoption("--sampling-seed"))
+        finally:
+            index.close()
+        print(
+            f"[INFO] Выборка по стратам {' × '.join(by)}: {len(sample)} из {len(urls)} фильмов "
+            f"(по {per_stratum} на страту, ещё не в индексе: {unknown})"
+        )
+        _film_samples[film_list] = sample
+    return _film_samples[film_list]
+
+
 # === ФИКСТУРЫ ДЛЯ УПРАВЛЕНИЯ БРАУЗЕРОМ ===
 @pytest.fixture(scope="session")
 def playwright_instance():
@@ -261,9 +440,44 @@ def browser_instance(playwright_instance, browser_type):
     yield browser
     browser.close()
     
+@pytest.fixture(scope="session")
+def lighthouse_queue(request: pytest.FixtureRequest):
+    """
+    Фоновая очередь аудитов Lighthouse на всю сессию.
+    
+    Аудиты выполняются пулом воркеров параллельно с пользовательским сценарием.
+    """
+    _lighthouse_cache.ttl_sec = request.config.getoption("--lighthouse-cache-ttl")
+    queue = LighthouseAuditQueue(max_workers=config.LIGHTHOUSE_WORKERS, cache=_lighthouse_cache)
+    yield queue
+    queue.shutdown(wait=True)
+
+
+@pytest.fixture(scope="session")
+def adaptive_timeouts(request: pytest.FixtureRequest):
+    """
+    История задержек ожиданий на всю сессию.
+
+    Успешные задержки копятся в памяти и сохраняются на диск в конце сессии;
+    при --adaptive-timeouts off история пополняется, но таймауты остаются жёсткими.
+    """
+    service = AdaptiveTimeouts(enabled=request.config.getoption("--adaptive-timeouts") == "on")
+    yield service
+    try:
+        service.save()
+    except OSError as e:
+        print(f"[WARN] Не удалось сохранить историю задержек: {e}")
+
+
+@pytest.fixture(scope="session")
+def storage_state_store():
+    """Снимки storage_state для тёплого старта (общие на сессию, хранятся на диске)."""
+    return StorageStateStore()
+    
 # === ФИКСТУРА СТРАНИЦЫ С НАСТРОЙКОЙ ОКРУЖЕНИЯ ===
 @pytest.fixture(scope='function')
-def page(browser_type, device, geo, throttling, browser_instance, playwright_instance):
+def page(request, browser_type, device, geo, throttling, start_mode, browser_instance, playwright_instance,
+         storage_state_store):
     """
     Создает новую страницу с настройками окружения для каждого теста.
     
@@ -273,6 +487,8 @@ def page(browser_type, device, geo, throttling, browser_instance, playwright_ins
     - User Agent и разрешения
     - Защита от обнаружения автоматизации
     - Мониторинг консоли браузера
+    - Движок QoE видео
+    - Тёплый старт из снимка storage_state (start_mode=warm)
     - Ограничение скорости сети (при необходимости)
     """
     p = playwright_instance
@@ -305,8 +521,24 @@ def page(browser_type, device, geo, throttling, browser_instance, playwright_ins
         "java_script_enabled": True,
     })
         
+    # Тёплый старт: контекст из снимка состояния домена (при неудаче прогрева — холодный)
+    storage_state_path = None
+    base_url = getattr(request.cls, "BASE_URL", None)
+    if start_mode == "warm" and not base_url:
+        # Иначе тест прошёл бы холодным стартом с меткой warm — дубль холодного прогона
+        pytest.skip("Тёплый старт требует BASE_URL класса теста")
+    if start_mode == "warm":
+        domain = getattr(request.cls, "DOMAIN_NAME", "unknown")
+        storage_state_path = storage_state_store.ensure(browser_instance, context_args, base_url, domain, device)
+    request.node._start_mode = "warm" if storage_state_path else "cold"
+    request.node._storage_state_path = storage_state_path
+    # Настройки контекста без снимка — для замеров холодного/тёплого кэша в свежих контекстах
+    request.node._context_args = dict(context_args)
+
     try:
-        context = browser_instance.new_context(**context_args)
+        context = browser_instance.new_context(
+            **context_args, **({"storage_state": storage_state_path} if storage_state_path else {})
+        )
     except Exception as e:
         pytest.fail(f"Не удалось создать контекст браузера: {e}")
     # Скрипт для защиты от обнаружения и мониторинга
@@ -372,9 +604,14 @@ def page(browser_type, device, geo, throttling, browser_instance, playwright_ins
                 });
             })();
         """)
-    # Очистка cookies перед тестом
-    context.clear_cookies()
+    # Движок QoE видео (hls.js + события video) — до загрузки страниц
+    install_video_qoe(context)
+    # Очистка cookies перед тестом (в warm-режиме cookies из снимка сохраняем)
+    if storage_state_path is None:
+        context.clear_cookies()
     page = context.new_page()
+    # Отслеживание запросов для ожидания сетевой тишины — с самого создания страницы
+    attach_network_quiescence(page)
     
     # Настройки специфичные для Chromium
     if browser_type == "chromium":
@@ -403,16 +640,10 @@ def page(browser_type, device, geo, throttling, browser_instance, playwright_ins
         time.sleep(0.1) # Даем время для инициализации
         
         # Применение ограничения скорости сети
-        if throttling == "Slow_4G":
+        if throttling in config.CDP_NETWORK_CONDITIONS:
             try:
                 client.send("Network.enable")
-                client.send("Network.emulateNetworkConditions", {
-                    "offline": False,
-                    "latency": 400,
-                    "downloadThroughput": 700 * 1024,
-                    "uploadThroughput": 700 * 1024,
-                    "connectionType": "cellular4g"
-                })
+                client.send("Network.emulateNetworkConditions", config.CDP_NETWORK_CONDITIONS[throttling])
                 # Даём сети примениться
                 time.sleep(0.5)
             except Exception as e:
@@ -434,6 +665,10 @@ def pytest_runtest_makereport(item: pytest.Item, call: pytest.CallInfo):
     """
     outcome = yield
     rep = outcome.get_result()
+    if item.get_closest_marker("unit"):
+        # Проверки модулей не попадают в агрегатор, историю прогонов и чекпоинт
+        _unit_nodeids.add(item.nodeid)
+        return
     
     # Скриншот при падении
     if rep.when == "call" and rep.failed:
@@ -448,17 +683,124 @@ def pytest_runtest_makereport(item: pytest.Item, call: pytest.CallInfo):
             except Exception as e:
                 print(f"[WARN] Скриншот не сохранён: {e}")
     
-    # Сохранение report даже если тест упал
-    if rep.when == "call":
-        if hasattr(item, "_report_data") and isinstance(item._report_data, dict):
-            test_name = item.nodeid.split("::")[-1].split("[")[0]
+    # Сохранение report даже если тест упал (в потоковом режиме фильмы уже учтены в stream_sink)
+    if rep.when == "call" and not getattr(item, "_report_streamed", False):
+        test_name = item.nodeid.split("::")[-1].split("[")[0]
+        if isinstance(getattr(item, "_report_batch", None), list):
+            # Пакетный режим: отдельный отчёт на каждый фильм пакета
+            for report in item._report_batch:
+                _aggregator.add_report(test_name, report)
+        elif hasattr(item, "_report_data") and isinstance(item._report_data, dict):
             _aggregator.add_report(test_name, item._report_data)
+
+        reports = getattr(item, "_report_batch", None) or [getattr(item, "_report_data", None)]
+        reports = [r for r in reports if isinstance(r, dict)]
+        _film_observations.extend(reports)
+        if _sampler is not None:
+            _sampler.add(_sampling_cluster(item), reports, rep.duration)
+        _run_history.record(
+            _history_key(item), _history_status(rep, reports), rep.duration,
+            report_metrics(reports, config.SCHEDULER_REGRESSION_METRICS)
+        )
+        if _checkpoint is not None:
+            try:
+                _checkpoint.append(_history_key(item), _history_status(rep, reports), rep.duration, reports)
+            except OSError as e:
+                print(f"[WARN] Не удалось записать чекпоинт: {e}")
+
+
+def _history_status(rep: pytest.TestReport, reports: List[dict]) -> str:
+    """Статус прогона для истории: failed — ошибка сценария, problematic — метрики хуже порогов."""
+    if rep.skipped:
+        return "skipped"
+    return _reports_status(reports) or ("failed" if rep.failed else "passed")
+
+
+def _reports_status(reports: List[dict]) -> Optional[str]:
+    """failed / problematic по отчётам сценария или None, если замечаний нет."""
+    if any(r.get("error") for r in reports):
+        return "failed"
+    if any(r.get("is_problematic_flow") for r in reports):
+        return "problematic"
+    return None
+
+
+def _stream_unit_key(item: pytest.Item, film_url: str) -> str:
+    """Ключ фильма потокового режима в истории и чекпоинте: nodeid теста конфигурации и URL."""
+    return f"{item.nodeid}|{film_url}"
+
+
+class _StreamSink:
+    """
+    Учёт фильмов потокового режима как отдельных единиц работы: каждый отчёт
+    сразу попадает в агрегатор, историю прогонов, чекпоинт и последовательную выборку.
+    """
+
+    def __init__(self, item: pytest.Item):
+        self.item = item
+        self.test_name = item.nodeid.split("::")[-1].split("[")[0]
+        self.cluster = _sampling_cluster(item)
+        self.completed = {entry["key"] for resumed_item, entry in _resumed_units if resumed_item is item}
+
+    def pending(self, film_stream: FilmStream):
+        """Фильмы, которые ещё нужно пройти; поток обрывается по бюджету времени или устоявшейся оценке кластера."""
+        films = (url for url in film_stream if _stream_unit_key(self.item, url) not in self.completed)
+        for film_url in films:
+            reason = self._stop_reason(_stream_unit_key(self.item, film_url))
+            if reason is not None:
+                skipped = 1 + sum(1 for _ in films)
+                if _sampler is not None and _sampler.is_stopped(self.cluster):
+                    _sampler.record_skip(self.cluster, skipped)
+                print(f"[INFO] {self.item.name}: поток остановлен ({reason}), пропущено фильмов: {skipped}")
+                return
+            yield film_url
+
+    def _stop_reason(self, key: str) -> Optional[str]:
+        if _deadline is not None and time.time() + _scheduler.estimate(key) > _deadline:
+            return "бюджет времени"
+        if _sampler is not None and _sampler.is_stopped(self.cluster):
+            return "оценка кластера устоялась"
+        return None
+
+    def accept(self, report: dict, duration_sec: float) -> None:
+        key = _stream_unit_key(self.item, report["film_url"])
+        status = _reports_status([report]) or "passed"
+        _aggregator.add_report(self.test_name, report)
+        _film_observations.append(report)
+        if _sampler is not None:
+            _sampler.add(self.cluster, [report], duration_sec)
+        _run_history.record(key, status, duration_sec, report_metrics([report], config.SCHEDULER_REGRESSION_METRICS))
+        if _checkpoint is not None:
+            try:
+                _checkpoint.append(key, status, duration_sec, [report])
+            except OSError as e:
+                print(f"[WARN] Не удалось записать чекпоинт: {e}")
+        # Свой результат Allure у каждого фильма: статус и история не зависят от остальных фильмов потока
+        stop_ms = round(time.time() * 1000)
+        try:
+            report_unit_result(
+                f"{self.item.name}: {report['film_url']}", key, key, status, report,
+                stop_ms - round(duration_sec * 1000), stop_ms,
+                {"suite": self.test_name, "subSuite": self.item.name, "tag": "film_stream"},
+            )
+        except Exception as e:
+            print(f"[WARN] Не удалось записать результат Allure фильма: {e}")
+
+
+@pytest.fixture()
+def stream_sink(request: pytest.FixtureRequest) -> _StreamSink:
+    """Приёмник отчётов потокового режима (--film-stream on) для текущего теста."""
+    request.node._report_streamed = True
+    return _StreamSink(request.node)
             
     
 
 # Глобальный агрегатор (на сессию)
 _aggregator = aggregator.MultiTestRunAggregator()
 
+# Кэш результатов Lighthouse (на сессию, хранится на диске между сессиями)
+_lighthouse_cache = LighthouseCache()
+
 
 @pytest.fixture(scope="session")
 def aggregate_run_summary():
@@ -469,18 +811,328 @@ def aggregate_run_summary():
 _test_run_counts = defaultdict(int)
 _test_total_expected = {}
 
+# Сокращение матрицы по тестовым функциям и число страниц в плане сессии
+_matrix_plans = {}
+_planned_pages = 0
+
+# Последовательная выборка фильмов (создаётся при --sequential-sampling on)
+_sampler = None
+
+# История прогонов (на диске между сессиями) и планировщик очереди (--schedule / --time-budget)
+_run_history = RunHistory()
+_scheduler = None
+_deadline = None
+
+# Доля матрицы этой машины при --shard
+_shard_info = None
+
+# Чекпоинт сессии, тесты и фильмы потокового режима, восстановленные из него при --resume
+_checkpoint = None
+_resumed = []
+_resumed_units = []
+
+# Отчёты сессии для индекса атрибутов фильмов и выборки --film-sample по спискам фильмов
+_film_observations = []
+_film_samples = {}
+
+# Проверки модулей (маркер unit), для которых не сохраняются агрегаты
+_unit_nodeids = set()
+
+def _matrix_key(value) -> str:
+    """Ключ значения параметра для планировщика (списки пакетного режима нехешируемы)."""
+    return repr(value)
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: List[pytest.Item]) -> None:
+    """
+    Формирует очередь сессии: сокращение матрицы (--matrix-strength),
+    выбор шарда (--shard), пропуск завершённых тестов (--resume), порядок и бюджет (--schedule,
+    --time-budget), последовательная выборка (--sequential-sampling).
+    """
+    strength = config.getoption("--matrix-strength")
+    if strength > 0:
+        _reduce_matrix(config, items, strength)
+    _apply_shard(config, items)
+    _apply_resume(config, items)
+    _apply_schedule(config, items)
+    _setup_sequential_sampling(config, items)
+
+
+def _reduce_matrix(config: pytest.Config, items: List[pytest.Item], strength: int) -> None:
+    """
+    Сокращает матрицу параметров до покрывающего массива.
+
+    Для каждой тестовой функции измерения — параметры из MATRIX_DIMENSIONS,
+    принимающие больше одного значения. Остаются только тесты, комбинации
+    которых вошли в план; остальные помечаются как deselected.
+    """
+    groups = defaultdict(list)
+    for item in items:
+        if hasattr(item, "callspec"):
+            groups[item.nodeid.split("[")[0]].append(item)
+
+    deselected = set()
+    for group_name, group_items in groups.items():
+        dimensions = {}
+        for name in MATRIX_DIMENSIONS:
+            if not all(name in item.callspec.params for item in group_items):
+                continue
+            keys = list(dict.fromkeys(_matrix_key(item.callspec.params[name]) for item in group_items))
+            if len(keys) > 1:
+                dimensions[name] = keys
+        if len(dimensions) <= strength:
+            continue
+
+        must_cover = [
+            {name: _matrix_key(value) for name, value in combination.items()}
+            for combination in MATRIX_MUST_COVER
+        ]
+        plan = covering_array(dimensions, strength, must_cover=must_cover, seed=config.getoption("--matrix-seed"))
+        planned = {tuple(row[name] for name in dimensions) for row in plan.rows}
+        kept = 0
+        for item in group_items:
+            combination = tuple(_matrix_key(item.callspec.params[name]) for name in dimensions)
+            if combination in planned:
+                planned.discard(combination)
+                kept += 1
+            else:
+                deselected.add(item)
+        if planned:
+            print(f"[WARN] {group_name}: {len(planned)} комбинаций плана нет среди собранных тестов")
+        _matrix_plans[group_name] = {"full": len(group_items), "planned": kept, "plan": plan.describe()}
+        print(f"[INFO] Матрица {group_name}: {plan.describe()}")
+
+    if deselected:
+        config.hook.pytest_deselected(items=[item for item in items if item in deselected])
+        items[:] = [item for item in items if item not in deselected]
+
+
+def _history_key(item: pytest.Item) -> str:
+    """Ключ теста в истории прогонов: фильм и конфигурация входят в nodeid."""
+    return item.nodeid
+
+
+def _shard_key(item: pytest.Item) -> str:
+    """Ключ теста для разбиения на шарды: тестовая функция, URL фильма и конфигурация."""
+    params = item.callspec.params if hasattr(item, "callspec") else {}
+    return json.dumps(
+        [item.nodeid.split("[")[0], params.get("get_film_url"),
+         sorted((name, value) for name, value in params.items() if name != "get_film_url")],
+        ensure_ascii=False, default=str
+    )
+
+
+def _film_param(item: pytest.Item):
+    """Значение параметра get_film_url: URL, список URL пакета, FilmStream или None."""
+    return item.callspec.params.get("get_film_url") if hasattr(item, "callspec") else None
+
+
+def _is_stream(item: pytest.Item) -> bool:
+    """Тест потокового режима (--film-stream on): фильмы берутся из FilmStream по одному."""
+    return isinstance(_film_param(item), FilmStream)
+
+
+def _item_film_urls(item: pytest.Item) -> set:
+    """URL фильмов теста (в пакетном режиме — всех фильмов пакета; поток не раскрывается)."""
+    film = _film_param(item)
+    if isinstance(film, str):
+        return {film}
+    return set(film) if isinstance(film, (list, tuple)) else set()
+
+
+def _shard_cost(item: pytest.Item, history: Optional[RunHistory]) -> float:
+    """
+    Оценка длительности теста для LPT: среднее по общей истории --shard-history,
+    иначе SCHEDULER_DEFAULT_TEST_SEC на фильм. Локальная _run_history не
+    используется: у каждой машины она своя, и планы шардов разошлись бы.
+    """
+    film = _film_param(item)
+    films = len(film) if isinstance(film, (list, tuple, FilmStream)) else 1
+    mean = history.mean_duration(_history_key(item)) if history is not None else None
+    return mean or config.SCHEDULER_DEFAULT_TEST_SEC * films
+
+
+def _apply_shard(config: pytest.Config, items: List[pytest.Item]) -> None:
+    """Оставляет только тесты шарда --shard i/N."""
+    global _shard_info
+    shard = config.getoption("--shard")
+    if shard is None:
+        return
+    index, count = shard
+    history_path = config.getoption("--shard-history")
+    if history_path is not None and not Path(history_path).exists():
+        raise pytest.UsageError(f"Нет общей истории прогонов --shard-history: {history_path}")
+    history = RunHistory(history_path) if history_path is not None else None
+    keys = [_shard_key(item) for item in items]
+    costs = [_shard_cost(item, history) for item in items]
+    assignment = assign_shards(keys, costs, count)
+    selected = [item for item, s in zip(items, assignment) if s == index - 1]
+    planned_sec = sum(cost for cost, s in zip(costs, assignment) if s == index - 1)
+    _shard_info = {
+        "shard": f"{index}/{count}",
+        "tests": len(selected),
+        "total": len(items),
+        "planned_sec": planned_sec,
+        "fingerprint": plan_fingerprint(keys, assignment, costs),
+    }
+    print(
+        f"[INFO] Шард {index}/{count}: {len(selected)} из {len(items)} тестов, "
+        f"~{planned_sec / 60:.0f} мин, отпечаток плана {_shard_info['fingerprint']}"
+    )
+    others = [item for item, s in zip(items, assignment) if s != index - 1]
+    if others:
+        config.hook.pytest_deselected(items=others)
+    items[:] = selected
+
+
+def _apply_resume(config: pytest.Config, items: List[pytest.Item]) -> None:
+    """
+    При --resume убирает завершённые тесты из сбора и возвращает их отчёты в агрегатор.
+    Упавшие в чекпоинте тесты и фильмы потока (не RESUMED_STATUSES) запускаются снова.
+    """
+    if not config.getoption("--resume") or _checkpoint is None:
+        return
+    entries = _checkpoint.load()
+    completed = {key: entry for key, entry in entries.items() if entry["status"] in RESUMED_STATUSES}
+    retried = len(entries) - len(completed)
+    remaining = []
+    for item in items:
+        entry = completed.get(_history_key(item))
+        if entry is None:
+            remaining.append(item)
+            continue
+        test_name = item.nodeid.split("::")[-1].split("[")[0]
+        for report in entry["reports"]:
+            _aggregator.add_report(test_name, report)
+        _resumed.append((item, entry))
+    # Потоковый режим: завершённые фильмы пропускаются внутри теста конфигурации
+    stream_items = {item.nodeid: item for item in remaining if _is_stream(item)}
+    for key, entry in completed.items():
+        nodeid, separator, _ = key.partition("|")
+        if separator and nodeid in stream_items:
+            test_name = nodeid.split("::")[-1].split("[")[0]
+            for report in entry["reports"]:
+                _aggregator.add_report(test_name, report)
+            _resumed_units.append((stream_items[nodeid], entry))
+    if _resumed or _resumed_units:
+        print(
+            f"[INFO] Сессия {_checkpoint.session_id}: восстановлено {len(_resumed)} завершённых тестов "
+            f"и {len(_resumed_units)} фильмов потокового режима, осталось тестов {len(remaining)}"
+        )
+    if retried:
+        print(f"[INFO] Сессия {_checkpoint.session_id}: упавших в чекпоинте тестов и фильмов, которые запускаются снова: {retried}")
+    if _resumed:
+        config.hook.pytest_deselected(items=[item for item, _ in _resumed])
+    items[:] = remaining
+
+
+def _apply_schedule(config: pytest.Config, items: List[pytest.Item]) -> None:
+    """Упорядочивает тесты по истории (--schedule history) и отбирает их под --time-budget."""
+    global _scheduler
+    schedule = config.getoption("--schedule")
+    budget_sec = config.getoption("--time-budget")
+    if schedule == "file" and budget_sec is None:
+        return
+    _scheduler = PriorityScheduler(_run_history, seed=config.getoption("--sampling-seed"))
+    if schedule == "history":
+        new_urls = recently_added_urls()
+        is_new = lambda item: bool(_item_film_urls(item) & new_urls)
+        anomalous_urls = probe_anomalies(
+            RunHistory(PROBE_HISTORY_FILE), set().union(*(_item_film_urls(item) for item in items))
+        )
+        is_anomalous = lambda item: bool(_item_film_urls(item) & anomalous_urls)
+        ordered = _scheduler.order(items, _history_key, is_new=is_new, is_anomalous=is_anomalous)
+        tiers = Counter(tier for _, tier in ordered)
+        print("[INFO] Очередь по истории: " + ", ".join(f"{TIER_NAMES[t]} — {tiers[t]}" for t in sorted(tiers)))
+        if new_urls:
+            print(f"[INFO] Новых фильмов в каталогах за {SCHEDULER_NEW_FILM_DAYS} дн.: {len(new_urls)}, "
+                  f"тестов с ними: {sum(1 for item in items if is_new(item))}")
+        if anomalous_urls:
+            print(f"[INFO] Фильмов с аномалией HTTP-пробы: {len(anomalous_urls)}, "
+                  f"тестов с ними: {sum(1 for item in items if is_anomalous(item))}")
+    else:
+        ordered = [(item, None) for item in items]
+    # Потоковые тесты сами останавливаются по бюджету перед каждым фильмом (_StreamSink.pending),
+    # а их длительность заранее неизвестна — в отбор по бюджету они не входят
+    streams = [item for item, _ in ordered if _is_stream(item)]
+    selected, postponed = _scheduler.fit_budget(
+        [(item, tier) for item, tier in ordered if not _is_stream(item)], _history_key, budget_sec
+    )
+    if postponed:
+        print(f"[INFO] Бюджет времени {budget_sec:.0f} с: запланировано {len(selected)} тестов, отложено {len(postponed)}")
+        config.hook.pytest_deselected(items=postponed)
+    if streams and budget_sec is not None:
+        print(f"[INFO] Потоковых тестов вне отбора по бюджету: {len(streams)} (останавливаются по бюджету пофильмово)")
+    kept = set(selected) | set(streams)
+    items[:] = [item for item, _ in ordered if item in kept]
+
+
+_SAMPLING_CLUSTER_PARAMS = (("device", "--device"), ("throttling", "--throttling"), ("geo", "--geo"), ("browser_type", "--browser"))
+"""Параметры кластера последовательной выборки и опции, из которых они берутся без параметризации"""
+
+
+def _sampling_cluster(item: pytest.Item) -> tuple:
+    """Кластер теста: тестовая функция × устройство × сеть × ГЕО × браузер."""
+    params = item.callspec.params if hasattr(item, "callspec") else {}
+    return (item.nodeid.split("[")[0],) + tuple(
+        params.get(name, item.config.getoption(option)) for name, option in _SAMPLING_CLUSTER_PARAMS
+    )
+
+
+def _setup_sequential_sampling(config: pytest.Config, items: List[pytest.Item]) -> None:
+    """Включает последовательную выборку для прогонов по --film-list."""
+    global _sampler
+    if config.getoption("--sequential-sampling") != "on" or not config.getoption("--film-list"):
+        return
+    _sampler = SequentialSampler()
+    for item, entry in _resumed + _resumed_units:
+        _sampler.add(_sampling_cluster(item), entry["reports"], entry["duration_sec"])
+    # При очереди по истории приоритеты внутри кластера сохраняются
+    items[:] = stratified_order(
+        items, _sampling_cluster, seed=config.getoption("--sampling-seed"),
+        shuffle=config.getoption("--schedule") != "history"
+    )
+    print(f"[INFO] Последовательная выборка: {len(items)} тестов в стратифицированном порядке")
+
+
+def pytest_runtest_setup(item: pytest.Item) -> None:
+    """Пропускает тесты, не укладывающиеся в бюджет времени, и фильмы кластера, оценка которого уже устоялась."""
+    # Потоковый тест проверяет бюджет перед каждым фильмом сам
+    if _deadline is not None and not _is_stream(item) and time.time() + _scheduler.estimate(_history_key(item)) > _deadline:
+        pytest.skip("Не укладывается в оставшийся бюджет времени (--time-budget)")
+    if _sampler is None:
+        return
+    cluster = _sampling_cluster(item)
+    if _sampler.is_stopped(cluster):
+        _sampler.record_skip(cluster)
+        pytest.skip("Оценка метрик кластера устоялась (последовательная выборка)")
+
+
 def pytest_collection_finish(session):
     """Считаем, сколько раз будет вызван каждый тест (из-за параметризации)."""
-    global _test_total_expected
+    global _test_total_expected, _planned_pages
     for item in session.items:
         test_name = item.originalname or item.name.split("[")[0]
         _test_total_expected[test_name] = _test_total_expected.get(test_name, 0) + 1
+        # Страниц в плане: в пакетном режиме один тест — несколько фильмов
+        film = _film_param(item)
+        _planned_pages += len(film) if isinstance(film, (list, tuple, FilmStream)) else 1
         
 _start_time = None
 
 def pytest_sessionstart(session):
-    global _start_time
+    global _start_time, _deadline, _checkpoint
     _start_time = time.time()
+    session_id = session.config.getoption("--resume") or session.config.getoption("--session-id") or new_session_id()
+    shard = session.config.getoption("--shard")
+    if shard is not None:
+        # У каждого шарда свой чекпоинт: их объединяет python -m utils.sharding merge
+        session_id += f"-shard{shard[0]}of{shard[1]}"
+    _checkpoint = CheckpointStore(session_id)
+    print(f"[INFO] Чекпоинт сессии: {_checkpoint.path} (продолжить: --resume {session_id})")
+    budget_sec = session.config.getoption("--time-budget")
+    if budget_sec is not None:
+        _deadline = _start_time + budget_sec
     
 def aggregate_reports() -> dict:
     """Собирает сводку и сохраняет в environment.properties для Allure."""
@@ -531,7 +1183,7 @@ def aggregate_reports() -> dict:
         "Start time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_start_time)),
         "End time": time.strftime("%Y-%m-%d %H:%M:%S"),
         "Duration": f"{(time.time() - _start_time):.1f} sec",
-        "Pages": f"{total} / 19975",
+        "Pages": f"{total} / {_planned_pages}",
         "Problematic pages": f"{problematic} ({problematic/total*100:.1f}%)",
         "Failed by errors": f"{failed} ({failed/total*100:.1f}%)",
         "Quality score": f"{quality_score}%",
@@ -539,6 +1191,35 @@ def aggregate_reports() -> dict:
         "main_page.LCP > 2500 ms": f"{lcp_bad} ({lcp_bad/total*100:.1f}%)",
         "pay_page.iframeCpLoadTime > 3 sec": f"{iframe_slow} ({iframe_slow/total*100:.1f}%)",
     }
+    
+    if _shard_info is not None:
+        env["Shard"] = f"{_shard_info['shard']}: {_shard_info['tests']} of {_shard_info['total']} tests, plan {_shard_info['fingerprint']}"
+
+    if _resumed_units:
+        env["Resumed session"] = (
+            f"{_checkpoint.session_id}: {len(_resumed)} tests and {len(_resumed_units)} streamed films from checkpoint"
+        )
+    elif _resumed:
+        env["Resumed session"] = f"{_checkpoint.session_id}: {len(_resumed)} tests from checkpoint"
+
+    if _matrix_plans:
+        full = sum(p["full"] for p in _matrix_plans.values())
+        planned = sum(p["planned"] for p in _matrix_plans.values())
+        env["Matrix reduction"] = f"{full} → {planned} (×{full / planned:.1f})" if planned else f"{full} → 0"
+
+    if _sampler is not None:
+        sampling = _sampler.summary()
+        env["Sequential sampling"] = (
+            f"stopped clusters {sampling['stopped_clusters']}, skipped {sampling['skipped_tests']} tests, "
+            f"saved ~{sampling['saved_browser_sec'] / 60:.1f} browser-min"
+        )
+
+    cache_stats = _lighthouse_cache.stats()
+    if cache_stats["hits"] or cache_stats["misses"]:
+        env["Lighthouse cache"] = (
+            f"hits {cache_stats['hits']} / misses {cache_stats['misses']} "
+            f"({cache_stats['hit_rate']}% hit rate)"
+        )
     return env
     
 
@@ -561,13 +1242,39 @@ def pytest_sessionfinish(session, exitstatus):
             value = str(value).replace("\\", "\\\\").replace("=", "\\=")
             f.write(f"{key} = {value}\n")
             
+    # Тесты, все запуски которых восстановлены из чекпоинта, не проходят через logfinish
+    for test_name in dict.fromkeys(item.nodeid.split("::")[-1].split("[")[0] for item, _ in _resumed):
+        if test_name not in _test_total_expected:
+            _aggregator.save_summary(test_name)
+
     print(f"\n✅ Environment для Allure обновлён: {env_path}")
+    try:
+        _run_history.save()
+    except OSError as e:
+        print(f"[WARN] Не удалось сохранить историю прогонов: {e}")
+    if _film_observations:
+        try:
+            index = FilmIndex()
+            try:
+                index.observe_reports(_film_observations)
+            finally:
+                index.close()
+        except sqlite3.Error as e:
+            print(f"[WARN] Не удалось обновить индекс фильмов: {e}")
+    if _sampler is not None:
+        sampling = _sampler.summary()
+        print(
+            f"[INFO] Последовательная выборка: остановлено кластеров {sampling['stopped_clusters']}, "
+            f"пропущено тестов {sampling['skipped_tests']}, сэкономлено ~{sampling['saved_browser_sec']:.0f} с браузера"
+        )
 
 
 def pytest_runtest_logfinish(nodeid, location):
     """Вызывается после КАЖДОГО параметризованного запуска теста."""
     global _test_run_counts
 
+    if nodeid in _unit_nodeids:
+        return
     test_name = nodeid.split("::")[-1].split("[")[0]
     _test_run_counts[test_name] += 1
 
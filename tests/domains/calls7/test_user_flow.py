@@ -2,13 +2,13 @@ import pytest
 import allure
 from tests.shared.base_user_flow_test import BaseUserFlowTest
 import config
-from utils import metrics
 
 
 class TestCalls7UserFlow(BaseUserFlowTest):
     BASE_URL = "https://calls7.com"
     SELECTORS = config.SELECTORS
     DOMAIN_NAME = "calls7"
+    WITH_MAIN_PAGE = True
 
     # Chromium-тест с Lighthouse
     @pytest.mark.parametrized
@@ -20,36 +20,10 @@ class TestCalls7UserFlow(BaseUserFlowTest):
     @pytest.mark.parametrize("browser_type", ["chromium"], scope="session")
     @allure.story("User Flow: Главная → Фильм → Плеер → Попап → Оплата")
     @allure.title("Полный user flow с Lighthouse (chromium)")
-    def test_user_flow_chromium(self, page, get_film_url, device, throttling, geo, browser_type, request):
-        def main_page_step(page, request, report):
-            dns_metrics = metrics.collect_network_metrics(page)
-            self._goto_main_page(page, request, report)
-            lh_data = self._collect_lighthouse_metrics(self.BASE_URL, request, report)
-            report["steps"]["main_page"] = {
-                **lh_data,
-                "dnsResolveTime": dns_metrics["dnsResolveTime"],
-                "connectTime": dns_metrics["connectTime"]
-            }
-            if lh_data["is_problematic_page"]:
-                report["is_problematic_flow"] = True
-
-        def film_page_step(page, request, report):
-            dns_metrics = metrics.collect_network_metrics(page)
-            lh_data = self._collect_lighthouse_metrics(get_film_url, request, report)
-            report["steps"]["film_page"].update({
-                **lh_data,
-                "dnsResolveTime": dns_metrics["dnsResolveTime"],
-                "connectTime": dns_metrics["connectTime"]
-            })
-            if lh_data["is_problematic_page"]:
-                report["is_problematic_flow"] = True
-
+    def test_user_flow_chromium(self, page, get_film_url, device, throttling, geo, browser_type, pay_method, request):
         self.run_user_flow(
-            page, get_film_url, device, throttling, geo, browser_type, request,
-            extra_steps={
-                "main_page": main_page_step,
-                "film_page_before_video": film_page_step
-            }
+            page, get_film_url, device, throttling, geo, browser_type, pay_method, request,
+            steps=self.build_steps(lighthouse=True)
         )
 
     # Firefox/WebKit — без Lighthouse
@@ -63,5 +37,5 @@ class TestCalls7UserFlow(BaseUserFlowTest):
     @pytest.mark.parametrize("browser_type", ["firefox", "webkit"], scope="session")
     @allure.story("User Flow: Главная → Фильм → Плеер → Попап → Оплата")
     @allure.title("User flow без Lighthouse (firefox, webkit)")
-    def test_user_flow_non_chromium(self, page, get_film_url, device, throttling, geo, browser_type, request):
-        self.run_user_flow(page, get_film_url, device, throttling, geo, browser_type, request)
\ No newline at end of file
+    def test_user_flow_non_chromium(self, page, get_film_url, device, throttling, geo, browser_type, pay_method, request):
+        self.run_user_flow(page, get_film_url, device, throttling, geo, browser_type, pay_method, request)
\ No newline at end of file
@@ -2,14 +2,13 @@ import pytest
 import allure
 from tests.shared.base_user_flow_test import BaseUserFlowTest
 import config
-from utils import metrics
 
 
 class TestGoodmovieUserFlow(BaseUserFlowTest):
     BASE_URL = "https://tests.goodmovie.net"
     SELECTORS = config.SELECTORS
     DOMAIN_NAME = "tests.goodmovie"
-
+    WITH_MAIN_PAGE = True
 
     @pytest.mark.parametrized
     @pytest.mark.domain_goodmovie
@@ -22,35 +21,9 @@ class TestGoodmovieUserFlow(BaseUserFlowTest):
     @allure.story("User Flow: Главная → Фильм → Плеер → Попап → Оплата")
     @allure.title("Полный user flow с Lighthouse (chromium)")
     def test_user_flow_chromium(self, page, get_film_url, device, throttling, geo, browser_type, pay_method, request):
-        def main_page_step(page, request, report):
-            dns_metrics = metrics.collect_network_metrics(page)
-            self._goto_main_page(page, request, report)
-            lh_data = self._collect_lighthouse_metrics(self.BASE_URL, request, report)
-            report["steps"]["main_page"] = {
-                **lh_data,
-                "dnsResolveTime": dns_metrics["dnsResolveTime"],
-                "connectTime": dns_metrics["connectTime"]
-            }
-            if lh_data["is_problematic_page"]:
-                report["is_problematic_flow"] = True
-
-        def film_page_step(page, request, report):
-            dns_metrics = metrics.collect_network_metrics(page)
-            lh_data = self._collect_lighthouse_metrics(get_film_url, request, report)
-            report["steps"]["film_page"].update({
-                **lh_data,
-                "dnsResolveTime": dns_metrics["dnsResolveTime"],
-                "connectTime": dns_metrics["connectTime"]
-            })
-            if lh_data["is_problematic_page"]:
-                report["is_problematic_flow"] = True
-
         self.run_user_flow(
             page, get_film_url, device, throttling, geo, browser_type, pay_method, request,
-            extra_steps={
-                "main_page": main_page_step,
-                "film_page_before_video": film_page_step
-            }
+            steps=self.build_steps(lighthouse=True)
         )
 
 
@@ -75,35 +48,9 @@ class TestGoodmovieUserFlow(BaseUserFlowTest):
     @allure.story("User Flow: Главная → Фильм → Плеер → Попап → Оплата")
     @allure.title("Полный user flow с Lighthouse (chromium), одиночный прогон")
     def test_user_flow_chromium_single(self, page, get_film_url, device, throttling, geo, browser_type, pay_method, request):
-        def main_page_step(page, request, report):
-            dns_metrics = metrics.collect_network_metrics(page)
-            self._goto_main_page(page, request, report)
-            lh_data = self._collect_lighthouse_metrics(self.BASE_URL, request, report)
-            report["steps"]["main_page"] = {
-                **lh_data,
-                "dnsResolveTime": dns_metrics["dnsResolveTime"],
-                "connectTime": dns_metrics["connectTime"]
-            }
-            if lh_data["is_problematic_page"]:
-                report["is_problematic_flow"] = True
-
-        def film_page_step(page, request, report):
-            dns_metrics = metrics.collect_network_metrics(page)
-            lh_data = self._collect_lighthouse_metrics(get_film_url, request, report)
-            report["steps"]["film_page"].update({
-                **lh_data,
-                "dnsResolveTime": dns_metrics["dnsResolveTime"],
-                "connectTime": dns_metrics["connectTime"]
-            })
-            if lh_data["is_problematic_page"]:
-                report["is_problematic_flow"] = True
-
         self.run_user_flow(
             page, get_film_url, device, throttling, geo, browser_type, pay_method, request,
-            extra_steps={
-                "main_page": main_page_step,
-                "film_page_before_video": film_page_step
-            }
+            steps=self.build_steps(lighthouse=True)
         )
         
     @pytest.mark.single_run
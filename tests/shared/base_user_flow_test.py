@@ -1,6 +1,7 @@
 import json
 import time
 from pathlib import Path
+from urllib.parse import urlparse
 import pytest
 import allure
 from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
@@ -9,54 +10,103 @@ from utils import metrics
 from utils.scenario_detector import detect_video_scenario
 from utils.report_explainer import sanitize_filename
 from utils.log_issues import log_issues_if_any
-from utils.lighthouse_runner import run_lighthouse_for_url, extract_metrics_from_lighthouse
+from utils.lighthouse_queue import merge_audit_results
+from utils.network_capture import NetworkCapture
+from utils.video_qoe import collect_video_qoe, wait_for_first_frame, is_video_playing, CLOCK_DEPENDENT_METRICS
+from utils.network_quiescence import wait_for_network_quiet
+from utils.pipeline import FlowContext, PipelineStep, StepPipeline
+from utils.adaptive_timeouts import FlowTimeouts
+from utils.storage_state import StorageStateStore
+from utils.cache_state import measure_cold, measure_warm
+from utils.film_stream import FilmStream
 
 class BaseUserFlowTest:
     BASE_URL = None
     SELECTORS = None
     DOMAIN_NAME = "unknown"
+    WITH_MAIN_PAGE = False
+    """Сценарий начинается с главной страницы домена (шаг main_page)"""
+    BATCH_ONCE_STEPS = ("main_page",)
+    """Шаги, которые в пакетном режиме выполняются один раз на пакет"""
+    WARM_SKIP_STEPS = ("main_page",)
+    """Установочные шаги, которые пропускаются при тёплом старте (состояние сайта уже в снимке)"""
+    PER_FILM_VALUES = ("cache_cold", "cache_warm")
+    """Значения ctx.values, которые в пакетном режиме сбрасываются перед каждым фильмом"""
+    STREAM_ERRORS_SHOWN = 20
+    """Сколько ошибок фильмов перечислять в сообщении о падении теста потокового режима"""
 
     def _goto_main_page(self, page, request, report):
         with allure.step(f"Переходим на главную страницу {self.BASE_URL}"):
             try:
                 page.goto(self.BASE_URL, timeout=30000)
-                page.wait_for_load_state("networkidle")
+                self._wait_for_network_quiet(page)
             except PlaywrightTimeoutError as e:
                 raise
 
+    def _wait_for_network_quiet(self, page) -> int:
+        """Ждёт сетевой тишины без учёта медиапотока и аналитики; возвращает время ожидания (мс)."""
+        waited_ms = wait_for_network_quiet(page)
+        print(f"[INFO] Сетевая тишина через {waited_ms} мс")
+        return waited_ms
+
+    def _wait_timeout(self, wait_name, default_ms) -> int:
+        """
+        Таймаут ожидания wait_name (мс): адаптивный по истории задержек или default_ms.
+        Выбор записывается в report["timeouts"].
+        """
+        flow_timeouts = getattr(self, "_flow_timeouts", None)
+        return flow_timeouts.get(wait_name, default_ms) if flow_timeouts else default_ms
+
+    def _record_wait(self, wait_name, latency_ms):
+        """Добавляет задержку успешного ожидания в историю адаптивных таймаутов."""
+        flow_timeouts = getattr(self, "_flow_timeouts", None)
+        if flow_timeouts:
+            flow_timeouts.record(wait_name, latency_ms)
+
     def _goto_film_page_and_init_player(self, page, film_url):
         with allure.step(f"Переходим на страницу фильма и инициализируем плеер для {film_url}"):
             try:
-                page.evaluate("() => { localStorage.setItem('vidu_log', '1'); }")
+                # На about:blank localStorage недоступен; при тёплом старте флаг уже есть в снимке
+                if page.url.startswith("http"):
+                    page.evaluate("() => { localStorage.setItem('vidu_log', '1'); }")
                 page.goto(film_url)
                 
-                player_ready_time = round(self._wait_for_player_simple(page, timeout=30) * 1000)
+                player_timeout_ms = self._wait_timeout("player_ready", 30000)
+                player_ready_time = round(self._wait_for_player_simple(page, timeout=player_timeout_ms / 1000) * 1000)
                 print(f"[DEBUG] After wait_for_player_simple: {player_ready_time} (type: {type(player_ready_time)})")
+                self._record_wait("player_ready", player_ready_time)
                 player_start = time.time()
-                page.wait_for_selector("video", timeout=15000)
+                page.wait_for_selector("video", timeout=self._wait_timeout("video_selector", 15000))
                 player_init_ms = round((time.time() - player_start) * 1000)
+                self._record_wait("video_selector", player_init_ms)
                 
-                page.wait_for_load_state("networkidle")
                 result = {
                     "playerInitTime": player_init_ms,
-                    "videoStartTime": player_ready_time
+                    "videoStartTime": player_ready_time,
+                    "networkQuietWaitTime": self._wait_for_network_quiet(page),
                 }
                 print(f"[DEBUG] _goto_film_page_and_init_player returning: {result}")
                 return result
             except PlaywrightTimeoutError:
                 raise
                 
-    def _start_video_and_collect_metrics(self, page, scenario: str) -> int:
-        with allure.step("Нажать Play и замерить firstFrameTime"):
+    def _start_video_and_collect_metrics(self, page, scenario: str) -> dict:
+        with allure.step("Нажать Play и замерить первый кадр"):
             try:
                 metrics.inject_plyr_playing_listener(page)
                 page.wait_for_selector(".plyr", timeout=10000)
-                page.click(self.SELECTORS["video_element"])
+                # При автозапуске клик поставил бы видео на паузу
+                if not is_video_playing(page):
+                    page.click(self.SELECTORS["video_element"])
             except Exception as e:
                 raise
+            return wait_for_first_frame(page)
                 
     def _collect_buffering_metrics(self, page):
-        with allure.step("Собрать метрики буферизации"):
+        with allure.step("Собрать метрики буферизации и QoE видео"):
+            qoe_metrics = collect_video_qoe(page)
+            if qoe_metrics is not None:
+                return qoe_metrics
             rebuffer_count = page.evaluate("window.__rebufferCount || 0")
             rebuffer_duration = page.evaluate("window.__rebufferDuration || 0")
             return {
@@ -64,37 +114,107 @@ class BaseUserFlowTest:
                 "rebufferDuration": round(rebuffer_duration)
             }
         
+    def _collect_film_meta(self, page):
+        """Атрибуты фильма для индекса стратифицированной выборки (utils/film_index.py)."""
+        try:
+            return page.evaluate("""() => {
+                const video = document.querySelector('video');
+                let playerType = document.querySelector('.plyr') ? 'plyr' : (video ? 'native' : null);
+                if (playerType && window.Hls) playerType += '+hls.js';
+                // В сценарии A это может быть длительность преролла, поэтому берём только конечные значения больше минуты
+                const duration = video && isFinite(video.duration) && video.duration > 60 ? Math.round(video.duration) : null;
+                return {playerType, videoDuration: duration};
+            }""")
+        except Exception as e:
+            print(f"[WARN] Не удалось определить атрибуты фильма: {e}")
+            return {}
+
     def _wait_for_popup_and_click(self, page, request, report):
         with allure.step("Дождаться появления попапа оплаты и кликнуть"):
             try:
+                mode = request.config.getoption("--popup-fast-forward")
                 popup_start = time.time()
                 popup = page.locator(self.SELECTORS["popup"])
-                popup.wait_for(state="visible", timeout=90000)
-                popup_time_ms = round((time.time() - popup_start) * 1000)
+                if mode == "clock":
+                    popup_time_ms = self._fast_forward_clock_until_visible(page, popup)
+                elif mode == "playback":
+                    popup_time_ms = self._fast_forward_playback_until_visible(page, popup)
+                else:
+                    popup.wait_for(state="visible", timeout=self._wait_timeout("popup", 90000))
+                    popup_time_ms = round((time.time() - popup_start) * 1000)
+                    # Симулированное время ускоренных режимов в историю не попадает
+                    self._record_wait("popup", popup_time_ms)
+                timing = {
+                    "popupAppearTime": popup_time_ms,
+                    "popupAppearWallTime": round((time.time() - popup_start) * 1000),
+                    "popupTimeSource": "real" if mode == "off" else mode,
+                }
+                report["popup_time_simulated"] = mode != "off"
                 popup_locator = page.locator(self.SELECTORS["popup_cta"])
                 
                 if popup_locator:
                     try:
                         popup_locator.click(timeout=5000)
                         return {
-                            "popupAppearTime": popup_time_ms,
+                            **timing,
                             "popupAvailable": True,
                             "popupClickSuccess": True
                         }
                     except:
                         return {
-                            "popupAppearTime": popup_time_ms,
+                            **timing,
                             "popupAvailable": True,
                             "popupClickSuccess": False
                         }
                 else:
                     return {
-                        "popupAppearTime": popup_time_ms,
+                        **timing,
                         "popupAvailable": False,
                         "popupClickSuccess": False
                     }
             except PlaywrightTimeoutError:
                 raise
+
+    def _fast_forward_clock_until_visible(self, page, popup) -> int:
+        """
+        Перематывает таймеры страницы (Playwright clock) шагами POPUP_FAST_FORWARD_STEP_MS,
+        пока не появится попап. Возвращает симулированное время появления попапа (мс).
+        Часы должны быть установлены до загрузки страницы фильма (см. run_user_flow).
+        """
+        start = time.time()
+        simulated_ms = 0
+        while simulated_ms < config.POPUP_FAST_FORWARD_MAX_MS:
+            try:
+                popup.wait_for(state="visible", timeout=200)
+                return simulated_ms + round((time.time() - start) * 1000)
+            except PlaywrightTimeoutError:
+                pass
+            page.clock.fast_forward(config.POPUP_FAST_FORWARD_STEP_MS)
+            simulated_ms += config.POPUP_FAST_FORWARD_STEP_MS
+        raise PlaywrightTimeoutError(
+            f"Попап не появился за {config.POPUP_FAST_FORWARD_MAX_MS} мс симулированного времени"
+        )
+
+    def _fast_forward_playback_until_visible(self, page, popup) -> int:
+        """
+        Ускоряет воспроизведение до POPUP_FAST_FORWARD_PLAYBACK_RATE и ждёт попап.
+        Возвращает симулированное время появления попапа — сколько мс видео
+        было воспроизведено, т.е. сколько ждал бы зритель при обычной скорости.
+        """
+        position = """
+            () => Math.max(0, ...Array.from(document.querySelectorAll('video')).map(v => v.currentTime))
+        """
+        set_rate = "(rate) => document.querySelectorAll('video').forEach(v => { v.playbackRate = rate; })"
+        start_position = page.evaluate(position)
+        page.evaluate(set_rate, config.POPUP_FAST_FORWARD_PLAYBACK_RATE)
+        try:
+            popup.wait_for(state="visible", timeout=self._wait_timeout("popup", 90000))
+            return round((page.evaluate(position) - start_position) * 1000)
+        finally:
+            try:
+                page.evaluate(set_rate, 1)
+            except Exception:
+                pass
                 
     def _collect_payment_metrics(self, page, iframe_start_time, request, report):
         with allure.step("На странице оплаты собрать метрики"):
@@ -111,7 +231,7 @@ class BaseUserFlowTest:
     def _check_payment_button_click(self, page, iframe, pay_method):
         with allure.step("Проверить кликабельность кнопок на странице оплаты"):
             try:
-                page.wait_for_load_state("networkidle")
+                quiet_wait_ms = self._wait_for_network_quiet(page)
                 match pay_method:
                     case "card":
                         bank_card_button = iframe.locator(self.SELECTORS["pay_button_bank_card"])
@@ -125,23 +245,23 @@ class BaseUserFlowTest:
                         state="attached", timeout=10000
                     )
                     bank_card_button.click(timeout=5000)
-                    return {"buttonsCpAvailable": True, "buttonsClickSuccess": True}
+                    return {"buttonsCpAvailable": True, "buttonsClickSuccess": True, "networkQuietWaitTime": quiet_wait_ms}
                 else:
-                    return {"buttonsCpAvailable": False, "buttonsClickSuccess": False}
+                    return {"buttonsCpAvailable": False, "buttonsClickSuccess": False, "networkQuietWaitTime": quiet_wait_ms}
             except PlaywrightTimeoutError:
                 raise
                 
     def _wait_for_payment_form(self, page, iframe, pay_method):
         with allure.step("Проверить появление формы оплаты"):
             try:
-                page.wait_for_load_state("networkidle")
+                quiet_wait_ms = self._wait_for_network_quiet(page)
                 match pay_method:
                     case "card":
                         iframe.locator(self.SELECTORS["pay_form_bank_card"]).wait_for(state="visible")
-                        return {"payFormAppear": True}
+                        return {"payFormAppear": True, "payFormNetworkQuietWaitTime": quiet_wait_ms}
                     case "sbp":
                         iframe.locator(self.SELECTORS["pay_form_sbp"]).wait_for(state="visible")
-                        return {"payFormAppear": True}
+                        return {"payFormAppear": True, "payFormNetworkQuietWaitTime": quiet_wait_ms}
             except Exception as e:
                 return {"payFormAppear": False}
 
@@ -150,7 +270,11 @@ class BaseUserFlowTest:
             try:
                 start_time = time.time()
                 iframe.locator(self.SELECTORS["close_button"]).click(timeout=10000)
-                page.locator(self.SELECTORS["vidu_popup"]).wait_for(state="visible", timeout=30000)
+                wait_start = time.time()
+                page.locator(self.SELECTORS["vidu_popup"]).wait_for(
+                    state="visible", timeout=self._wait_timeout("vidu_popup", 30000)
+                )
+                self._record_wait("vidu_popup", round((time.time() - wait_start) * 1000))
                 popup_load_time_ms = round((time.time() - start_time) * 1000)
                 return {
                     "popupReloadTime": popup_load_time_ms,
@@ -177,7 +301,11 @@ class BaseUserFlowTest:
                 retry_btn.click(timeout=30000)
 
                 # Ждём iframe
-                page.wait_for_selector(self.SELECTORS["payment_iframe"], timeout=15000)
+                wait_start = time.time()
+                page.wait_for_selector(
+                    self.SELECTORS["payment_iframe"], timeout=self._wait_timeout("payment_iframe", 15000)
+                )
+                self._record_wait("payment_iframe", round((time.time() - wait_start) * 1000))
 
                 return {
                     "loadTime": round((time.time() - iframe_start) * 1000),
@@ -190,27 +318,58 @@ class BaseUserFlowTest:
                     "error": str(e)
                 }
                 
-    def _collect_lighthouse_metrics(self, url, request, report):
+    def _enqueue_lighthouse_audit(self, url, step_name, device, throttling, request):
+        """
+        Ставит аудит Lighthouse в фоновую очередь, не блокируя сценарий.
+        Результат будет слит в report["steps"][step_name] в _merge_lighthouse_results.
+        """
+        queue = request.getfixturevalue("lighthouse_queue")
+        future = queue.submit(url, device, throttling)
+        pending = getattr(request.node, "_pending_lighthouse", [])
+        pending.append((step_name, url, future))
+        request.node._pending_lighthouse = pending
+
+    def _merge_lighthouse_results(self, request, report):
+        """Дожидается поставленных в очередь аудитов Lighthouse и сливает их в отчёт."""
+        pending = getattr(request.node, "_pending_lighthouse", [])
+        if not pending:
+            return
+        request.node._pending_lighthouse = []
+        with allure.step("Дождаться результатов Lighthouse"):
+            merge_audit_results(pending, report)
+    
+    def _start_network_capture(self, page, browser_type):
+        """Включает захват сетевого водопада (только Chromium — нужен CDP)."""
+        if browser_type != "chromium":
+            return None
         try:
-            lh_report = run_lighthouse_for_url(url)
+            return NetworkCapture(page)
         except Exception as e:
-            raise
-        lh_metrics = extract_metrics_from_lighthouse(lh_report)
-            
-        ppi = config.calculate_page_performance_index(
-            lcp=lh_metrics.get("lcp"),
-            cls=lh_metrics.get("cls"),
-            tbt=lh_metrics.get("tbt"),
-            ttfb=lh_metrics.get("ttfb"),
-            fid=lh_metrics.get("inp")  # используем INP как замену FID
-        )
-            
-        return {
-            **lh_metrics,
-            "pagePerformanceIndex": ppi,
-            "is_problematic_page": ppi < config.TARGET_PAGE_PERFORMANCE_INDEX
-        }
-    
+            print(f"[WARN] Не удалось включить захват сети: {e}")
+            return None
+
+    def _mark_network_step(self, capture, step_name):
+        """Относит все следующие запросы к шагу step_name."""
+        if capture is not None:
+            capture.set_step(step_name)
+
+    def _finish_network_capture(self, capture, report):
+        """Сводит захваченные запросы в report["network"] и останавливает захват."""
+        if capture is None:
+            return
+        try:
+            report["network"] = capture.summarize()
+        finally:
+            capture.stop()
+        # Итоги по шагам дублируем в steps, чтобы они попали в агрегированную статистику
+        for step_name, totals in report["network"].items():
+            if step_name in report["steps"]:
+                report["steps"][step_name].update({
+                    "networkRequests": totals["requests"],
+                    "networkBytes": totals["bytes"],
+                    "criticalPathTime": totals["criticalPathTime"],
+                })
+
     def _wait_for_player_simple(self, page, timeout=30):
         """Простое ожидание готовности плеера через JS мониторинг"""
         print(f"[INFO] Waiting for player ready (timeout: {timeout}s)")
@@ -309,142 +468,463 @@ class BaseUserFlowTest:
             print(f"[WARNING] Не удалось включить логирование Vidu: {e}")
             return False
                 
-    # Основной метод — шаблонный метод (template method)
-    def run_user_flow(self, page, get_film_url, device, throttling, geo, browser_type, pay_method, request, extra_steps=None):
+    # === Шаги конвейера ===
+    def _target_domain(self) -> str:
+        return urlparse(self.BASE_URL).netloc if self.BASE_URL else ""
+
+    def _step_main_page(self, ctx, lighthouse=False):
+        dns_metrics = None
+        if ctx.browser_type == "chromium":
+            dns_metrics = metrics.collect_network_metrics(ctx.page, self._target_domain())
+        self._goto_main_page(ctx.page, ctx.request, ctx.report)
+        if lighthouse:
+            self._enqueue_lighthouse_audit(self.BASE_URL, "main_page", ctx.device, ctx.throttling, ctx.request)
+        if dns_metrics is None:
+            return None
+        return {
+            "dnsResolveTime": dns_metrics["dnsResolveTime"],
+            "connectTime": dns_metrics["connectTime"]
+        }
+
+    def _step_film_page(self, ctx, lighthouse=False):
+        page = ctx.page
+        if ctx.request.config.getoption("--popup-fast-forward") == "clock" and not ctx.values.get("clock_installed"):
+            # Таймеры страницы фильма должны идти от поддельных часов с самой загрузки
+            page.clock.install()
+            ctx.values["clock_installed"] = True
+        if ctx.browser_type != "chromium":
+            page.goto(ctx.film_url)
+            return None
+        dns_metrics = metrics.collect_network_metrics(page, self._target_domain()) if lighthouse else None
+        result = self._goto_film_page_and_init_player(page, ctx.film_url)
+        if lighthouse:
+            self._enqueue_lighthouse_audit(ctx.film_url, "film_page", ctx.device, ctx.throttling, ctx.request)
+            result.update({
+                "dnsResolveTime": dns_metrics["dnsResolveTime"],
+                "connectTime": dns_metrics["connectTime"]
+            })
+        return result
+
+    def _step_lighthouse_results(self, ctx):
+        # Выполняется в фоне: без allure.step и без обращений к странице
+        pending = getattr(ctx.request.node, "_pending_lighthouse", [])
+        ctx.request.node._pending_lighthouse = []
+        merge_audit_results(pending, ctx.report)
+        return None
+
+    def _step_video_start(self, ctx):
+        scenario = detect_video_scenario(ctx.page)
+        ctx.report["video_scenario"] = scenario
+        ctx.values["scenario"] = scenario
+        return self._start_video_and_collect_metrics(ctx.page, scenario)
+
+    def _step_popup(self, ctx):
+        result = self._wait_for_popup_and_click(ctx.page, ctx.request, ctx.report)
+        ctx.values["iframe_start"] = time.time()
+        return result
+
+    def _step_video_qoe(self, ctx):
+        ctx.report["film_meta"] = self._collect_film_meta(ctx.page)
+        result = self._collect_buffering_metrics(ctx.page)
+        if self._clock_simulated(ctx):
+            # Часы страницы перемотаны к попапу: длительности по performance.now() включают симулированное время
+            result.update(dict.fromkeys(name for name in CLOCK_DEPENDENT_METRICS if name in result))
+        return result
+
+    def _clock_simulated(self, ctx) -> bool:
+        """Режим --popup-fast-forward clock: отмечает отчёт, метрики по часам страницы не записываются."""
+        if ctx.request.config.getoption("--popup-fast-forward") != "clock":
+            return False
+        ctx.report["qoe_time_simulated"] = True
+        return True
+
+    def _step_pay_page(self, ctx):
+        iframe = ctx.page.frame_locator(self.SELECTORS["payment_iframe"])
+        ctx.values["iframe"] = iframe
+        return self._collect_payment_metrics(ctx.page, ctx.values["iframe_start"], ctx.request, ctx.report)
+
+    def _step_pay_buttons(self, ctx):
+        return self._check_payment_button_click(ctx.page, ctx.values["iframe"], ctx.pay_method)
+
+    def _step_pay_form(self, ctx):
+        return self._wait_for_payment_form(ctx.page, ctx.values["iframe"], ctx.pay_method)
+
+    def _step_after_payment_popup(self, ctx):
+        iframe = ctx.values["iframe"]
+        vidu_popup = self._load_popup_after_closing_pay_form(ctx.page, iframe)
+        retry_payment = self._retry_payment_from_vidu_popup(ctx.page, iframe)
+        if vidu_popup.get("error"):
+            ctx.report["error"] = vidu_popup.get("error")
+        return {
+            "viduPopupAppearTime": vidu_popup.get("popupReloadTime"),
+            "viduPopupSuccess": vidu_popup.get("popupIsVisibleAfterReload"),
+            "retryPaymentLoadTime": retry_payment.get("loadTime"),
+            "retryPaymentSuccess": retry_payment.get("success"),
+        }
+
+    def _step_cache(self, ctx, mode):
+        context_args = getattr(ctx.request.node, "_context_args", None)
+        if context_args is None:
+            return None
+        measure = measure_cold if mode == "cold" else measure_warm
+        result = measure(ctx.page.context.browser, context_args, ctx.film_url, ctx.browser_type, ctx.throttling)
+        if result is None:
+            return None
+        ctx.values[f"cache_{mode}"] = result
+        cold = ctx.values.get("cache_cold")
+        if mode == "warm" and cold:
+            # Выигрыш повторного визита
+            result["loadTimeSaving"] = cold["loadTime"] - result["loadTime"]
+            result["transferBytesSaving"] = cold["transferBytes"] - result["transferBytes"]
+        return result
+
+    def _step_return_to_film(self, ctx):
+        if ctx.browser_type != "chromium":
+            return None
+        film_metrics = self._goto_film_page_and_init_player(ctx.page, ctx.film_url)
+        result = {
+            "playerInitTime": film_metrics.get("playerInitTime"),
+            "videoStartTime": film_metrics.get("videoStartTime"),
+        }
+        try:
+            result.update(self._start_video_and_collect_metrics(ctx.page, ctx.values.get("scenario")))
+        except Exception as e:
+            print(f"[WARN] Не удалось замерить первый кадр после возврата: {e}")
+        if "timeToFirstFrame" in result and self._clock_simulated(ctx):
+            # Отсчёт от navigationStart идёт по поддельным часам, уже перемотанным на странице фильма
+            result["timeToFirstFrame"] = None
+        return result
+
+    # === Фабрики шагов: из них домены собирают свои конвейеры ===
+    def main_page_step(self, lighthouse=False) -> PipelineStep:
+        return PipelineStep(
+            "main_page", lambda ctx: self._step_main_page(ctx, lighthouse),
+            produces=("dnsResolveTime", "connectTime"), report_step="main_page",
+            timeout_sec=config.STEP_TIMEOUTS_SEC["main_page"], retries=1, critical=False,
+            title=f"Главная страница {self.BASE_URL}",
+        )
+
+    def film_page_step(self, lighthouse=False) -> PipelineStep:
+        return PipelineStep(
+            "film_page", lambda ctx: self._step_film_page(ctx, lighthouse),
+            produces=("playerInitTime", "videoStartTime"), report_step="film_page",
+            timeout_sec=config.STEP_TIMEOUTS_SEC["film_page"], retries=1,
+            title="Страница фильма и инициализация плеера",
+        )
+
+    def lighthouse_results_step(self) -> PipelineStep:
+        # Фоновый шаг: ожидание аудитов перекрывается с видео и оплатой
+        return PipelineStep(
+            "lighthouse_results", self._step_lighthouse_results,
+            timeout_sec=config.STEP_TIMEOUTS_SEC["lighthouse_results"], critical=False, background=True,
+            title="Результаты Lighthouse",
+        )
+
+    def video_steps(self) -> list:
+        return [
+            PipelineStep(
+                "video_start", self._step_video_start, requires=("film_page",),
+                produces=("timeToFirstFrame", "firstFrameAfterPlay"), report_step="film_page",
+                timeout_sec=config.STEP_TIMEOUTS_SEC["video_start"],
+                title="Запуск видео",
+            ),
+            PipelineStep(
+                "popup", self._step_popup, requires=("video_start",),
+                produces=("popupAppearTime", "popupAvailable", "popupClickSuccess"), report_step="film_page",
+                timeout_sec=config.STEP_TIMEOUTS_SEC["popup"],
+                title="Попап оплаты",
+            ),
+            PipelineStep(
+                "video_qoe", self._step_video_qoe, requires=("video_start",),
+                produces=("rebufferCount", "rebufferDuration"), report_step="film_page",
+                timeout_sec=config.STEP_TIMEOUTS_SEC["video_qoe"], critical=False,
+                title="Буферизация и QoE видео",
+            ),
+        ]
+
+    def payment_steps(self) -> list:
+        return [
+            PipelineStep(
+                "pay_page", self._step_pay_page, requires=("popup",),
+                produces=("iframeCpLoadTime",), report_step="pay_page",
+                timeout_sec=config.STEP_TIMEOUTS_SEC["pay_page"],
+                title="Страница оплаты",
+            ),
+            PipelineStep(
+                "pay_buttons", self._step_pay_buttons, requires=("pay_page",),
+                produces=("buttonsCpAvailable", "buttonsClickSuccess"), report_step="pay_page",
+                timeout_sec=config.STEP_TIMEOUTS_SEC["pay_buttons"],
+                title="Кнопки оплаты",
+            ),
+            PipelineStep(
+                "pay_form", self._step_pay_form, requires=("pay_buttons",),
+                produces=("payFormAppear",), report_step="pay_page",
+                timeout_sec=config.STEP_TIMEOUTS_SEC["pay_form"],
+                title="Форма оплаты",
+            ),
+            PipelineStep(
+                "after_payment_popup", self._step_after_payment_popup, requires=("pay_form",),
+                produces=("viduPopupAppearTime", "viduPopupSuccess", "retryPaymentLoadTime", "retryPaymentSuccess"),
+                report_step="after_payment_popup",
+                timeout_sec=config.STEP_TIMEOUTS_SEC["after_payment_popup"], critical=False,
+                title="Попап Vidu после закрытия оплаты",
+            ),
+        ]
+
+    def cache_steps(self) -> list:
+        # Свои контексты: не зависят от остальных шагов и не трогают страницу теста
+        return [
+            PipelineStep(
+                f"cache_{mode}", lambda ctx, mode=mode: self._step_cache(ctx, mode),
+                produces=("dnsResolveTime", "connectTime", "ttfb", "loadTime"), report_step=f"cache_{mode}",
+                timeout_sec=config.STEP_TIMEOUTS_SEC[f"cache_{mode}"], critical=False,
+                title=title,
+            )
+            for mode, title in (("cold", "Страница фильма: холодный кэш"), ("warm", "Страница фильма: тёплый кэш"))
+        ]
+
+    def return_to_film_step(self) -> PipelineStep:
+        # Зависит только от страницы фильма: сбой оплаты не лишает нас этих метрик
+        return PipelineStep(
+            "after_return_without_payment", self._step_return_to_film, requires=("film_page",),
+            produces=("playerInitTime", "videoStartTime"), report_step="after_return_without_payment",
+            timeout_sec=config.STEP_TIMEOUTS_SEC["after_return_without_payment"], critical=False,
+            title="Возврат к фильму без оплаты",
+        )
+
+    def build_steps(self, lighthouse=False) -> list:
+        """
+        Конвейер сценария: [главная →] фильм (+ Lighthouse в фоне) → видео → попап → оплата → возврат.
+        Главная страница — при WITH_MAIN_PAGE; домены с иным сценарием переопределяют метод.
+        """
+        steps = [self.main_page_step(lighthouse)] if self.WITH_MAIN_PAGE else []
+        steps.append(self.film_page_step(lighthouse))
+        if lighthouse:
+            steps.append(self.lighthouse_results_step())
+        return steps + self.video_steps() + self.payment_steps() + [self.return_to_film_step()]
+
+    # Основной метод: выполняет конвейер шагов
+    def run_user_flow(self, page, get_film_url, device, throttling, geo, browser_type, pay_method, request, steps=None):
+        """
+        Общий сценарий. steps — список PipelineStep (по умолчанию build_steps()).
+        Если get_film_url — список (режим --film-batch-size), фильмы проходятся пакетом в одном контексте;
+        если FilmStream (режим --film-stream) — по одному из потока.
+        """
+        steps = self._steps_for_start_mode(steps if steps is not None else self.build_steps(), request)
+        if request.config.getoption("--cache-compare") == "on":
+            # До основного сценария: домен ещё не прогрет навигацией теста
+            steps = self.cache_steps() + steps
+        if isinstance(get_film_url, FilmStream):
+            return self.run_film_stream(page, get_film_url, device, throttling, geo, browser_type, pay_method, request, steps)
+        if isinstance(get_film_url, (list, tuple)):
+            return self.run_film_batch(page, list(get_film_url), device, throttling, geo, browser_type, pay_method, request, steps)
+
+        allure.dynamic.description(self._flow_description(device, throttling, geo, browser_type, pay_method, request))
+        report, error = self._execute_flow(page, get_film_url, device, throttling, geo, browser_type, pay_method, request, steps)
+        if error is not None:
+            raise error
+        if report.get("is_problematic_flow"):
+            pytest.fail("Проблемный запуск", pytrace=False)
+        return report
+
+    def run_film_batch(self, page, film_urls, device, throttling, geo, browser_type, pay_method, request, steps=None):
         """
-        Общий сценарий. extra_steps — словарь с кастомными шагами: 
-        {"main_page": func, "film_page_before_video": func}
+        Пакетный режим: главная страница загружается один раз на контекст,
+        затем фильмы проходятся по очереди. Между фильмами сбрасывается только
+        состояние, влияющее на пейволл (cookies и localStorage vidu_log).
+        Каждый фильм получает свой отчёт; метрики шагов BATCH_ONCE_STEPS
+        (главная страница) попадают только в отчёт первого фильма.
+        """
+        steps = steps if steps is not None else self.build_steps()
+        per_film_steps = [step for step in steps if step.name not in self.BATCH_ONCE_STEPS]
+        batch_id = request.node.name
+        allure.dynamic.description(
+            self._flow_description(device, throttling, geo, browser_type, pay_method, request)
+            + f"\n**Пакет**: {len(film_urls)} фильмов"
+        )
+
+        reports, errors = [], []
+        request.node._report_batch = reports
+        shared_values = {}
+        for index, film_url in enumerate(film_urls):
+            with allure.step(f"Фильм {index + 1}/{len(film_urls)}: {film_url}"):
+                if index > 0:
+                    self._reset_paywall_state(page, request)
+                report, error = self._execute_flow(
+                    page, film_url, device, throttling, geo, browser_type, pay_method, request,
+                    steps if index == 0 else per_film_steps,
+                    batch={"id": batch_id, "index": index, "size": len(film_urls)},
+                    shared_values=shared_values,
+                )
+            reports.append(report)
+            if error is not None:
+                errors.append(f"{film_url}: {error}")
+
+        if errors:
+            pytest.fail(f"Упали {len(errors)} из {len(film_urls)} фильмов пакета:\n" + "\n".join(errors), pytrace=False)
+        problematic = sum(1 for r in reports if r.get("is_problematic_flow"))
+        if problematic:
+            pytest.fail(f"Проблемных запусков в пакете: {problematic} из {len(film_urls)}", pytrace=False)
+        return reports
+
+    def run_film_stream(self, page, film_stream, device, throttling, geo, browser_type, pay_method, request, steps=None):
+        """
+        Потоковый режим: один тест на конфигурацию берёт фильмы из FilmStream по одному.
+        Каждый фильм — отдельная единица работы: свой шаг Allure с JSON-отчётом,
+        отдельный результат Allure и запись в агрегаторе, истории и чекпоинте (фикстура stream_sink).
+        Между фильмами сбрасывается состояние пейволла, как в пакетном режиме.
+        """
+        steps = steps if steps is not None else self.build_steps()
+        sink = request.getfixturevalue("stream_sink")
+        allure.dynamic.description(
+            self._flow_description(device, throttling, geo, browser_type, pay_method, request)
+            + f"\n**Поток**: {film_stream.film_list_path}"
+        )
+
+        passed, problematic, errors = 0, 0, []
+        for index, film_url in enumerate(sink.pending(film_stream)):
+            with allure.step(f"Фильм {index + 1}: {film_url}"):
+                if index > 0:
+                    self._reset_paywall_state(page, request)
+                started = time.time()
+                report, error = self._execute_flow(
+                    page, film_url, device, throttling, geo, browser_type, pay_method, request, steps
+                )
+            sink.accept(report, time.time() - started)
+            if error is not None:
+                errors.append(f"{film_url}: {error}")
+            elif report.get("is_problematic_flow"):
+                problematic += 1
+            else:
+                passed += 1
+
+        print(f"[INFO] {request.node.name}: фильмов без замечаний {passed}, проблемных {problematic}, с ошибкой {len(errors)}")
+        if errors:
+            shown = "\n".join(errors[:self.STREAM_ERRORS_SHOWN])
+            more = f"\n... и ещё {len(errors) - self.STREAM_ERRORS_SHOWN}" if len(errors) > self.STREAM_ERRORS_SHOWN else ""
+            pytest.fail(f"Упали {len(errors)} фильмов потока:\n{shown}{more}", pytrace=False)
+        if problematic:
+            pytest.fail(f"Проблемных запусков в потоке: {problematic}", pytrace=False)
+
+    def _reset_paywall_state(self, page, request):
+        """
+        Сбрасывает между фильмами пакета только то, что влияет на пейволл.
+        При тёплом старте cookies возвращаются к состоянию снимка.
+        """
+        with allure.step("Сбросить cookies и vidu_log перед следующим фильмом"):
+            page.context.clear_cookies()
+            state_path = getattr(request.node, "_storage_state_path", None)
+            if state_path:
+                page.context.add_cookies(StorageStateStore.cookies(state_path))
+            try:
+                page.evaluate("() => { localStorage.removeItem('vidu_log'); }")
+            except Exception as e:
+                print(f"[WARN] Не удалось очистить localStorage: {e}")
+
+    def _flow_description(self, device, throttling, geo, browser_type, pay_method, request) -> str:
+        return (
+            f"**Домен**: {self.DOMAIN_NAME}\n"
+            f"**Устройство**: {device}\n"
+            f"**Сеть**: {throttling}\n"
+            f"**ГЕО**: {geo}\n"
+            f"**Браузер**: {browser_type}\n"
+            f"**Способ оплаты**: {pay_method}\n"
+            f"**Старт**: {self._start_mode(request)}"
+        )
+
+    def _start_mode(self, request) -> str:
+        """Фактический режим старта: фикстура page откатывается к cold, если прогрев не удался."""
+        return getattr(request.node, "_start_mode", "cold")
+
+    def _steps_for_start_mode(self, steps, request) -> list:
+        """При тёплом старте убирает установочные шаги WARM_SKIP_STEPS."""
+        if self._start_mode(request) != "warm":
+            return steps
+        return [step for step in steps if step.name not in self.WARM_SKIP_STEPS]
+
+    def _execute_flow(self, page, film_url, device, throttling, geo, browser_type, pay_method, request, steps,
+                      batch=None, shared_values=None):
+        """
+        Выполняет конвейер для одного фильма и сохраняет отчёт.
+        Возвращает (report, error): error — исключение критичного шага или None.
         """
         report = {
             "test_name": request.node.name,
             "domain": self.DOMAIN_NAME,
-            "film_url": get_film_url,
+            "film_url": film_url,
             "device": device,
             "throttling": throttling,
             "geoposition": geo,
             "browser_type": browser_type,
+            "start_mode": self._start_mode(request),
             "steps": {},
             "is_problematic_flow": False,
             "error": None
         }
-
-        allure.dynamic.description(
-            f"**Домен**: {self.DOMAIN_NAME}\n"
-            f"**Устройство**: {device}\n"
-            f"**Сеть**: {throttling}\n"
-            f"**ГЕО**: {geo}\n"
-            f"**Браузер**: {browser_type}\n"
-            f"**Способ оплаты**: {pay_method}"
-        )
+        if batch is not None:
+            report["batch"] = batch
         
         request.node._report_data = report
+        self._flow_timeouts = FlowTimeouts(
+            request.getfixturevalue("adaptive_timeouts"), self.DOMAIN_NAME, device, throttling, report
+        )
+        network_capture = self._start_network_capture(page, browser_type)
+        ctx = FlowContext(page, request, report, film_url, device, throttling, geo, browser_type, pay_method)
+        if shared_values is not None:
+            # Замеры кэша предыдущего фильма не должны попасть в выигрыш этого
+            for key in self.PER_FILM_VALUES:
+                shared_values.pop(key, None)
+            ctx.values = shared_values
+        error = None
         
         try:
-            
-            if self.DOMAIN_NAME == "calls7" or self.DOMAIN_NAME == "tests.goodmovie":
-                # 1. Главная страница
-                if extra_steps and "main_page" in extra_steps:
-                    extra_steps["main_page"](page, request, report)
-                else:
-                    self._goto_main_page(page, request, report)
-
-            # 2. Страница фильма
-            if browser_type == "chromium":
-                try:
-                    film_metrics = self._goto_film_page_and_init_player(page, get_film_url)
-                    report["steps"]["film_page"] = film_metrics
-                except Exception as e:
-                    print(f"Не удалось собрать метрики видеоплеера: {e}")
-                    report["steps"]["film_page"] = {
-                        "playerInitTime": None,
-                        "videoStartTime": None  
-                    }
-            else:
-                page.goto(get_film_url)
-                
-
-            if extra_steps and "film_page_before_video" in extra_steps:
-                extra_steps["film_page_before_video"](page, request, report)
-                
-            # 3. Определяем сценарий
-            scenario = detect_video_scenario(page)
-            report["video_scenario"] = scenario
-
-            # 4. Буферизация
-            buffer_metrics = self._collect_buffering_metrics(page)
-            if "film_page" in report["steps"]:
-                report["steps"]["film_page"].update(buffer_metrics)
-            else:
-                report["steps"]["film_page"] = buffer_metrics
-            
-            self._start_video_and_collect_metrics(page, scenario)
-
-            # 5. Попап
-            popup_metrics = self._wait_for_popup_and_click(page, request, report)
-            report["steps"]["film_page"].update(popup_metrics)
-            iframe_start = time.time()
-
-            # 6. Оплата
-            iframe = page.frame_locator(self.SELECTORS["payment_iframe"])
-            payment_meta = self._collect_payment_metrics(page, iframe_start, request, report)
-            report["steps"]["pay_page"] = payment_meta
-
-            if extra_steps and "pay_page_before_click" in extra_steps:
-                extra_steps["pay_page_before_click"](page, request, report)
-
-            button_metrics = self._check_payment_button_click(page, iframe, pay_method)
-            report["steps"]["pay_page"].update(button_metrics)
-
-            payment_form_appear = self._wait_for_payment_form(page, iframe, pay_method)
-            report["steps"]["pay_page"].update(payment_form_appear)
-            
-            # 7. Повторная загрузка попапа
-            vidu_popup = self._load_popup_after_closing_pay_form(page, iframe)
-            retry_payment = self._retry_payment_from_vidu_popup(page, iframe)
-            report["steps"]["after_payment_popup"] = {
-                "viduPopupAppearTime": vidu_popup.get("popupReloadTime"),
-                "viduPopupSuccess": vidu_popup.get("popupIsVisibleAfterReload"),
-                "retryPaymentLoadTime": retry_payment.get("loadTime"),
-                "retryPaymentSuccess": retry_payment.get("success"),
-            }
-            report["error"] = vidu_popup.get("error")
-            
-            # 8. Повторная загрузка видео
-            if browser_type == "chromium":
-                try:
-                    film_metrics_after_return = self._goto_film_page_and_init_player(page, get_film_url)
-                    report["steps"]["after_return_without_payment"] = {
-                        "playerInitTime": film_metrics_after_return.get("playerInitTime"),
-                        "videoStartTime": film_metrics_after_return.get("videoStartTime"),
-                    }
-                except Exception as e:
-                    print(f"Не удалось собрать метрики видеоплеера: {e}")
-                    report["steps"]["film_page"] = {
-                        "playerInitTime": None,
-                        "videoStartTime": None  
-                    }
-            
-            
-            # Завершение
-            if log_issues_if_any(report):
+            pipeline = StepPipeline(
+                steps if steps is not None else self.build_steps(),
+                on_step_start=lambda step: self._mark_network_step(network_capture, step.report_step or step.name),
+            )
+            report["pipeline"] = pipeline.run(ctx)
+            error = pipeline.critical_error
+            if error is not None:
+                report["error"] = str(error)
                 report["is_problematic_flow"] = True
-            request.node._report_data = report
-            if report.get("is_problematic_flow"):
-                pytest.fail("Проблемный запуск", pytrace=False)
         except Exception as e:
             report["error"] = str(e)
             report["is_problematic_flow"] = True
-            raise
+            error = e
         finally:
+            # Аудиты Lighthouse сливаются здесь и при успехе, и при падении сценария;
+            # проверка порогов — после слияния, чтобы учесть pagePerformanceIndex
+            try:
+                self._merge_lighthouse_results(request, report)
+            except Exception as e:
+                print(f"[WARN] Не удалось слить результаты Lighthouse: {e}")
+            try:
+                if log_issues_if_any(report):
+                    report["is_problematic_flow"] = True
+            except Exception as e:
+                print(f"[WARN] Не удалось проверить пороги метрик: {e}")
+            try:
+                self._finish_network_capture(network_capture, report)
+            except Exception as e:
+                print(f"[WARN] Не удалось свести сетевой водопад: {e}")
             # Сохранение отчёта
-            self._save_report(report, get_film_url, device, throttling, geo, browser_type, pay_method)
-        return report
+            self._save_report(
+                report, film_url, device, throttling, geo, browser_type, pay_method,
+                network_table=network_capture.table if network_capture else None
+            )
+        return report, error
     
-    def _save_report(self, report, film_url, device, throttling, geo, browser_type, pay_method):
+    def _save_report(self, report, film_url, device, throttling, geo, browser_type, pay_method, network_table=None):
         Path("reports").mkdir(exist_ok=True)
         safe_url = sanitize_filename(film_url)
         test_name = report["test_name"].split("[")[0]
-        report_path = f"reports/report_{self.DOMAIN_NAME}_{test_name}_{safe_url}_{device}_{throttling}_{geo}_{browser_type}_{pay_method}.json"
+        report_name = (
+            f"report_{self.DOMAIN_NAME}_{test_name}_{safe_url}_{device}_{throttling}_{geo}_{browser_type}_{pay_method}"
+            f"_{report.get('start_mode', 'cold')}"
+        )
+        report_path = f"reports/{report_name}.json"
+        if network_table is not None and len(network_table):
+            report["network_table"] = network_table.save(f"reports/network/{report_name}.json.gz")
         with open(report_path, "w", encoding="utf-8") as f:
             json.dump(report, f, indent=2, ensure_ascii=False)
         allure.attach.file(report_path, name="JSON-отчёт", extension="json")
\ No newline at end of file
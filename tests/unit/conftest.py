@@ -0,0 +1,109 @@
+"""
+Локальный тестовый HTTP-сервер для проверок модулей без внешней сети.
+
+standin — ThreadingHTTPServer на 127.0.0.1 со случайным портом: маршрут
+(путь без query) → функция запроса, возвращающая (статус, заголовки, тело).
+Заголовок Transfer-Encoding: chunked в ответе маршрута отправляет тело
+частями. catalog_site — листинг фильмов ?offset=&limit= поверх standin
+с ETag и ответом 304 на If-None-Match.
+"""
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+class StandInServer:
+    def __init__(self):
+        self.routes: Dict[str, Callable[[dict], Response]] = {}
+        self.requests: List[dict] = []
+        self._lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                request = {
+                    "path": parts.path,
+                    "query": {name: values[0] for name, values in parse_qs(parts.query).items()},
+                    "headers": {name.lower(): value for name, value in self.headers.items()},
+                    "client_port": self.client_address[1],
+                }
+                with standin._lock:
+                    standin.requests.append(request)
+                route = standin.routes.get(parts.path)
+                status, headers, body = route(request) if route else (404, {}, b"not found")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                chunked = headers.get("Transfer-Encoding") == "chunked"
+                if not chunked:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if not chunked:
+                    self.wfile.write(body)
+                    return
+                for start in range(0, len(body), 100):
+                    chunk = body[start:start + 100]
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def route(self, path: str, handler: Callable[[dict], Response]) -> None:
+        self.routes[path] = handler
+
+    def requests_to(self, path: str) -> List[dict]:
+        return [r for r in self.requests if r["path"] == path]
+
+
+@pytest.fixture()
+def standin():
+    server = StandInServer()
+    thread = threading.Thread(target=server.server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+class CatalogSite:
+    """Листинг фильмов на тестовом сервере: новые фильмы — в начале списка."""
+
+    def __init__(self, standin: StandInServer, films: int):
+        self.standin = standin
+        self.films = [f"/film-{i}/{i}" for i in range(films, 0, -1)]
+        standin.route("/", self._listing)
+
+    def _listing(self, request: dict) -> Response:
+        offset = int(request["query"].get("offset", 0))
+        limit = int(request["query"].get("limit", 100))
+        cards = "".join(f'<div class="movie-card" data-url="{slug}"></div>' for slug in self.films[offset:offset + limit])
+        body = f"<html><body>{cards}</body></html>".encode()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if request["headers"].get("if-none-match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag, "Content-Type": "text/html; charset=utf-8"}, body
+
+    def listing_requests(self) -> int:
+        return len(self.standin.requests_to("/"))
+
+
+@pytest.fixture()
+def catalog_site(standin):
+    return CatalogSite(standin, films=537)
@@ -0,0 +1,105 @@
+"""Скетч задержек и адаптивные таймауты ожиданий (utils/adaptive_timeouts.py)."""
+import random
+
+import pytest
+
+import config
+from utils.adaptive_timeouts import AdaptiveTimeouts, FlowTimeouts, LatencySketch
+
+pytestmark = pytest.mark.unit
+
+QUANTILES = [0.0, 0.1, 0.5, 0.9, 0.99, 0.999, 1.0]
+
+
+def latencies(count, seed=0):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(7, 1) for _ in range(count)]
+
+
+def exact_quantile(values, q):
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_quantile_within_relative_accuracy(accuracy):
+    values = latencies(5000)
+    sketch = LatencySketch(relative_accuracy=accuracy)
+    for value in values:
+        sketch.add(value)
+    for q in QUANTILES:
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= accuracy * exact
+
+
+def test_bucket_collapse_keeps_upper_quantiles():
+    values = latencies(5000)
+    sketch = LatencySketch(relative_accuracy=0.01, max_buckets=64)
+    for value in values:
+        sketch.add(value)
+    assert len(sketch.counts) <= 64
+    assert sketch.count == len(values)
+    for q in (0.99, 0.999):
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * exact
+
+
+def test_sketch_round_trip():
+    sketch = LatencySketch()
+    for value in latencies(100):
+        sketch.add(value)
+    restored = LatencySketch.from_dict(sketch.to_dict())
+    assert restored.count == sketch.count
+    assert restored.quantile(0.999) == sketch.quantile(0.999)
+    assert LatencySketch().quantile(0.5) is None
+
+
+def fill(timeouts, values):
+    for value in values:
+        timeouts.record("example.com", "popup", "desktop", "none", value)
+
+
+def choose(timeouts, default_ms):
+    return timeouts.timeout_ms("example.com", "popup", "desktop", "none", default_ms)
+
+
+def test_default_timeout_until_enough_samples(tmp_path):
+    timeouts = AdaptiveTimeouts(str(tmp_path / "sketches.json"))
+    fill(timeouts, [5000] * (config.ADAPTIVE_TIMEOUT_MIN_SAMPLES - 1))
+    assert choose(timeouts, 90000) == {
+        "timeout_ms": 90000, "source": "default", "samples": config.ADAPTIVE_TIMEOUT_MIN_SAMPLES - 1, "p999_ms": None,
+    }
+    fill(timeouts, [5000])
+    assert choose(timeouts, 90000)["source"] == "adaptive"
+
+
+@pytest.mark.parametrize("latency_ms", [10, 100, 1000, 5000, 20000, 60000, 200000])
+def test_timeout_stays_between_min_and_hard_default(tmp_path, latency_ms):
+    timeouts = AdaptiveTimeouts(str(tmp_path / "sketches.json"))
+    fill(timeouts, [latency_ms] * config.ADAPTIVE_TIMEOUT_MIN_SAMPLES)
+    choice = choose(timeouts, 90000)
+    assert config.ADAPTIVE_TIMEOUT_MIN_MS <= choice["timeout_ms"] <= 90000
+    expected = latency_ms * config.ADAPTIVE_TIMEOUT_SAFETY_FACTOR
+    if config.ADAPTIVE_TIMEOUT_MIN_MS < expected < 90000:
+        assert choice["timeout_ms"] == pytest.approx(expected, rel=config.LATENCY_SKETCH_ACCURACY)
+
+
+def test_disabled_service_keeps_hard_timeout(tmp_path):
+    timeouts = AdaptiveTimeouts(str(tmp_path / "sketches.json"), enabled=False)
+    fill(timeouts, [1000] * config.ADAPTIVE_TIMEOUT_MIN_SAMPLES)
+    assert choose(timeouts, 90000)["timeout_ms"] == 90000
+
+
+def test_sketches_survive_save_and_load(tmp_path):
+    path = str(tmp_path / "latency" / "sketches.json")
+    timeouts = AdaptiveTimeouts(path)
+    fill(timeouts, [4000] * config.ADAPTIVE_TIMEOUT_MIN_SAMPLES)
+    timeouts.save()
+    assert choose(AdaptiveTimeouts(path), 90000) == choose(timeouts, 90000)
+
+
+def test_flow_timeouts_record_choice_in_report(tmp_path):
+    report = {}
+    flow = FlowTimeouts(AdaptiveTimeouts(str(tmp_path / "sketches.json")), "example.com", "desktop", "none", report)
+    assert flow.get("popup", 90000) == 90000
+    assert report["timeouts"]["popup"]["source"] == "default"
+    assert FlowTimeouts(None, "example.com", "desktop", "none", report).get("popup", 1234) == 1234
@@ -0,0 +1,47 @@
+"""Отдельные результаты Allure для фильмов потокового режима (utils/allure_units.py)."""
+import json
+
+import pytest
+from allure_commons import plugin_manager
+from allure_commons.logger import AllureMemoryLogger
+from allure_commons.utils import md5
+
+from utils.allure_units import report_unit_result
+
+pytestmark = pytest.mark.unit
+
+FILM_URL = "https://example.test/film/1"
+
+
+@pytest.fixture()
+def allure_memory():
+    logger = AllureMemoryLogger()
+    plugin_manager.register(logger)
+    yield logger
+    plugin_manager.unregister(logger)
+
+
+@pytest.mark.parametrize("report, status, expected", [
+    ({"film_url": FILM_URL, "error": None}, "passed", "passed"),
+    ({"film_url": FILM_URL, "is_problematic_flow": True}, "problematic", "failed"),
+    ({"film_url": FILM_URL, "error": "Timeout 30000ms"}, "failed", "broken"),
+])
+def test_each_film_gets_own_result(allure_memory, report, status, expected):
+    key = f"tests/test_flow.py::test_flow[stream]|{FILM_URL}"
+    uuid = report_unit_result("test_flow[stream]: film 1", key, key, status, report, 1000, 2000, {"suite": "test_flow"})
+    result, = allure_memory.test_cases
+    assert result["uuid"] == uuid
+    assert result["status"] == expected
+    assert result["historyId"] == md5(key)
+    assert {"name": "suite", "value": "test_flow"} in result["labels"]
+    attachment, = result["attachments"]
+    assert json.loads(allure_memory.attachments[attachment["source"]])["film_url"] == FILM_URL
+    if status == "failed":
+        assert result["statusDetails"]["message"] == "Timeout 30000ms"
+
+
+def test_results_have_distinct_uuids(allure_memory):
+    for index in range(2):
+        report_unit_result(f"film {index}", "key", f"key{index}", "passed", {"film_url": FILM_URL}, 0, 1, {})
+    assert len({r["uuid"] for r in allure_memory.test_cases}) == 2
+    assert len({r["historyId"] for r in allure_memory.test_cases}) == 2
@@ -0,0 +1,88 @@
+"""Асинхронный HTTP-клиент (utils/async_http.py) на локальном тестовом сервере."""
+import asyncio
+import gzip
+import time
+
+import pytest
+
+from utils.async_http import AsyncHttpClient, TokenBucket
+
+pytestmark = pytest.mark.unit
+
+BODY = ("<html>" + "фильм " * 500 + "</html>").encode("utf-8")
+
+
+async def test_keep_alive_connection_is_reused(standin):
+    standin.route("/page", lambda request: (200, {"Content-Type": "text/html"}, BODY))
+    async with AsyncHttpClient() as client:
+        first = await client.get(standin.url("/page"))
+        second = await client.get(standin.url("/page"))
+    assert first.timings["reused"] is False
+    assert first.timings["address"] == "127.0.0.1"
+    assert second.timings["reused"] is True
+    assert second.timings["dns"] == second.timings["connect"] == second.timings["tls"] == 0
+    ports = {r["client_port"] for r in standin.requests_to("/page")}
+    assert len(ports) == 1
+
+
+async def test_chunked_body(standin):
+    standin.route("/chunked", lambda request: (200, {"Transfer-Encoding": "chunked"}, BODY))
+    async with AsyncHttpClient() as client:
+        response = await client.get(standin.url("/chunked"))
+        again = await client.get(standin.url("/chunked"))
+    assert response.body == BODY
+    assert response.timings["size"] == len(BODY)
+    # Тело дочитано до конца — соединение пригодно для следующего запроса
+    assert again.timings["reused"] is True
+
+
+async def test_gzip_body(standin):
+    compressed = gzip.compress(BODY)
+    standin.route("/gzip", lambda request: (
+        200, {"Content-Encoding": "gzip", "Content-Type": "text/html; charset=utf-8"}, compressed
+    ))
+    async with AsyncHttpClient() as client:
+        response = await client.get(standin.url("/gzip"))
+    assert response.body == BODY
+    assert response.text.startswith("<html>фильм")
+    assert response.timings["transfer_size"] == len(compressed) < response.timings["size"]
+    assert "gzip" in standin.requests_to("/gzip")[0]["headers"]["accept-encoding"]
+
+
+async def test_gzip_chunked_body(standin):
+    standin.route("/both", lambda request: (
+        200, {"Content-Encoding": "gzip", "Transfer-Encoding": "chunked"}, gzip.compress(BODY)
+    ))
+    async with AsyncHttpClient() as client:
+        response = await client.get(standin.url("/both"))
+    assert response.body == BODY
+
+
+async def test_redirect_is_followed(standin):
+    standin.route("/old", lambda request: (301, {"Location": "/new"}, b""))
+    standin.route("/new", lambda request: (200, {}, BODY))
+    async with AsyncHttpClient() as client:
+        response = await client.get(standin.url("/old"))
+    assert response.status == 200
+    assert response.url == standin.url("/new")
+    assert response.timings["redirects"] == [standin.url("/old")]
+
+
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, capacity=1)
+    started = time.monotonic()
+    for _ in range(6):
+        await bucket.acquire()
+    elapsed = time.monotonic() - started
+    # Первый токен есть сразу, остальные пять — по 1/20 с
+    assert 0.23 <= elapsed < 1.0
+
+
+async def test_rate_limiter_applies_to_parallel_requests(standin):
+    standin.route("/page", lambda request: (200, {}, b"ok"))
+    async with AsyncHttpClient(rate_limiter=TokenBucket(rate=20, capacity=2)) as client:
+        started = time.monotonic()
+        await asyncio.gather(*(client.get(standin.url("/page")) for _ in range(8)))
+        elapsed = time.monotonic() - started
+    # Всплеск — два запроса, остальные шесть — по 1/20 с
+    assert elapsed >= 0.28
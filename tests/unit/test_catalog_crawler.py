@@ -0,0 +1,69 @@
+"""Обход каталога без браузера (utils/catalog_crawler.py, utils/collect_film_urls.py) на тестовом листинге."""
+import pytest
+
+import utils.collect_film_urls as collect_module
+from utils.catalog_crawler import CatalogCrawlError, crawl_catalog, parse_film_urls
+
+pytestmark = pytest.mark.unit
+
+
+def test_parse_film_urls_strips_query_and_keeps_order():
+    html = (
+        '<div class="movie-card big" data-url="/b/2?ref=1"></div>'
+        '<div class="other" data-url="/x/9"></div>'
+        '<div class="movie-card" data-url="https://example.org/a/1#top"></div>'
+        '<div class="movie-card" data-url="/b/2"></div>'
+    )
+    assert parse_film_urls(html, "https://example.org/?offset=0") == [
+        "https://example.org/b/2", "https://example.org/a/1",
+    ]
+
+
+async def test_crawl_stops_at_pagination_end(catalog_site):
+    urls = await crawl_catalog(catalog_site.standin.base_url, limit=100, concurrency=4, rate=1000, burst=1000)
+    assert urls == sorted(catalog_site.standin.url(slug) for slug in catalog_site.films)
+    offsets = [int(r["query"]["offset"]) for r in catalog_site.standin.requests_to("/")]
+    # Первая пустая страница — offset 600; после неё воркеры новых страниц не берут
+    assert 600 in offsets
+    assert max(offsets) < 600 + 4 * 100
+
+
+async def test_failing_first_page_raises(standin):
+    standin.route("/", lambda request: (500, {}, b"error"))
+    with pytest.raises(CatalogCrawlError):
+        await crawl_catalog(standin.base_url, concurrency=2, rate=1000, burst=1000)
+
+
+async def test_failing_later_page_ends_the_walk(catalog_site):
+    listing = catalog_site.standin.routes["/"]
+    catalog_site.standin.route("/", lambda request: (
+        (500, {}, b"error") if request["query"].get("offset") == "300" else listing(request)
+    ))
+    urls = await crawl_catalog(catalog_site.standin.base_url, limit=100, concurrency=2, rate=1000, burst=1000)
+    assert len(urls) == 300
+
+
+@pytest.fixture()
+def browser_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(collect_module, "collect_film_urls_browser",
+                        lambda base_url, limit, max_pages: calls.append(base_url) or ["from-browser"])
+    return calls
+
+
+def test_http_catalog_does_not_start_browser(catalog_site, browser_calls):
+    urls = collect_module.collect_film_urls(catalog_site.standin.base_url, max_pages=10)
+    assert len(urls) == 537
+    assert browser_calls == []
+
+
+def test_listing_without_cards_falls_back_to_browser(standin, browser_calls):
+    standin.route("/", lambda request: (200, {"Content-Type": "text/html"}, b"<html><div id=app></div></html>"))
+    assert collect_module.collect_film_urls(standin.base_url, max_pages=10) == ["from-browser"]
+    assert browser_calls == [standin.base_url]
+
+
+def test_unavailable_listing_falls_back_to_browser(standin, browser_calls):
+    standin.route("/", lambda request: (503, {}, b"maintenance"))
+    assert collect_module.collect_film_urls(standin.base_url, max_pages=10) == ["from-browser"]
+    assert browser_calls == [standin.base_url]
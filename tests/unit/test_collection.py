@@ -0,0 +1,148 @@
+"""
+Сбор тестов с опциями планировщика: pytest --collect-only в отдельном процессе,
+без браузера и сети. Рабочий каталог — временный, поэтому .cache/ и
+allure-results/ прогона не трогают файлы проекта.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytestmark = pytest.mark.unit
+
+ROOT = Path(__file__).resolve().parents[2]
+DOMAIN_TESTS = ROOT / "tests" / "domains" / "goodmovie"
+FILM_URL = "https://tests.goodmovie.net/kulinarnyy-tehnikum/6110"
+
+
+def collect(cwd: Path, *options: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-m", "pytest", "--collect-only", "-q", "-s", "-p", "no:cacheprovider",
+         str(DOMAIN_TESTS), *options],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+
+
+def collected_ids(result: subprocess.CompletedProcess) -> list:
+    return [line.strip() for line in result.stdout.splitlines() if line.strip().startswith("<Function")]
+
+
+def test_schedule_history_collects(tmp_path):
+    result = collect(tmp_path, "--schedule", "history")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "INTERNALERROR" not in result.stdout + result.stderr
+    assert "Очередь по истории" in result.stdout
+
+
+def test_schedule_history_promotes_probe_anomalies(tmp_path):
+    probes = tmp_path / ".cache" / "history" / "probes.json"
+    probes.parent.mkdir(parents=True)
+    probes.write_text(json.dumps({
+        f"probe|{FILM_URL}": [{"ts": time.time(), "status": "failed", "duration_sec": 0.1, "metrics": {}}],
+    }), encoding="utf-8")
+    result = collect(tmp_path, "--schedule", "history")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "Фильмов с аномалией HTTP-пробы: 1" in result.stdout
+    assert "аномалии пробы — " in result.stdout
+
+
+def test_schedule_history_with_time_budget(tmp_path):
+    result = collect(tmp_path, "--schedule", "history", "--time-budget", "10m")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "Бюджет времени 600 с" in result.stdout
+
+
+def test_start_mode_defaults_to_cold(tmp_path):
+    result = collect(tmp_path)
+    assert result.returncode == 0, result.stdout + result.stderr
+    ids = collected_ids(result)
+    assert ids and not any("cold" in line or "warm" in line for line in ids)
+
+
+def test_start_mode_both_is_a_matrix_dimension(tmp_path):
+    cold_only = collected_ids(collect(tmp_path))
+    result = collect(tmp_path, "--start-mode", "both")
+    assert result.returncode == 0, result.stdout + result.stderr
+    ids = collected_ids(result)
+    assert sum("[cold-" in line for line in ids) == sum("[warm-" in line for line in ids) == len(cold_only)
+
+
+def test_start_mode_both_skips_tests_without_base_url(tmp_path):
+    parametrized = ROOT / "tests" / "parametrized"
+    runs = [
+        subprocess.run(
+            [sys.executable, "-m", "pytest", "--collect-only", "-qq", "-p", "no:cacheprovider", str(parametrized), *options],
+            cwd=tmp_path, env={**os.environ, "PYTHONPATH": str(ROOT)}, capture_output=True, text=True, timeout=300,
+        )
+        for options in ([], ["--start-mode", "both"])
+    ]
+    default, both = ([line for line in run.stdout.splitlines() if "::" in line] for run in runs)
+    assert default and both == default
+
+
+def shard_plan(result: subprocess.CompletedProcess) -> tuple:
+    assert result.returncode == 0, result.stdout + result.stderr
+    fingerprint = re.search(r"отпечаток плана (\w+)", result.stdout).group(1)
+    return fingerprint, [line for line in result.stdout.splitlines() if "::" in line]
+
+
+def test_shard_plan_ignores_local_history(tmp_path):
+    fingerprint, selected = shard_plan(collect(tmp_path, "-q", "--shard", "1/2"))
+    # Своя история у этой машины: первые тесты шарда «долгие»
+    local = tmp_path / ".cache" / "history" / "runs.json"
+    local.parent.mkdir(parents=True)
+    local.write_text(json.dumps({
+        nodeid: [{"ts": time.time(), "status": "passed", "duration_sec": 3600, "metrics": {}}]
+        for nodeid in selected[:10]
+    }), encoding="utf-8")
+    assert shard_plan(collect(tmp_path, "-q", "--shard", "1/2")) == (fingerprint, selected)
+
+    shared_fingerprint, _ = shard_plan(collect(tmp_path, "-q", "--shard", "1/2", "--shard-history", str(local)))
+    assert shared_fingerprint != fingerprint
+
+
+def test_shard_history_must_exist(tmp_path):
+    result = collect(tmp_path, "--shard", "1/2", "--shard-history", "missing.json")
+    assert result.returncode != 0
+    assert "--shard-history" in result.stderr
+
+
+def test_time_budget_keeps_stream_tests(tmp_path):
+    films = tmp_path / "films.txt"
+    films.write_text(FILM_URL + "\n", encoding="utf-8")
+    result = collect(tmp_path, "--film-list", str(films), "--film-stream", "on", "--time-budget", "1m")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "Потоковых тестов вне отбора по бюджету" in result.stdout
+    assert collected_ids(result)
+
+
+def test_resume_retries_failed_tests(tmp_path):
+    nodeids = [line for line in collect(tmp_path, "-q").stdout.splitlines() if "::" in line]
+    checkpoint = tmp_path / ".cache" / "checkpoints" / "nightly.jsonl"
+    checkpoint.parent.mkdir(parents=True)
+    entries = [
+        {"key": nodeids[0], "status": "passed", "duration_sec": 1, "ts": 1, "reports": []},
+        {"key": nodeids[1], "status": "problematic", "duration_sec": 1, "ts": 1, "reports": []},
+        {"key": nodeids[2], "status": "failed", "duration_sec": 1, "ts": 1, "reports": []},
+        # Последняя запись по ключу: тест упал, затем прошёл при повторе
+        {"key": nodeids[3], "status": "failed", "duration_sec": 1, "ts": 1, "reports": []},
+        {"key": nodeids[3], "status": "passed", "duration_sec": 1, "ts": 2, "reports": []},
+    ]
+    checkpoint.write_text("".join(json.dumps(entry) + "\n" for entry in entries), encoding="utf-8")
+
+    result = collect(tmp_path, "-q", "--resume", "nightly")
+    assert result.returncode == 0, result.stdout + result.stderr
+    remaining = [line for line in result.stdout.splitlines() if "::" in line]
+    assert len(remaining) == len(nodeids) - 3
+    assert nodeids[2] in remaining
+    assert not {nodeids[0], nodeids[1], nodeids[3]} & set(remaining)
+    assert "запускаются снова: 1" in result.stdout
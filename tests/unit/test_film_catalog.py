@@ -0,0 +1,69 @@
+"""Инкрементальное обновление каталога фильмов (utils/film_catalog.py) на тестовом листинге."""
+import pytest
+
+from utils.async_http import AsyncHttpClient
+from utils.film_catalog import FilmCatalog
+
+pytestmark = pytest.mark.unit
+
+
+async def refresh(catalog_site, tmp_path, **kwargs):
+    catalog = FilmCatalog(catalog_site.standin.base_url, catalog_dir=str(tmp_path), limit=100)
+    async with AsyncHttpClient() as client:
+        diff = await catalog.refresh(client=client, **kwargs)
+    catalog.save()
+    return catalog, diff
+
+
+@pytest.fixture()
+async def filled(catalog_site, tmp_path):
+    catalog, diff = await refresh(catalog_site, tmp_path)
+    assert diff.full and len(diff.added) == 537
+    catalog_site.standin.requests.clear()
+    return catalog_site
+
+
+async def test_unchanged_catalog_stops_early(filled, tmp_path):
+    catalog, diff = await refresh(filled, tmp_path)
+    assert not diff.full
+    assert (diff.added, diff.removed, diff.changed) == ([], [], [])
+    # Две совпавшие страницы и проверка последней
+    assert diff.requests == 3
+    assert diff.not_modified == 3
+    assert len(catalog.films) == 537
+
+
+async def test_film_added_at_top_shifts_pages(filled, tmp_path):
+    filled.films.insert(0, "/film-1000/1000")
+    catalog, diff = await refresh(filled, tmp_path)
+    assert diff.added == [filled.standin.url("/film-1000/1000")]
+    assert diff.removed == []
+    assert diff.requests == 4
+    assert len(catalog.films) == 538
+    assert catalog.urls() == sorted(filled.standin.url(slug) for slug in filled.films)
+
+
+async def test_film_inserted_in_the_middle_is_found(filled, tmp_path):
+    filled.films.insert(300, "/film-2000/2000")
+    catalog, diff = await refresh(filled, tmp_path)
+    assert diff.added == [filled.standin.url("/film-2000/2000")]
+    assert len(catalog.films) == 538
+    assert catalog.urls() == sorted(filled.standin.url(slug) for slug in filled.films)
+
+
+async def test_removed_films_are_found(filled, tmp_path):
+    removed = [filled.films.pop(0), filled.films.pop(250)]
+    catalog, diff = await refresh(filled, tmp_path)
+    assert diff.removed == sorted(filled.standin.url(slug) for slug in removed)
+    assert diff.added == []
+    assert len(catalog.films) == 535
+
+
+async def test_snapshot_after_shift_supports_next_refresh(filled, tmp_path):
+    filled.films.insert(0, "/film-1000/1000")
+    await refresh(filled, tmp_path)
+    filled.standin.requests.clear()
+    catalog, diff = await refresh(filled, tmp_path)
+    assert (diff.added, diff.removed) == ([], [])
+    assert diff.requests == 3
+    assert len(catalog.films) == 538
@@ -0,0 +1,138 @@
+"""HTTP-проба фильмов (utils/http_probe.py) на локальном тестовом сервере."""
+import time
+
+import pytest
+
+import config
+from utils.async_http import AsyncHttpClient
+from utils.http_probe import find_manifest_url, probe_anomalies, probe_film, probe_films, probe_key, record_probes
+from utils.run_history import RunHistory
+from utils.scheduler import PriorityScheduler
+
+pytestmark = pytest.mark.unit
+
+PADDING = "<p>" + "описание фильма " * 300 + "</p>"
+MANIFEST = b"#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\nlow.m3u8\n#EXT-X-STREAM-INF:BANDWIDTH=2400000\nhigh.m3u8\n"
+
+
+def film_page(player: str = "") -> tuple:
+    return 200, {"Content-Type": "text/html; charset=utf-8"}, f"<html>{PADDING}{player}</html>".encode("utf-8")
+
+
+async def probe(standin, path: str) -> dict:
+    async with AsyncHttpClient() as client:
+        return await probe_film(client, standin.url(path))
+
+
+def test_find_manifest_url_with_escaped_slashes():
+    html = '<script>var player = {"hls": "https:\\/\\/cdn.example.org\\/hls\\/42\\/master.m3u8?token=abc"};</script>'
+    assert find_manifest_url(html, "https://tests.goodmovie.net/film/42") == \
+        "https://cdn.example.org/hls/42/master.m3u8?token=abc"
+
+
+def test_find_manifest_url_relative_and_missing():
+    assert find_manifest_url('<video src="/hls/7.m3u8"></video>', "https://example.org/film/7") == \
+        "https://example.org/hls/7.m3u8"
+    assert find_manifest_url("<video src='/video.mp4'></video>", "https://example.org/film/7") is None
+
+
+async def test_page_with_manifest_passes(standin):
+    standin.route("/film/1", lambda request: film_page('<video src="/hls/1.m3u8"></video>'))
+    standin.route("/hls/1.m3u8", lambda request: (200, {"Content-Type": "application/vnd.apple.mpegurl"}, MANIFEST))
+    result = await probe(standin, "/film/1")
+    assert result["status"] == "passed", result["issues"]
+    metrics = result["metrics"]
+    assert metrics["httpStatus"] == 200
+    assert metrics["htmlBytes"] > config.PROBE_MIN_HTML_BYTES
+    assert metrics["connectionReused"] is False
+    assert metrics["ttfb"] is not None and metrics["dnsResolveTime"] is not None
+    assert metrics["manifestUrl"] == standin.url("/hls/1.m3u8")
+    assert metrics["manifestStatus"] == 200
+    assert metrics["manifestVariants"] == 2
+    # Манифест на том же хосте идёт по уже открытому соединению
+    assert metrics["manifestConnectionReused"] is True
+
+
+async def test_missing_page_fails(standin):
+    result = await probe(standin, "/film/404")
+    assert result["status"] == "failed"
+    assert result["issues"] == ["HTTP 404"]
+
+
+async def test_stub_page_fails(standin):
+    standin.route("/film/2", lambda request: (200, {}, b"<html>stub</html>"))
+    result = await probe(standin, "/film/2")
+    assert result["status"] == "failed"
+    assert result["issues"] == ["HTML 17 байт"]
+
+
+async def test_slow_ttfb_is_problematic(standin, monkeypatch):
+    monkeypatch.setattr(config, "PROBE_SLOW_TTFB_MS", 100)
+
+    def slow(request):
+        time.sleep(0.15)
+        return film_page()
+
+    standin.route("/film/3", slow)
+    result = await probe(standin, "/film/3")
+    assert result["status"] == "problematic"
+    assert result["issues"][0].startswith("TTFB")
+    assert result["metrics"]["ttfb"] >= 100
+
+
+@pytest.mark.parametrize("status, body, issue", [
+    (500, b"error", "манифест: HTTP 500"),
+    (200, b"<html>not a playlist</html>", "манифест без #EXTM3U"),
+])
+async def test_broken_manifest_fails(standin, status, body, issue):
+    standin.route("/film/4", lambda request: film_page("<script>src='/hls/4.m3u8'</script>"))
+    standin.route("/hls/4.m3u8", lambda request: (status, {}, body))
+    result = await probe(standin, "/film/4")
+    assert result["status"] == "failed"
+    assert result["issues"] == [issue]
+
+
+async def test_unreachable_host_fails():
+    async with AsyncHttpClient(timeout_sec=5) as client:
+        # Порт 9 (discard) на localhost закрыт
+        result = await probe_film(client, "http://127.0.0.1:9/film/1")
+    assert result["status"] == "failed"
+    assert result["metrics"] == {}
+
+
+async def test_probe_anomalies_feed_scheduler(standin, tmp_path):
+    for film in ("1", "2"):
+        standin.route(f"/film/{film}", lambda request: film_page())
+    standin.route("/film/3", lambda request: (200, {}, b"stub"))
+    urls = [standin.url(f"/film/{film}") for film in ("1", "2", "3", "4")]
+    results = await probe_films(urls, concurrency=2, rate=1000, burst=1000)
+
+    probes = RunHistory(str(tmp_path / "probes.json"))
+    record_probes(results, probes)
+    assert probes.last_run(probe_key(urls[0]))["metrics"]["probe.htmlBytes"] > 0
+    anomalies = probe_anomalies(probes, urls)
+    assert anomalies == {urls[2], urls[3]}
+
+    # Браузерная история: у всех тестов недавний успешный прогон — без пробы порядок случайный
+    history = RunHistory(str(tmp_path / "runs.json"))
+    for url in urls:
+        history.record(url, "passed", 60)
+    ordered = PriorityScheduler(history).order(urls, lambda url: url, is_anomalous=lambda url: url in anomalies)
+    assert {url for url, tier in ordered[:2]} == anomalies
+    assert [tier for _, tier in ordered] == [0, 0, 2, 2]
+
+
+def test_old_probe_failures_are_not_anomalies(tmp_path):
+    probes = RunHistory(str(tmp_path / "probes.json"))
+    url = "https://tests.goodmovie.net/film/1"
+    stale = time.time() - (config.SCHEDULER_RECENT_FAILURE_DAYS + 1) * 86400
+    probes.record(probe_key(url), "failed", 0.1, timestamp=stale)
+    assert probe_anomalies(probes, [url]) == set()
+
+
+def test_probe_ttfb_regression_is_an_anomaly(tmp_path):
+    probes = RunHistory(str(tmp_path / "probes.json"))
+    url = "https://tests.goodmovie.net/film/1"
+    for ttfb in (100, 110, 105, 400):
+        probes.record(probe_key(url), "passed", 0.1, {"probe.ttfb": ttfb})
+    assert probe_anomalies(probes, [url]) == {url}
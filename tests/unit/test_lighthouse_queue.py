@@ -0,0 +1,72 @@
+"""Очередь аудитов и кэш Lighthouse (utils/lighthouse_queue.py, utils/lighthouse_cache.py) без запуска Lighthouse."""
+import threading
+import time
+
+import pytest
+
+from utils import lighthouse_queue
+from utils.lighthouse_cache import LighthouseCache
+from utils.lighthouse_queue import LighthouseAuditQueue
+
+pytestmark = pytest.mark.unit
+
+URL = "https://example.test/film/1"
+
+
+@pytest.fixture()
+def audits(monkeypatch):
+    """Подменяет раннер Lighthouse: аудит длится 0.2 с, вызовы считаются."""
+    calls = []
+
+    def run(url, persist_if=None, device=None, throttling=None):
+        calls.append(url)
+        time.sleep(0.2)
+        return {"performance": 90}
+
+    monkeypatch.setattr(lighthouse_queue, "run_lighthouse_for_url", run)
+    monkeypatch.setattr(lighthouse_queue, "extract_metrics_from_lighthouse", lambda report: dict(report))
+    monkeypatch.setattr(lighthouse_queue, "summarize_lighthouse_metrics", lambda metrics: dict(metrics, is_problematic_page=False))
+    return calls
+
+
+def submit_concurrently(queue, count):
+    barrier = threading.Barrier(count)
+    futures = []
+
+    def submit():
+        barrier.wait()
+        futures.append(queue.submit(URL, "Mobile", "No_throttling"))
+
+    threads = [threading.Thread(target=submit) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return futures
+
+
+@pytest.mark.parametrize("ttl_sec", [0, 3600])
+def test_concurrent_submits_run_one_audit(audits, tmp_path, ttl_sec):
+    cache = LighthouseCache(cache_dir=str(tmp_path), ttl_sec=ttl_sec)
+    queue = LighthouseAuditQueue(max_workers=4, cache=cache)
+    futures = submit_concurrently(queue, 8)
+    assert all(future.result(timeout=5)["performance"] == 90 for future in futures)
+    assert audits == [URL]
+    assert queue.submitted == 1
+    queue._executor.shutdown()
+
+
+def test_cached_result_is_reused(audits, tmp_path):
+    queue = LighthouseAuditQueue(max_workers=2, cache=LighthouseCache(cache_dir=str(tmp_path), ttl_sec=3600))
+    queue.submit(URL, "Mobile", "No_throttling").result(timeout=5)
+    assert queue.submit(URL, "Mobile", "No_throttling").result(timeout=5)["performance"] == 90
+    assert audits == [URL]
+    assert (queue.cache.hits, queue.cache.misses) == (1, 1)
+    queue._executor.shutdown()
+
+
+def test_disabled_cache_counts_no_hits(tmp_path):
+    cache = LighthouseCache(cache_dir=str(tmp_path), ttl_sec=0)
+    cache.record_hit()
+    assert cache.get(URL, {}) is None
+    assert (cache.hits, cache.misses) == (0, 0)
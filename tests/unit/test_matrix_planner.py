@@ -0,0 +1,59 @@
+"""Покрывающие массивы тестовой матрицы (utils/matrix_planner.py)."""
+import itertools
+
+import pytest
+
+from utils.matrix_planner import covering_array
+
+pytestmark = pytest.mark.unit
+
+DIMENSIONS = {
+    "device": ["desktop", "mobile", "tablet"],
+    "throttling": ["none", "fast3g", "slow3g"],
+    "geo": ["ru", "kz", "by", "am"],
+    "browser": ["chromium", "firefox"],
+    "payment": ["card", "sbp"],
+    "film": [f"film-{i}" for i in range(5)],
+}
+
+
+def uncovered(plan, strength):
+    """t-наборы значений измерений, которых нет ни в одной строке плана."""
+    missing = []
+    for names in itertools.combinations(DIMENSIONS, strength):
+        seen = {tuple(row[name] for name in names) for row in plan.rows}
+        for values in itertools.product(*(DIMENSIONS[name] for name in names)):
+            if values not in seen:
+                missing.append(dict(zip(names, values)))
+    return missing
+
+
+@pytest.mark.parametrize("strength", [2, 3])
+def test_every_t_way_combination_is_covered(strength):
+    plan = covering_array(DIMENSIONS, strength=strength)
+    assert uncovered(plan, strength) == []
+    assert len(plan.rows) < plan.full_size
+    assert all(set(row) == set(DIMENSIONS) for row in plan.rows)
+
+
+def test_must_cover_rows_are_in_the_plan():
+    must_cover = [
+        {"device": "tablet", "throttling": "slow3g", "geo": "am", "browser": "firefox"},
+        {"film": "film-4", "payment": "sbp"},
+        {"geo": "unknown"},
+    ]
+    plan = covering_array(DIMENSIONS, strength=2, must_cover=must_cover)
+    for combination in must_cover[:2]:
+        assert any(all(row[name] == value for name, value in combination.items()) for row in plan.rows)
+    assert uncovered(plan, 2) == []
+
+
+def test_plan_is_deterministic_for_a_seed():
+    assert covering_array(DIMENSIONS, seed=7).rows == covering_array(DIMENSIONS, seed=7).rows
+
+
+def test_strength_not_below_dimension_count_is_full_product():
+    dimensions = {"device": ["desktop", "mobile"], "geo": ["ru", "kz", "by"]}
+    plan = covering_array(dimensions, strength=2)
+    assert len(plan.rows) == plan.full_size == 6
+    assert plan.strength == 0
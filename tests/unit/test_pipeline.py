@@ -0,0 +1,88 @@
+"""Фоновые шаги конвейера (utils/pipeline.py): отчёт меняется только завершившимся вовремя шагом."""
+import time
+
+import pytest
+
+from utils.pipeline import FlowContext, PipelineStep, StepPipeline
+
+pytestmark = pytest.mark.unit
+
+
+def make_ctx():
+    report = {"steps": {}, "is_problematic_flow": False}
+    return FlowContext(None, None, report, "https://example.test/film/1", "Desktop", "No_throttling",
+                       "Moscow", "chromium", "card")
+
+
+def lighthouse_like(delay_sec):
+    """Как merge_audit_results: пишет метрики и флаг проблемности прямо в ctx.report."""
+    def step(ctx):
+        time.sleep(delay_sec)
+        ctx.report["steps"].setdefault("film_page", {})["performance"] = 40
+        ctx.report["is_problematic_flow"] = True
+        return None
+    return step
+
+
+def foreground(ctx):
+    ctx.report["steps"].setdefault("film_page", {})["videoStartTime"] = 1200
+    return {"popupAppearTime": 300}
+
+
+def test_finished_background_step_changes_are_merged():
+    ctx = make_ctx()
+    journal = StepPipeline([
+        PipelineStep("lighthouse", lighthouse_like(0.1), background=True, timeout_sec=5, critical=False),
+        PipelineStep("popup", foreground, report_step="film_page"),
+    ]).run(ctx)
+    assert journal["lighthouse"]["status"] == "ok"
+    assert ctx.report["steps"]["film_page"] == {"performance": 40, "videoStartTime": 1200, "popupAppearTime": 300}
+    assert ctx.report["is_problematic_flow"] is True
+
+
+def test_late_background_step_does_not_touch_report():
+    ctx = make_ctx()
+    journal = StepPipeline([
+        PipelineStep("lighthouse", lighthouse_like(0.5), background=True, timeout_sec=0.1,
+                     produces=("performance",), report_step="film_page", critical=False),
+        PipelineStep("popup", foreground, report_step="film_page"),
+    ]).run(ctx)
+    assert journal["lighthouse"]["status"] == "failed"
+    saved = {"steps": {"film_page": dict(ctx.report["steps"]["film_page"])}, "is_problematic_flow": False}
+    # Поток шага доработал после сохранения отчёта
+    time.sleep(0.6)
+    assert ctx.report == saved
+    assert ctx.report["steps"]["film_page"]["performance"] is None
+
+
+def test_slow_critical_step_does_not_fail_the_flow():
+    def slow_popup(ctx):
+        time.sleep(0.15)
+        return {"popupAppearTime": 300}
+
+    ctx = make_ctx()
+    pipeline = StepPipeline([
+        PipelineStep("popup", slow_popup, report_step="film_page", timeout_sec=0.05, critical=True),
+        PipelineStep("pay_page", lambda ctx: {"iframeCpLoadTime": 10}, requires=("popup",), report_step="pay_page"),
+    ])
+    journal = pipeline.run(ctx)
+    assert journal["popup"]["status"] == "timeout"
+    assert "бюджете" in journal["popup"]["error"]
+    assert pipeline.critical_error is None
+    assert ctx.report["steps"]["film_page"]["popupAppearTime"] == 300
+    assert journal["pay_page"]["status"] == "ok"
+
+
+def test_failed_critical_step_fails_the_flow():
+    def broken(ctx):
+        raise RuntimeError("iframe не найден")
+
+    ctx = make_ctx()
+    pipeline = StepPipeline([
+        PipelineStep("pay_page", broken, report_step="pay_page", produces=("iframeCpLoadTime",)),
+        PipelineStep("pay_form", lambda ctx: {}, requires=("pay_page",)),
+    ])
+    journal = pipeline.run(ctx)
+    assert str(pipeline.critical_error) == "iframe не найден"
+    assert journal["pay_form"]["status"] == "skipped"
+    assert ctx.report["steps"]["pay_page"] == {"iframeCpLoadTime": None}
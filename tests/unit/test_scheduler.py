@@ -0,0 +1,68 @@
+"""Приоритетная очередь тестов и отбор под бюджет времени (utils/scheduler.py)."""
+import pytest
+
+import config
+from utils.run_history import RunHistory
+from utils.scheduler import PriorityScheduler, parse_duration
+
+pytestmark = pytest.mark.unit
+
+NOW = 100 * 86400
+DAY = 86400
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = RunHistory(str(tmp_path / "runs.json"))
+    history.record("failed-old", "failed", 100, timestamp=NOW - 5 * DAY)
+    history.record("failed-fresh", "problematic", 100, timestamp=NOW - DAY)
+    history.record("failed-expired", "failed", 100, timestamp=NOW - (config.SCHEDULER_RECENT_FAILURE_DAYS + 1) * DAY)
+    history.record("stale", "passed", 100, timestamp=NOW - (config.SCHEDULER_STALE_DAYS + 1) * DAY)
+    for i in range(4):
+        history.record(f"fresh-{i}", "passed", 100 + 100 * i, timestamp=NOW - DAY)
+    return history
+
+
+@pytest.mark.parametrize("value, seconds", [("90", 90), ("45s", 45), ("90m", 5400), ("2h", 7200), ("1h30m", 5400)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+@pytest.mark.parametrize("value", ["", "2d", "1h30", "h"])
+def test_parse_duration_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        parse_duration(value)
+
+
+def test_order_puts_failures_new_and_stale_first(history):
+    scheduler = PriorityScheduler(history, now=NOW)
+    items = ["fresh-0", "stale", "failed-old", "new-film", "fresh-1", "failed-fresh", "never-run", "failed-expired"]
+    ordered = scheduler.order(
+        items, key_of=lambda item: item, is_new=lambda item: item == "new-film",
+        is_anomalous=lambda item: item == "fresh-1",
+    )
+    assert ordered[:7] == [
+        # Свежие падения первыми, затем аномалия пробы
+        ("failed-fresh", 0), ("failed-old", 0), ("fresh-1", 0),
+        # Новые фильмы каталога, без истории, затем самые старые
+        ("new-film", 1), ("never-run", 1), ("failed-expired", 1), ("stale", 1),
+    ]
+    assert ordered[7:] == [("fresh-0", 2)]
+
+
+def test_fit_budget_keeps_priority_and_skips_what_does_not_fit(history):
+    scheduler = PriorityScheduler(history, now=NOW)
+    ordered = [("fresh-3", 0), ("fresh-2", 0), ("fresh-1", 1), ("fresh-0", 2), ("never-run", 2)]
+    # Оценки: 400, 300, 200, 100 и медиана истории (100) для теста без истории
+    selected, postponed = scheduler.fit_budget(ordered, lambda item: item, budget_sec=850)
+    assert selected == ["fresh-3", "fresh-2", "fresh-0"]
+    assert postponed == ["fresh-1", "never-run"]
+    assert sum(scheduler.estimate(item) for item in selected) <= 850
+
+    selected, postponed = scheduler.fit_budget(ordered, lambda item: item, budget_sec=None)
+    assert selected == [item for item, _ in ordered] and postponed == []
+
+
+def test_estimate_without_history_uses_default(tmp_path):
+    scheduler = PriorityScheduler(RunHistory(str(tmp_path / "empty.json")), now=NOW)
+    assert scheduler.estimate("anything") == config.SCHEDULER_DEFAULT_TEST_SEC
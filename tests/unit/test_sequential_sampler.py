@@ -0,0 +1,82 @@
+"""Последовательная выборка фильмов по ширине доверительного интервала (utils/sequential_sampler.py)."""
+import pytest
+
+from utils.sequential_sampler import SequentialSampler, confidence_interval, stratified_order, t_critical
+
+pytestmark = pytest.mark.unit
+
+METRIC = "film_page.videoStartTime"
+
+
+def report(value):
+    return {"steps": {"film_page": {"videoStartTime": value}}}
+
+
+def relative_width(values, confidence=0.95):
+    mean, half_width = confidence_interval(values, confidence)
+    return 2 * half_width / abs(mean)
+
+
+def test_t_critical_matches_table_values():
+    assert t_critical(10, 0.95) == pytest.approx(2.228, abs=0.01)
+    assert t_critical(30, 0.95) == pytest.approx(2.042, abs=0.005)
+    assert t_critical(10 ** 6, 0.95) == pytest.approx(1.960, abs=0.001)
+    assert confidence_interval([1000], 0.95) is None
+
+
+def test_does_not_stop_before_min_samples():
+    sampler = SequentialSampler([METRIC], rel_tolerance=0.2, min_samples=6, batch_size=1)
+    for value in (1000, 1010, 990, 1000, 1005):
+        sampler.add("cluster", [report(value)], 60)
+        # Интервал уже узкий, но значений меньше min_samples
+        assert not sampler.is_stopped("cluster")
+    sampler.add("cluster", [report(995)], 60)
+    assert sampler.is_stopped("cluster")
+
+
+def test_stops_exactly_when_interval_is_narrow_enough():
+    values = [500, 3000, 800, 2500, 1200, 1800, 1500, 1400, 1600, 1500, 1450, 1550, 1500, 1500, 1520, 1480]
+    expected = next(n for n in range(4, len(values) + 1) if relative_width(values[:n]) <= 0.5)
+    assert relative_width(values[:expected - 1]) > 0.5
+
+    sampler = SequentialSampler([METRIC], rel_tolerance=0.5, min_samples=4, batch_size=1)
+    for n, value in enumerate(values, start=1):
+        sampler.add("cluster", [report(value)], 60)
+        assert sampler.is_stopped("cluster") == (n >= expected)
+
+
+def test_decision_is_revised_once_per_batch():
+    sampler = SequentialSampler([METRIC], rel_tolerance=0.2, min_samples=2, batch_size=3)
+    sampler.add("cluster", [report(1000), report(1000)], 60)
+    assert not sampler.is_stopped("cluster")
+    sampler.add("cluster", [report(1000)], 60)
+    assert sampler.is_stopped("cluster")
+    assert not sampler.is_stopped("other")
+
+
+def test_every_metric_must_be_narrow():
+    other = "pay_page.iframeCpLoadTime"
+    sampler = SequentialSampler([METRIC, other], rel_tolerance=0.2, min_samples=3, batch_size=1)
+    for pay_value in (100, 5000, 300, 4000):
+        sampler.add("cluster", [{"steps": {
+            "film_page": {"videoStartTime": 1000},
+            "pay_page": {"iframeCpLoadTime": pay_value},
+        }}], 60)
+    assert not sampler.is_stopped("cluster")
+
+
+def test_summary_counts_saved_browser_time():
+    sampler = SequentialSampler([METRIC], min_samples=2, batch_size=1)
+    sampler.add("cluster", [report(1000)], 60)
+    sampler.add("cluster", [report(1000)], 90)
+    sampler.record_skip("cluster", 4)
+    assert sampler.summary() == {"stopped_clusters": 1, "skipped_tests": 4, "saved_browser_sec": 300.0}
+
+
+def test_stratified_order_alternates_clusters():
+    items = ["a1", "a2", "a3", "b1", "c1", "c2"]
+    assert stratified_order(items, lambda item: item[0], shuffle=False) == ["a1", "b1", "c1", "a2", "c2", "a3"]
+    shuffled = stratified_order(items, lambda item: item[0], seed=3)
+    assert sorted(shuffled) == sorted(items)
+    assert [item[0] for item in shuffled] == ["a", "b", "c", "a", "c", "a"]
+    assert shuffled == stratified_order(items, lambda item: item[0], seed=3)
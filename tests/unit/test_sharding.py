@@ -0,0 +1,52 @@
+"""Разбиение матрицы на шарды и объединение историй шардов (utils/sharding.py)."""
+import pytest
+
+from utils.run_history import RunHistory
+from utils.sharding import assign_shards, merge_histories, plan_fingerprint
+
+pytestmark = pytest.mark.unit
+
+KEYS = [f"test|film-{i}" for i in range(12)]
+
+
+def test_equal_costs_balance_by_count():
+    assignment = assign_shards(KEYS, [180] * len(KEYS), 3)
+    assert sorted(assignment.count(shard) for shard in range(3)) == [4, 4, 4]
+    assert assign_shards(list(reversed(KEYS)), [180] * len(KEYS), 3) == list(reversed(assignment))
+
+
+def test_fingerprint_depends_on_costs():
+    costs = [180] * len(KEYS)
+    assignment = assign_shards(KEYS, costs, 2)
+    fingerprint = plan_fingerprint(KEYS, assignment, costs)
+    # Расхождение меньше шага округления план не меняет
+    assert plan_fingerprint(KEYS, assignment, [c + 5 for c in costs]) == fingerprint
+    assert plan_fingerprint(KEYS, assignment, [600] + costs[1:]) != fingerprint
+
+
+def test_merge_histories_combines_shards(tmp_path):
+    first, second = RunHistory(str(tmp_path / "1.json")), RunHistory(str(tmp_path / "2.json"))
+    first.record("a", "passed", 100, timestamp=1)
+    first.record("b", "failed", 50, timestamp=3)
+    second.record("a", "passed", 200, timestamp=2)
+    first.save()
+    second.save()
+    output = str(tmp_path / "shared.json")
+
+    merge_histories([first.path, second.path, tmp_path / "missing.json"], output)
+    shared = RunHistory(output)
+    assert [run["duration_sec"] for run in shared.runs("a")] == [100, 200]
+    assert shared.last_run("b")["status"] == "failed"
+
+    # Повторное объединение тех же историй не дублирует прогоны
+    merge_histories([first.path, second.path], output)
+    assert len(RunHistory(output).runs("a")) == 2
+
+
+def test_merge_keeps_last_runs(tmp_path):
+    shared = RunHistory(str(tmp_path / "shared.json"), max_runs=3)
+    other = RunHistory(str(tmp_path / "other.json"))
+    for ts in range(5):
+        (shared if ts % 2 else other).record("a", "passed", ts, timestamp=ts)
+    shared.merge(other)
+    assert [run["ts"] for run in shared.runs("a")] == [2, 3, 4]
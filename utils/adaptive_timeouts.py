@@ -0,0 +1,165 @@
+"""
+Адаптивные таймауты ожиданий по истории задержек.
+
+Для каждой комбинации (домен, ожидание, устройство, сеть) хранится
+LatencySketch — логарифмическая гистограмма успешных задержек с заданной
+относительной точностью квантилей. Таймаут ожидания = p99.9 × запас,
+но не меньше ADAPTIVE_TIMEOUT_MIN_MS и не больше исходного жёсткого таймаута.
+Пока данных меньше ADAPTIVE_TIMEOUT_MIN_SAMPLES, используется жёсткий таймаут.
+"""
+import json
+import math
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Optional
+
+import config
+
+
+class LatencySketch:
+    """
+    Логарифмическая гистограмма задержек (в духе DDSketch).
+
+    Значение v попадает в корзину ceil(log_gamma(v)), где
+    gamma = (1 + a) / (1 - a); оценка квантиля отличается от истинной
+    не более чем на долю a. Число корзин ограничено max_buckets —
+    при переполнении сливаются самые младшие корзины.
+    """
+
+    def __init__(self, relative_accuracy: float = config.LATENCY_SKETCH_ACCURACY, max_buckets: int = 1024):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.counts: Dict[int, int] = defaultdict(int)
+        self.count = 0
+
+    def add(self, value_ms: float) -> None:
+        key = math.ceil(math.log(max(value_ms, 1.0)) / self._log_gamma)
+        self.counts[key] += 1
+        self.count += 1
+        if len(self.counts) > self.max_buckets:
+            keys = sorted(self.counts)
+            lowest, target = keys[0], keys[1]
+            self.counts[target] += self.counts.pop(lowest)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.counts) / (self.gamma + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "counts": {str(k): v for k, v in self.counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencySketch":
+        sketch = cls(relative_accuracy=data.get("relative_accuracy", config.LATENCY_SKETCH_ACCURACY))
+        for key, value in data.get("counts", {}).items():
+            sketch.counts[int(key)] = value
+        sketch.count = data.get("count", sum(sketch.counts.values()))
+        return sketch
+
+
+class AdaptiveTimeouts:
+    """
+    Хранилище скетчей задержек и расчёт таймаутов.
+
+    Скетчи загружаются из path при создании и сохраняются методом save()
+    (в конце сессии).
+    """
+
+    def __init__(self, path: str = config.ADAPTIVE_TIMEOUTS_FILE, enabled: bool = True):
+        self.path = Path(path)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._sketches: Dict[str, LatencySketch] = {}
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def key(domain: str, wait_name: str, device: str, throttling: str) -> str:
+        return f"{domain}|{wait_name}|{device}|{throttling}"
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Не удалось прочитать историю задержек {self.path}: {e}")
+            return
+        self._sketches = {key: LatencySketch.from_dict(value) for key, value in data.items()}
+
+    def record(self, domain: str, wait_name: str, device: str, throttling: str, latency_ms: float) -> None:
+        """Добавляет задержку успешного ожидания в историю."""
+        if latency_ms is None:
+            return
+        key = self.key(domain, wait_name, device, throttling)
+        with self._lock:
+            self._sketches.setdefault(key, LatencySketch()).add(latency_ms)
+            self._dirty = True
+
+    def timeout_ms(self, domain: str, wait_name: str, device: str, throttling: str, default_ms: int) -> dict:
+        """
+        Возвращает выбранный таймаут: {"timeout_ms", "source": adaptive|default, "samples", "p999_ms"}.
+        """
+        with self._lock:
+            sketch = self._sketches.get(self.key(domain, wait_name, device, throttling))
+            samples = sketch.count if sketch else 0
+            p999 = sketch.quantile(config.ADAPTIVE_TIMEOUT_QUANTILE) if sketch else None
+        if not self.enabled or samples < config.ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+            return {"timeout_ms": default_ms, "source": "default", "samples": samples, "p999_ms": None}
+        timeout = p999 * config.ADAPTIVE_TIMEOUT_SAFETY_FACTOR
+        timeout = int(min(default_ms, max(config.ADAPTIVE_TIMEOUT_MIN_MS, timeout)))
+        return {"timeout_ms": timeout, "source": "adaptive", "samples": samples, "p999_ms": round(p999)}
+
+    def save(self) -> None:
+        """Атомарно сохраняет скетчи на диск, если были новые данные."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {key: sketch.to_dict() for key, sketch in self._sketches.items()}
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class FlowTimeouts:
+    """
+    Таймауты одного прогона сценария: выбирает таймаут для ожидания,
+    записывает выбор в report["timeouts"] и отправляет успешные задержки в историю.
+    """
+
+    def __init__(self, service: Optional[AdaptiveTimeouts], domain: str, device: str, throttling: str, report: dict):
+        self.service = service
+        self.domain = domain
+        self.device = device
+        self.throttling = throttling
+        self.report = report
+
+    def get(self, wait_name: str, default_ms: int) -> int:
+        if self.service is None:
+            return default_ms
+        choice = self.service.timeout_ms(self.domain, wait_name, self.device, self.throttling, default_ms)
+        self.report.setdefault("timeouts", {})[wait_name] = choice
+        return choice["timeout_ms"]
+
+    def record(self, wait_name: str, latency_ms: float) -> None:
+        if self.service is not None:
+            self.service.record(self.domain, wait_name, self.device, self.throttling, latency_ms)
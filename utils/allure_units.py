@@ -0,0 +1,57 @@
+"""
+Отдельные результаты Allure для единиц работы внутри одного теста pytest.
+
+В потоковом режиме (--film-stream on) все фильмы конфигурации проходятся
+внутри одного теста: шаг Allure «Фильм i» не имеет собственного статуса,
+и один упавший фильм делает красным весь тест. report_unit_result пишет
+для каждого фильма самостоятельный результат Allure через allure_commons:
+свой UUID, historyId по ключу единицы (история и ретраи фильма в отчёте)
+и статус по его отчёту. Без --alluredir логгер allure_commons не
+зарегистрирован, и вызовы хуков ничего не пишут.
+"""
+import json
+from typing import Dict, Optional
+
+from allure_commons import plugin_manager
+from allure_commons.model2 import Attachment, Label, Parameter, Status, StatusDetails, TestResult
+from allure_commons.types import AttachmentType
+from allure_commons.utils import md5, uuid4
+
+_STATUSES = {"passed": Status.PASSED, "problematic": Status.FAILED, "failed": Status.BROKEN}
+"""Статус единицы (как в истории прогонов) → статус Allure: ошибка сценария — broken, проблемный запуск — failed"""
+
+
+def _status_details(status: str, report: dict) -> Optional[StatusDetails]:
+    if status == "failed":
+        return StatusDetails(message=str(report.get("error")))
+    if status == "problematic":
+        return StatusDetails(message="Проблемный запуск: метрики хуже порогов")
+    return None
+
+
+def report_unit_result(name: str, full_name: str, unit_key: str, status: str, report: dict,
+                       start_ms: int, stop_ms: int, labels: Dict[str, str]) -> str:
+    """
+    Пишет результат Allure одной единицы работы с JSON-отчётом во вложении.
+    status — passed / problematic / failed; возвращает UUID результата.
+    """
+    attachment_file = f"{uuid4()}-attachment.{AttachmentType.JSON.extension}"
+    plugin_manager.hook.report_attached_data(
+        body=json.dumps(report, ensure_ascii=False, indent=2, default=str), file_name=attachment_file
+    )
+    result = TestResult(
+        uuid=uuid4(),
+        name=name,
+        fullName=full_name,
+        historyId=md5(unit_key),
+        testCaseId=md5(unit_key),
+        status=_STATUSES.get(status, Status.UNKNOWN),
+        statusDetails=_status_details(status, report),
+        start=start_ms,
+        stop=stop_ms,
+        parameters=[Parameter(name="film_url", value=report.get("film_url"))],
+        labels=[Label(name=label, value=value) for label, value in labels.items()],
+        attachments=[Attachment(name="report", source=attachment_file, type=AttachmentType.JSON.mime_type)],
+    )
+    plugin_manager.hook.report_result(result=result)
+    return result.uuid
@@ -0,0 +1,274 @@
+"""
+Асинхронный HTTP/1.1-клиент без браузера на asyncio (без внешних зависимостей).
+
+- Пул keep-alive соединений на хост (scheme, host, port) с лимитом параллельных запросов.
+- Ограничение частоты запросов корзиной токенов (TokenBucket).
+- Фазы нового соединения: DNS, TCP connect, TLS; для каждого запроса — TTFB и размер тела.
+- Content-Length, chunked и тело до закрытия соединения; gzip/deflate; редиректы.
+"""
+import asyncio
+import socket
+import ssl
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import config
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+"""Статусы, по которым клиент переходит на Location"""
+
+
+class TokenBucket:
+    """Корзина токенов: в среднем rate запросов в секунду, всплеск до capacity."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class HttpResponse:
+    """Ответ сервера с таймингами фаз (мс)."""
+
+    def __init__(self, url: str, status: int, headers: Dict[str, str], body: bytes, timings: dict):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.timings = timings
+
+    @property
+    def text(self) -> str:
+        content_type = self.headers.get("content-type", "")
+        charset = "utf-8"
+        if "charset=" in content_type:
+            charset = content_type.split("charset=", 1)[1].split(";")[0].strip() or charset
+        try:
+            return self.body.decode(charset, errors="replace")
+        except LookupError:
+            return self.body.decode("utf-8", errors="replace")
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, timings: dict):
+        self.reader = reader
+        self.writer = writer
+        self.timings = timings
+
+    def close(self) -> None:
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class AsyncHttpClient:
+    """
+    Клиент с пулом соединений. Использование:
+
+        async with AsyncHttpClient(rate_limiter=TokenBucket(5)) as client:
+            response = await client.get(url)
+    """
+
+    def __init__(
+        self,
+        max_connections_per_host: int = config.HTTP_MAX_CONNECTIONS_PER_HOST,
+        timeout_sec: float = config.HTTP_TIMEOUT_SEC,
+        rate_limiter: Optional[TokenBucket] = None,
+        user_agent: str = config.HTTP_USER_AGENT,
+        max_redirects: int = 5,
+    ):
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout_sec = timeout_sec
+        self.rate_limiter = rate_limiter
+        self.user_agent = user_agent
+        self.max_redirects = max_redirects
+        self._idle: Dict[Tuple[str, str, int], List[_Connection]] = {}
+        self._limits: Dict[Tuple[str, str, int], asyncio.Semaphore] = {}
+        self._ssl_context = ssl.create_default_context()
+
+    async def __aenter__(self) -> "AsyncHttpClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle.clear()
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None, method: str = "GET") -> HttpResponse:
+        """GET (или HEAD) с переходом по редиректам; тайминги — у последнего запроса цепочки."""
+        redirects = []
+        for _ in range(self.max_redirects + 1):
+            response = await asyncio.wait_for(self._request(method, url, headers or {}), self.timeout_sec)
+            location = response.headers.get("location")
+            if response.status not in REDIRECT_STATUSES or not location:
+                response.timings["redirects"] = redirects
+                return response
+            redirects.append(url)
+            url = urljoin(url, location)
+        raise RuntimeError(f"Слишком много редиректов: {' → '.join(redirects)}")
+
+    async def _request(self, method: str, url: str, headers: Dict[str, str]) -> HttpResponse:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Поддерживаются только http и https: {url}")
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        host_header = parts.netloc.rsplit("@", 1)[-1]
+        request_headers = {
+            "Host": host_header,
+            "User-Agent": self.user_agent,
+            "Accept": "*/*",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+            **headers,
+        }
+        raw_request = (
+            f"{method} {path} HTTP/1.1\r\n"
+            + "".join(f"{name}: {value}\r\n" for name, value in request_headers.items())
+            + "\r\n"
+        ).encode("latin-1")
+
+        limit = self._limits.setdefault(key, asyncio.Semaphore(self.max_connections_per_host))
+        async with limit:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            connection = self._take_idle(key)
+            if connection is not None:
+                try:
+                    return await self._exchange(connection, key, url, method, raw_request)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # Сервер закрыл простаивавшее соединение — повторяем на новом
+                    connection.close()
+                except BaseException:
+                    connection.close()
+                    raise
+            connection = await self._connect(key)
+            try:
+                return await self._exchange(connection, key, url, method, raw_request)
+            except BaseException:
+                # Недочитанный ответ (в том числе по таймауту) — соединение в пул не возвращается
+                connection.close()
+                raise
+
+    def _take_idle(self, key) -> Optional[_Connection]:
+        idle = self._idle.get(key)
+        while idle:
+            connection = idle.pop()
+            if not connection.reader.at_eof() and not connection.writer.is_closing():
+                connection.timings = {"dns": 0, "connect": 0, "tls": 0, "reused": True}
+                return connection
+            connection.close()
+        return None
+
+    async def _connect(self, key) -> _Connection:
+        scheme, host, port = key
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        resolved = time.perf_counter()
+        address = addresses[0][4][0]
+        reader, writer = await asyncio.open_connection(address, port)
+        connected = time.perf_counter()
+        tls_ms = 0
+        if scheme == "https":
+            await writer.start_tls(self._ssl_context, server_hostname=host)
+            tls_ms = round((time.perf_counter() - connected) * 1000, 1)
+        timings = {
+            "dns": round((resolved - started) * 1000, 1),
+            "connect": round((connected - resolved) * 1000, 1),
+            "tls": tls_ms,
+            "reused": False,
+            "address": address,
+        }
+        return _Connection(reader, writer, timings)
+
+    async def _exchange(self, connection: _Connection, key, url: str, method: str, raw_request: bytes) -> HttpResponse:
+        sent = time.perf_counter()
+        connection.writer.write(raw_request)
+        await connection.writer.drain()
+        status_line = await connection.reader.readline()
+        if not status_line:
+            raise ConnectionError("Соединение закрыто до ответа")
+        first_byte = time.perf_counter()
+        version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+        headers = {}
+        while True:
+            line = await connection.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        status = int(status)
+        keep_alive = version != "HTTP/1.0" and headers.get("connection", "").lower() != "close"
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            body = b""
+        elif "chunked" in headers.get("transfer-encoding", "").lower():
+            body = await self._read_chunked(connection.reader)
+        elif "content-length" in headers:
+            body = await connection.reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await connection.reader.read()
+            keep_alive = False
+        finished = time.perf_counter()
+
+        transfer_size = len(body)
+        body = _decode_body(body, headers.get("content-encoding", ""))
+        timings = dict(connection.timings)
+        timings.update({
+            "ttfb": round((first_byte - sent) * 1000, 1),
+            "download": round((finished - first_byte) * 1000, 1),
+            "size": len(body),
+            "transfer_size": transfer_size,
+        })
+        if keep_alive:
+            self._idle.setdefault(key, []).append(connection)
+        else:
+            connection.close()
+        return HttpResponse(url, status, headers, body, timings)
+
+    @staticmethod
+    async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                # Завершающие заголовки (trailer) до пустой строки
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+
+def _decode_body(body: bytes, encoding: str) -> bytes:
+    encoding = encoding.lower()
+    if encoding == "gzip":
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
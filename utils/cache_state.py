@@ -0,0 +1,87 @@
+"""
+Замер страницы в холодном и тёплом состоянии кэша.
+
+dnsResolveTime и connectTime основного сценария часто равны 0: соединение
+уже установлено предыдущей навигацией. Здесь страница открывается
+в отдельных свежих контекстах, чтобы получить размеченные замеры:
+- cold — новый контекст (свои HTTP-кэш, пул соединений и DNS-кэш сетевого
+  контекста) и, в Chromium, Network.setCacheDisabled + clearBrowserCache;
+- warm — новый контекст, предварительный визит, затем замер повторного визита.
+
+Контексты не пересекаются с контекстом теста, поэтому не влияют на пейволл.
+В Chromium к ним применяется та же эмуляция сети, что и в фикстуре page
+(CDP_NETWORK_CONDITIONS); в результате замера поле throttling — режим,
+который действительно применён, или "none" (Firefox, WebKit, No_throttling).
+"""
+from typing import Optional, Tuple
+
+import config
+
+NAVIGATION_TIMING_JS = """
+    () => {
+        const nav = performance.getEntriesByType('navigation')[0];
+        if (!nav) return null;
+        const resources = performance.getEntriesByType('resource');
+        const span = (start, end) => (start > 0 && end > 0) ? Math.max(0, end - start) : 0;
+        return {
+            dnsResolveTime: span(nav.domainLookupStart, nav.domainLookupEnd),
+            connectTime: span(nav.connectStart, nav.connectEnd),
+            tlsTime: span(nav.secureConnectionStart, nav.connectEnd),
+            ttfb: span(nav.requestStart, nav.responseStart),
+            domContentLoadedTime: nav.domContentLoadedEventEnd,
+            loadTime: nav.loadEventEnd,
+            transferBytes: nav.transferSize + resources.reduce((sum, r) => sum + (r.transferSize || 0), 0),
+            cachedResources: resources.filter(r => r.transferSize === 0 && r.decodedBodySize > 0).length,
+        };
+    }
+"""
+
+
+def _open_page(browser, context_args: dict, browser_type: str, throttling: str, cache_disabled: bool) -> Tuple:
+    """Свежий контекст и страница; третье значение — применённый режим сети или "none"."""
+    context = browser.new_context(**context_args)
+    page = context.new_page()
+    applied = "none"
+    if browser_type == "chromium":
+        client = context.new_cdp_session(page)
+        client.send("Network.enable")
+        if cache_disabled:
+            client.send("Network.setCacheDisabled", {"cacheDisabled": True})
+            client.send("Network.clearBrowserCache")
+        conditions = config.CDP_NETWORK_CONDITIONS.get(throttling)
+        if conditions is not None:
+            client.send("Network.emulateNetworkConditions", conditions)
+            applied = throttling
+    return context, page, applied
+
+
+def measure_navigation(page, url: str, timeout_ms: int = 60000) -> Optional[dict]:
+    """Открывает url и возвращает Navigation/Resource Timing (мс, байты)."""
+    page.goto(url, wait_until="load", timeout=timeout_ms)
+    # loadEventEnd заполняется после завершения обработчиков load
+    page.wait_for_function("() => performance.getEntriesByType('navigation')[0]?.loadEventEnd > 0", timeout=timeout_ms)
+    timing = page.evaluate(NAVIGATION_TIMING_JS)
+    if timing is None:
+        return None
+    return {key: round(value) for key, value in timing.items()}
+
+
+def measure_cold(browser, context_args: dict, url: str, browser_type: str, throttling: str) -> Optional[dict]:
+    """Первый визит: свежий контекст, HTTP-кэш отключён."""
+    context, page, applied = _open_page(browser, context_args, browser_type, throttling, cache_disabled=True)
+    try:
+        result = measure_navigation(page, url)
+    finally:
+        context.close()
+    return dict(result, throttling=applied) if result is not None else None
+
+
+def measure_warm(browser, context_args: dict, url: str, browser_type: str, throttling: str) -> Optional[dict]:
+    """Повторный визит: свежий контекст, предварительный визит, затем замер."""
+    context, page, applied = _open_page(browser, context_args, browser_type, throttling, cache_disabled=False)
+    try:
+        page.goto(url, wait_until="load")
+        result = measure_navigation(page, url)
+    finally:
+        context.close()
+    return dict(result, throttling=applied) if result is not None else None
@@ -0,0 +1,102 @@
+"""
+Обход каталога фильмов по HTTP без браузера.
+
+Страницы каталога ?offset=...&limit=... загружаются параллельно через
+пул соединений AsyncHttpClient с ограничением частоты (корзина токенов),
+ссылки на фильмы извлекаются из атрибутов .movie-card[data-url] в HTML.
+Обход прекращается на первой странице без новых карточек.
+"""
+import asyncio
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import config
+from utils.async_http import AsyncHttpClient, TokenBucket
+
+
+class CatalogCrawlError(Exception):
+    """Первая страница каталога не загрузилась — обход без браузера невозможен."""
+
+
+class _MovieCardParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.slugs = []
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if "movie-card" in (attributes.get("class") or "").split() and attributes.get("data-url"):
+            self.slugs.append(attributes["data-url"])
+
+
+def parse_film_urls(html: str, page_url: str) -> List[str]:
+    """Абсолютные URL фильмов из .movie-card[data-url] без query и fragment, в порядке на странице."""
+    parser = _MovieCardParser()
+    parser.feed(html)
+    urls = []
+    for slug in parser.slugs:
+        parts = urlsplit(urljoin(page_url, slug))
+        urls.append(urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")))
+    return list(dict.fromkeys(urls))
+
+
+def listing_url(base_url: str, offset: int, limit: int) -> str:
+    return f"{base_url.rstrip('/')}/?offset={offset}&limit={limit}"
+
+
+async def crawl_catalog(
+    base_url: str,
+    limit: int = 100,
+    max_pages: int = 200,
+    concurrency: int = config.CATALOG_CONCURRENCY,
+    rate: float = config.CATALOG_RATE_LIMIT_RPS,
+    burst: float = config.CATALOG_RATE_BURST,
+    client: Optional[AsyncHttpClient] = None,
+) -> List[str]:
+    """
+    Собирает URL фильмов каталога. Воркеры берут номера страниц по порядку;
+    пустая или недоступная страница ограничивает обход сверху, страницы
+    за ней отбрасываются. Возвращает отсортированный список уникальных URL.
+    """
+    own_client = client is None
+    if own_client:
+        client = AsyncHttpClient(
+            max_connections_per_host=concurrency, rate_limiter=TokenBucket(rate, burst)
+        )
+    pages: Dict[int, List[str]] = {}
+    state = {"next": 0, "stop": max_pages}
+
+    async def worker():
+        while state["next"] < state["stop"]:
+            page_num = state["next"]
+            state["next"] += 1
+            url = listing_url(base_url, page_num * limit, limit)
+            try:
+                response = await client.get(url)
+                if response.status != 200:
+                    raise CatalogCrawlError(f"HTTP {response.status}")
+                urls = parse_film_urls(response.text, response.url)
+            except Exception as e:
+                if page_num == 0:
+                    raise CatalogCrawlError(f"{url}: {e}") from e
+                print(f"    ⚠️ {url}: {e} — обход остановлен на этой странице")
+                urls = []
+            pages[page_num] = urls
+            if not urls:
+                state["stop"] = min(state["stop"], page_num)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        if own_client:
+            await client.close()
+
+    film_urls = set()
+    for page_num in sorted(pages):
+        new_urls = [u for u in pages[page_num] if u not in film_urls]
+        film_urls.update(new_urls)
+        print(f"  📄 Страница {page_num + 1}: {len(new_urls)} новых URL (всего: {len(film_urls)})")
+        if not new_urls and page_num > 0:
+            break
+    return sorted(film_urls)
@@ -0,0 +1,78 @@
+"""
+Чекпоинт сессии для возобновления долгих прогонов.
+
+После каждого завершённого сценария в файл сессии <CHECKPOINT_DIR>/<session_id>.jsonl
+дописывается одна JSON-строка: ключ теста, статус, длительность и отчёты.
+Строка пишется одним вызовом write с fsync, поэтому при падении машины может
+потеряться только последняя, недописанная строка — она игнорируется при чтении.
+С --resume <session_id> завершённые тесты (RESUMED_STATUSES) не собираются
+заново, а их отчёты возвращаются в агрегатор; упавшие и пропущенные
+запускаются повторно, и их новая строка заменяет прежнюю (в файле
+действует последняя запись по ключу).
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import config
+
+
+RESUMED_STATUSES = ("passed", "problematic")
+"""Статусы записей чекпоинта, которые при --resume не перезапускаются"""
+
+
+def new_session_id() -> str:
+    """Идентификатор сессии по времени запуска."""
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+class CheckpointStore:
+    """Журнал завершённых сценариев сессии (JSON Lines, только дозапись)."""
+
+    def __init__(self, session_id: str, checkpoint_dir: str = config.CHECKPOINT_DIR):
+        self.session_id = session_id
+        self.path = Path(checkpoint_dir) / f"{session_id}.jsonl"
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, dict]:
+        """Последняя запись по каждому ключу: {ключ: запись}; повреждённые строки пропускаются."""
+        completed = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        print(f"[WARN] Чекпоинт {self.path}: пропущена повреждённая строка {line_number}")
+                        continue
+                    completed[entry["key"]] = entry
+        except FileNotFoundError:
+            pass
+        return completed
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def append(self, key: str, status: str, duration_sec: float, reports: List[dict]) -> None:
+        entry = {
+            "key": key,
+            "status": status,
+            "duration_sec": round(duration_sec, 1),
+            "ts": round(time.time(), 1),
+            "reports": reports,
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "ab") as f:
+                # Недописанная строка прошлого запуска не должна склеиться с новой
+                if f.tell() and not self._ends_with_newline():
+                    line = "\n" + line
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
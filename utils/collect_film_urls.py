@@ -1,20 +1,29 @@
 """
 Скрипт для сбора всех URL страниц фильмов на calls7.com
 Поддерживает пагинацию через ?offset=...&limit=...
-Сохраняет уникальные URL в films.json и films.txt
+Сохраняет уникальные URL в <домен>_films.json и .txt (см. film_list_name)
+
+Каталог обходится по HTTP без браузера (utils/catalog_crawler.py);
+Chromium используется, только если HTTP-обход не нашёл карточек фильмов.
+Запуск из корня проекта: python -m utils.collect_film_urls
 """
 
+import asyncio
 import json
 import time
 from pathlib import Path
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from urllib.parse import urlsplit
+
+import config
+from utils.catalog_crawler import crawl_catalog
 
 
 def collect_film_urls(
     base_url: str = "https://calls7.com",
     limit: int = 100,
     max_pages: int = 200,  # ~20 000 страниц максимум
-    output_dir: str = "data"
+    output_dir: str = "data",
+    use_browser: bool = False
 ) -> list:
     """
     Собирает все URL фильмов с calls7.com через пагинацию.
@@ -23,9 +32,27 @@ def collect_film_urls(
     :param limit: количество фильмов на странице (макс. 100)
     :param max_pages: максимальное число страниц для обхода
     :param output_dir: папка для сохранения результатов
+    :param use_browser: сразу обходить каталог через Chromium
     :return: список уникальных URL
     """
-    print(f"🚀 Сбор URL фильмов с {base_url} (limit={limit})...")
+    if not use_browser:
+        print(f"🚀 Сбор URL фильмов с {base_url} по HTTP (limit={limit})...")
+        try:
+            film_urls = asyncio.run(crawl_catalog(base_url, limit=limit, max_pages=max_pages))
+            if film_urls:
+                print(f"\n✅ Всего собрано уникальных URL: {len(film_urls)}")
+                return film_urls
+            print("⚠️ В HTML каталога нет карточек фильмов — обходим через браузер.")
+        except Exception as e:
+            print(f"⚠️ HTTP-обход не удался ({e}) — обходим через браузер.")
+    return collect_film_urls_browser(base_url, limit, max_pages)
+
+
+def collect_film_urls_browser(base_url: str, limit: int = 100, max_pages: int = 200) -> list:
+    """Обход каталога через Chromium (запасной вариант для страниц, которые собираются скриптами)."""
+    from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+
+    print(f"🚀 Сбор URL фильмов с {base_url} через браузер (limit={limit})...")
     film_urls = set()
     total_scraped = 0
 
@@ -83,23 +110,37 @@ def collect_film_urls(
     return sorted(film_urls)
 
 
-def save_results(film_urls: list, output_dir: str = "data"):
-    """Сохраняет результаты в JSON и TXT."""
+def film_list_name(base_url: str) -> str:
+    """
+    Имя файлов списка фильмов домена (без расширения): из CATALOG_FILE_NAMES,
+    иначе "<домен>_films" (tests.goodmovie.net → goodmovie_films).
+    """
+    host = urlsplit(base_url).hostname or base_url
+    if host in config.CATALOG_FILE_NAMES:
+        return config.CATALOG_FILE_NAMES[host]
+    labels = [label for label in host.split(".")[:-1] if label not in ("www", "tests")]
+    return f"{labels[0] if labels else host}_films"
+
+
+def save_results(film_urls: list, output_dir: str = "data", base_url: str = None):
+    """Сохраняет результаты в JSON и TXT; имена файлов — по домену base_url (или первого URL)."""
     Path(output_dir).mkdir(exist_ok=True)
+    source = base_url or (film_urls[0] if film_urls else "")
+    name = film_list_name(source)
 
     # JSON — для программной обработки
-    json_path = Path(output_dir) / "goodmovie_films.json"
+    json_path = Path(output_dir) / f"{name}.json"
     with open(json_path, "w", encoding="utf-8") as f:
         json.dump({
             "total": len(film_urls),
             "urls": film_urls,
-            "source": "calls7.com",
+            "source": urlsplit(source).hostname or source,
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
         }, f, indent=2, ensure_ascii=False)
     print(f"📁 Сохранено: {json_path}")
 
     # TXT — для человека / grep / CI
-    txt_path = Path(output_dir) / "goodmovie_films.txt"
+    txt_path = Path(output_dir) / f"{name}.txt"
     with open(txt_path, "w", encoding="utf-8") as f:
         for url in film_urls:
             f.write(url + "\n")
@@ -107,14 +148,15 @@ def save_results(film_urls: list, output_dir: str = "data"):
 
 
 if __name__ == "__main__":
+    base_url = "https://tests.goodmovie.net"
     urls = collect_film_urls(
-        base_url="https://tests.goodmovie.net",
+        base_url=base_url,
         limit=100,          # максимум, который сайт принимает
         max_pages=200       # ~20 000 страниц
     )
-    save_results(urls, output_dir="data")
+    save_results(urls, output_dir="data", base_url=base_url)
 
     # Пример первых 5
     print("\n📋 Примеры URL:")
     for url in urls[:5]:
-        print(f"  - {url}")
\ No newline at end of file
+        print(f"  - {url}")
@@ -0,0 +1,315 @@
+"""
+Каталог фильмов домена с инкрементальным обновлением.
+
+Каталог хранится в CATALOG_DIR/<домен>.json: фильмы по стабильному ID
+(числовой хвост URL: /007-spektr/3012 → "3012") с датами первого и
+последнего появления и страницы листинга с ETag/Last-Modified и фильмами страницы.
+
+Обновление повторяет запросы страниц с If-None-Match / If-Modified-Since.
+Страница совпадает со снимком, если её ID — непрерывный кусок прежнего
+списка: при постраничной выдаче по offset фильм, добавленный в начало,
+сдвигает все страницы на одну позицию, поэтому сравнение идёт с учётом сдвига.
+После CATALOG_UNCHANGED_PAGES_STOP совпавших страниц подряд остаток листинга
+прогнозируется по снимку с тем же сдвигом, и прогноз проверяется запросом
+последней страницы: вставка или удаление в непрочитанной части сдвигает её,
+и тогда обход продолжается до конца. Раз в CATALOG_FULL_REFRESH_DAYS дней
+каталог обходится полностью. Результат — diff: добавленные, удалённые и
+изменённые (тот же ID, другой URL) фильмы.
+
+Запуск из корня проекта:
+    python -m utils.film_catalog https://tests.goodmovie.net
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+import config
+from utils.async_http import AsyncHttpClient, TokenBucket
+from utils.catalog_crawler import CatalogCrawlError, listing_url, parse_film_urls
+
+
+def film_id(url: str) -> str:
+    """Стабильный ID фильма: числовой последний сегмент пути, иначе путь целиком."""
+    path = urlsplit(url).path.strip("/")
+    last = path.rsplit("/", 1)[-1]
+    return last if re.fullmatch(r"\d+", last) else path
+
+
+class CatalogDiff:
+    """Изменения каталога после обновления."""
+
+    def __init__(self, added: List[str], removed: List[str], changed: List[dict], requests: int,
+                 not_modified: int, full: bool):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.requests = requests
+        self.not_modified = not_modified
+        self.full = full
+
+    def describe(self) -> str:
+        walk = "полный обход" if self.full else "до совпадения со снимком"
+        return (
+            f"+{len(self.added)} / -{len(self.removed)} / ~{len(self.changed)} фильмов; "
+            f"запросов {self.requests} (304: {self.not_modified}), {walk}"
+        )
+
+    def to_dict(self) -> dict:
+        return {"added": self.added, "removed": self.removed, "changed": self.changed,
+                "requests": self.requests, "not_modified": self.not_modified, "full": self.full}
+
+
+class FilmCatalog:
+    """Каталог одного домена: фильмы по ID и снимок страниц листинга."""
+
+    def __init__(self, base_url: str, catalog_dir: str = config.CATALOG_DIR, limit: int = 100):
+        self.base_url = base_url.rstrip("/")
+        self.domain = urlsplit(self.base_url).hostname
+        self.path = Path(catalog_dir) / f"{self.domain}.json"
+        self.limit = limit
+        self.films: Dict[str, dict] = {}
+        self.pages: List[dict] = []
+        self.last_full_refresh = 0.0
+        self.last_diff: Optional[dict] = None
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Не удалось прочитать каталог {self.path}: {e}")
+            return
+        if data.get("limit", self.limit) != self.limit:
+            # Другой размер страницы — снимок страниц не сопоставим, фильмы сохраняем
+            data["pages"] = []
+        self.films = data.get("films", {})
+        self.pages = data.get("pages", [])
+        self.last_full_refresh = data.get("last_full_refresh", 0.0)
+        self.last_diff = data.get("last_diff")
+
+    def urls(self) -> List[str]:
+        return sorted(film["url"] for film in self.films.values())
+
+    async def refresh(
+        self,
+        client: Optional[AsyncHttpClient] = None,
+        max_pages: int = 200,
+        concurrency: int = config.CATALOG_CONCURRENCY,
+        unchanged_stop: int = config.CATALOG_UNCHANGED_PAGES_STOP,
+        full: Optional[bool] = None,
+        now: Optional[float] = None,
+    ) -> CatalogDiff:
+        """Обновляет каталог по сайту и возвращает diff (на диск сохраняет save())."""
+        now = now if now is not None else time.time()
+        if full is None:
+            full = not self.pages or unchanged_stop <= 0 or \
+                now - self.last_full_refresh >= config.CATALOG_FULL_REFRESH_DAYS * 86400
+        own_client = client is None
+        if own_client:
+            client = AsyncHttpClient(
+                max_connections_per_host=concurrency,
+                rate_limiter=TokenBucket(config.CATALOG_RATE_LIMIT_RPS, config.CATALOG_RATE_BURST),
+            )
+        try:
+            pages, stats = await self._walk(client, max_pages, concurrency, unchanged_stop, full)
+        finally:
+            if own_client:
+                await client.close()
+        return self._apply(pages, stats, full, now)
+
+    async def _walk(self, client, max_pages, concurrency, unchanged_stop, full):
+        pages, stats = [], {"requests": 0, "not_modified": 0}
+        previous = [(fid, url) for page in self.pages for fid, url in page["urls"].items()]
+        positions = {fid: i for i, (fid, _) in enumerate(previous)}
+        early_stop = not full
+        streak, page_num, expected_pages = 0, 0, max_pages
+        # Без полного обхода первая волна — ровно столько страниц, сколько нужно для досрочной остановки
+        wave = concurrency if full else max(1, unchanged_stop)
+        while page_num < max_pages:
+            batch = list(range(page_num, min(page_num + wave, max_pages)))
+            results = await asyncio.gather(*(self._fetch_page(client, i, stats) for i in batch))
+            for page in results:
+                if not page["urls"]:
+                    return pages, stats
+                pages.append(page)
+                end = self._aligned_end(page, positions, previous)
+                streak = streak + 1 if end is not None else 0
+                if early_stop and streak >= unchanged_stop:
+                    tail = await self._verified_tail(client, pages, previous[end:], stats)
+                    if tail is not None:
+                        return pages + tail, stats
+                    # Хвост не сошёлся с прогнозом — изменения есть и среди непрочитанных страниц;
+                    # дочитываем до конца, не запрашивая волну страниц далеко за ожидаемым концом листинга
+                    early_stop = False
+                    expected_pages = (len(pages) * self.limit + len(previous) - end - 1) // self.limit + 2
+            page_num = len(pages)
+            # Серия совпадений уже идёт — догружаем ровно столько страниц, сколько не хватает до остановки
+            if early_stop and streak:
+                wave = max(1, unchanged_stop - streak)
+            else:
+                wave = max(1, min(concurrency, expected_pages - page_num))
+        return pages, stats
+
+    def _aligned_end(self, page: dict, positions: Dict[str, int], previous: List[tuple]) -> Optional[int]:
+        """
+        Страница — непрерывный кусок прежнего списка, возможно со сдвигом (фильмы
+        добавились или пропали выше по листингу). Возвращает позицию в прежнем
+        списке сразу за куском или None.
+        """
+        ids = list(page["urls"])
+        start = positions.get(ids[0])
+        if start is None or [fid for fid, _ in previous[start:start + len(ids)]] != ids:
+            return None
+        if len(ids) < self.limit and start + len(ids) < len(previous):
+            # Неполная страница должна быть концом прежнего списка
+            return None
+        return start + len(ids)
+
+    async def _verified_tail(self, client, pages: List[dict], predicted: List[tuple],
+                             stats: dict) -> Optional[List[dict]]:
+        """
+        Остаток листинга по прогнозу «дальше — прежний список с тем же сдвигом».
+        Прогноз проверяется одной страницей — последней: вставка или удаление
+        фильма в непрочитанной части сдвигает её содержимое. None — прогноз не подтвердился.
+        """
+        fetched = len(pages) * self.limit
+        if not predicted:
+            # Прежний список закончился — следующая страница должна быть пустой
+            page = await self._fetch_page(client, len(pages), stats)
+            return [] if not page["urls"] else None
+        last_num = (fetched + len(predicted) - 1) // self.limit
+        last_page = await self._fetch_page(client, last_num, stats)
+        chunks = [predicted[i:i + self.limit] for i in range(0, len(predicted), self.limit)]
+        if [fid for fid, _ in chunks[-1]] != list(last_page["urls"]):
+            return None
+        tail = []
+        for page_num, chunk in enumerate(chunks[:-1], start=len(pages)):
+            old = self.pages[page_num] if page_num < len(self.pages) else {}
+            urls = dict(chunk)
+            # Страница совпала с прежней на том же месте — её ETag остаётся в силе
+            same = list(old.get("urls", {}).items()) == list(urls.items())
+            tail.append({
+                "offset": page_num * self.limit,
+                "etag": old.get("etag") if same else None,
+                "last_modified": old.get("last_modified") if same else None,
+                "urls": urls,
+            })
+        return tail + [last_page]
+
+    async def _fetch_page(self, client: AsyncHttpClient, page_num: int, stats: dict) -> dict:
+        previous = self.pages[page_num] if page_num < len(self.pages) else None
+        headers = {}
+        if previous and previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous and previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+        url = listing_url(self.base_url, page_num * self.limit, self.limit)
+        stats["requests"] += 1
+        response = await client.get(url, headers=headers)
+        if response.status == 304 and previous:
+            stats["not_modified"] += 1
+            return dict(previous)
+        if response.status != 200:
+            raise CatalogCrawlError(f"{url}: HTTP {response.status}")
+        return {
+            "offset": page_num * self.limit,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "urls": {film_id(u): u for u in parse_film_urls(response.text, response.url)},
+        }
+
+    def _apply(self, pages: List[dict], stats: dict, full: bool, now: float) -> CatalogDiff:
+        current = {}
+        for page in pages:
+            current.update(page["urls"])
+        added = sorted(url for fid, url in current.items() if fid not in self.films)
+        removed = sorted(film["url"] for fid, film in self.films.items() if fid not in current)
+        changed = [
+            {"id": fid, "old_url": self.films[fid]["url"], "url": url}
+            for fid, url in sorted(current.items())
+            if fid in self.films and self.films[fid]["url"] != url
+        ]
+        films = {}
+        for fid, url in current.items():
+            previous = self.films.get(fid, {})
+            films[fid] = {"url": url, "first_seen": previous.get("first_seen", now), "last_seen": now}
+        self.films = films
+        self.pages = pages
+        if full:
+            self.last_full_refresh = now
+        diff = CatalogDiff(added, removed, changed, stats["requests"], stats["not_modified"], full)
+        self.last_diff = {"timestamp": now, **diff.to_dict()}
+        return diff
+
+    def save(self) -> None:
+        data = {
+            "domain": self.domain,
+            "base_url": self.base_url,
+            "limit": self.limit,
+            "updated": time.time(),
+            "last_full_refresh": self.last_full_refresh,
+            "last_diff": self.last_diff,
+            "films": self.films,
+            "pages": self.pages,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def recently_added_urls(days: float = config.SCHEDULER_NEW_FILM_DAYS, catalog_dir: str = config.CATALOG_DIR,
+                        now: Optional[float] = None) -> Set[str]:
+    """URL фильмов всех доменов, впервые появившихся в каталогах за последние days дней."""
+    since = (now if now is not None else time.time()) - days * 86400
+    urls = set()
+    for path in Path(catalog_dir).glob("*.json"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                films = json.load(f).get("films", {})
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Не удалось прочитать каталог {path}: {e}")
+            continue
+        # Первое заполнение каталога не считается появлением новых фильмов
+        first_fill = min((film["first_seen"] for film in films.values()), default=0)
+        urls.update(
+            film["url"] for film in films.values()
+            if film["first_seen"] >= since and film["first_seen"] > first_fill
+        )
+    return urls
+
+
+if __name__ == "__main__":
+    from utils.collect_film_urls import film_list_name, save_results
+
+    parser = argparse.ArgumentParser(description="Инкрементальное обновление каталога фильмов домена")
+    parser.add_argument("base_url", help="Например, https://tests.goodmovie.net")
+    parser.add_argument("--limit", type=int, default=100, help="Фильмов на странице листинга")
+    parser.add_argument("--max-pages", type=int, default=200)
+    parser.add_argument("--full", action="store_true", help="Обойти все страницы без досрочной остановки")
+    parser.add_argument("--output-dir", default="data", help="Куда записать плоский список фильмов для --film-list")
+    arguments = parser.parse_args()
+
+    catalog = FilmCatalog(arguments.base_url, limit=arguments.limit)
+    diff = asyncio.run(catalog.refresh(max_pages=arguments.max_pages, full=True if arguments.full else None))
+    catalog.save()
+    print(f"[INFO] Каталог {catalog.domain}: {len(catalog.films)} фильмов; {diff.describe()}")
+    for url in diff.added[:20]:
+        print(f"  + {url}")
+    for url in diff.removed[:20]:
+        print(f"  - {url}")
+    for change in diff.changed[:20]:
+        print(f"  ~ {change['old_url']} → {change['url']}")
+    film_list = Path(arguments.output_dir) / f"{film_list_name(catalog.base_url)}.json"
+    if diff.added or diff.removed or diff.changed or not film_list.exists():
+        save_results(catalog.urls(), output_dir=arguments.output_dir, base_url=catalog.base_url)
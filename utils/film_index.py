@@ -0,0 +1,237 @@
+"""
+Индекс атрибутов фильмов для стратифицированной выборки.
+
+Атрибуты, от которых зависит производительность страницы фильма — сценарий
+плеера (A — преролл, B — прямой доступ, см. detect_video_scenario), тип
+плеера, длительность видео, вес страницы, TTFB и размер HTML, — собираются
+из каталогов доменов (utils/film_catalog.py) и отчётов прошлых прогонов.
+Хранение — SQLite (FILM_INDEX_FILE) со вторичными индексами по стратам,
+поэтому выборка «N фильмов на каждую страту сценарий × вес страницы»
+выполняется одним запросом без чтения всего каталога в память.
+
+Запуск из корня проекта:
+    python -m utils.film_index sync           # фильмы из data/catalogs
+    python -m utils.film_index stats          # размеры страт
+    python -m utils.film_index sample 5       # 5 фильмов на страту
+"""
+import argparse
+import bisect
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+import config
+from utils.film_catalog import film_id
+from utils.sharding import stable_hash
+
+STRATUM_COLUMNS = ("domain", "scenario", "player_type", "weight_bucket", "duration_bucket")
+"""Атрибуты, по которым можно стратифицировать выборку"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS films (
+    url TEXT PRIMARY KEY,
+    film_id TEXT,
+    domain TEXT,
+    scenario TEXT,
+    player_type TEXT,
+    video_duration_sec REAL,
+    duration_bucket INTEGER,
+    page_weight_bytes INTEGER,
+    weight_bucket INTEGER,
+    html_bytes INTEGER,
+    ttfb_ms REAL,
+    observations INTEGER NOT NULL DEFAULT 0,
+    sample_key INTEGER NOT NULL,
+    updated REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS films_scenario_weight ON films (scenario, weight_bucket, sample_key);
+CREATE INDEX IF NOT EXISTS films_domain ON films (domain, sample_key);
+"""
+
+
+def bucket(value: Optional[float], bounds: Sequence[float]) -> Optional[int]:
+    """Номер корзины: 0 — меньше bounds[0], len(bounds) — не меньше последней границы."""
+    return None if value is None else bisect.bisect_right(bounds, value)
+
+
+def _bucket_sql(expression: str, bounds: Sequence[float]) -> str:
+    """То же, что bucket(), выражением SQL — для пересчёта корзины внутри UPSERT."""
+    branches = " ".join(f"WHEN {expression} < {bound} THEN {i}" for i, bound in enumerate(bounds))
+    return f"CASE WHEN {expression} IS NULL THEN NULL {branches} ELSE {len(bounds)} END"
+
+
+def _sample_key(url: str) -> int:
+    # SQLite хранит знаковые 64-битные числа
+    return stable_hash(url) >> 1
+
+
+class FilmIndex:
+    """SQLite-индекс фильмов; изменения пишутся в одной транзакции на вызов."""
+
+    def __init__(self, path: str = config.FILM_INDEX_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def sync_catalog(self, catalog_path: str) -> int:
+        """Добавляет фильмы каталога домена (атрибуты уже известных фильмов сохраняются)."""
+        with open(catalog_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        domain = data.get("domain")
+        rows = [
+            (film["url"], fid, domain, _sample_key(film["url"]), time.time())
+            for fid, film in data.get("films", {}).items()
+        ]
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO films (url, film_id, domain, sample_key, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET film_id = excluded.film_id, domain = excluded.domain",
+                rows,
+            )
+        return len(rows)
+
+    def observe_reports(self, reports: Iterable[dict]) -> int:
+        """
+        Обновляет атрибуты по отчётам сценария: сценарий и тип плеера — последние
+        наблюдённые, длительность — последняя известная, вес страницы — максимум
+        (в пакетном и потоковом режимах часть ресурсов приходит из кэша).
+        """
+        rows = []
+        for report in reports:
+            url = report.get("film_url")
+            if not isinstance(url, str):
+                continue
+            meta = report.get("film_meta") or {}
+            weight = report.get("network", {}).get("film_page", {}).get("bytes")
+            duration = meta.get("videoDuration")
+            rows.append({
+                "url": url,
+                "film_id": film_id(url),
+                "domain": urlsplit(url).hostname,
+                "scenario": report.get("video_scenario"),
+                "player_type": meta.get("playerType"),
+                "duration": duration,
+                "duration_bucket": bucket(duration, config.FILM_DURATION_BUCKETS_SEC),
+                "weight": weight or None,
+                "sample_key": _sample_key(url),
+                "updated": time.time(),
+            })
+        weight_bounds = [kb * 1024 for kb in config.FILM_WEIGHT_BUCKETS_KB]
+        merged_weight = "NULLIF(MAX(COALESCE(excluded.page_weight_bytes, 0), COALESCE(page_weight_bytes, 0)), 0)"
+        with self.db:
+            self.db.executemany(
+                f"""
+                INSERT INTO films (url, film_id, domain, scenario, player_type, video_duration_sec, duration_bucket,
+                                   page_weight_bytes, weight_bucket, observations, sample_key, updated)
+                VALUES (:url, :film_id, :domain, :scenario, :player_type, :duration, :duration_bucket,
+                        :weight, {_bucket_sql(":weight", weight_bounds)}, 1, :sample_key, :updated)
+                ON CONFLICT(url) DO UPDATE SET
+                    scenario = COALESCE(excluded.scenario, scenario),
+                    player_type = COALESCE(excluded.player_type, player_type),
+                    video_duration_sec = COALESCE(excluded.video_duration_sec, video_duration_sec),
+                    duration_bucket = COALESCE(excluded.duration_bucket, duration_bucket),
+                    page_weight_bytes = {merged_weight},
+                    weight_bucket = {_bucket_sql(merged_weight, weight_bounds)},
+                    observations = observations + 1,
+                    updated = excluded.updated
+                """,
+                rows,
+            )
+        return len(rows)
+
+    def observe_probes(self, results: Iterable[dict]) -> None:
+        """TTFB и размер HTML из HTTP-проб (utils/http_probe.py); фильмы без ответа не меняются."""
+        rows = [
+            (r["film_url"], film_id(r["film_url"]), urlsplit(r["film_url"]).hostname, r["metrics"]["ttfb"],
+             r["metrics"]["htmlBytes"], _sample_key(r["film_url"]), time.time())
+            for r in results if r["metrics"].get("ttfb") is not None
+        ]
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO films (url, film_id, domain, ttfb_ms, html_bytes, sample_key, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET ttfb_ms = excluded.ttfb_ms, html_bytes = excluded.html_bytes",
+                rows,
+            )
+
+    def strata(self, by: Sequence[str] = tuple(config.FILM_SAMPLE_STRATA)) -> List[dict]:
+        """Размеры страт: [{атрибут: значение, ..., "films": n}]."""
+        columns = _check_columns(by)
+        query = f"SELECT {columns}, COUNT(*) AS films FROM films GROUP BY {columns} ORDER BY {columns}"
+        return [dict(row) for row in self.db.execute(query)]
+
+    def sample(self, per_stratum: int, by: Sequence[str] = tuple(config.FILM_SAMPLE_STRATA),
+               urls: Optional[Iterable[str]] = None, seed: int = 0) -> List[str]:
+        """
+        До per_stratum фильмов из каждой страты (фильмы с неизвестным атрибутом —
+        отдельная страта). urls ограничивает выборку списком (например, --film-list).
+        Порядок внутри страты — по стабильному хешу URL, перемешанному seed.
+        """
+        columns = _check_columns(by)
+        source = "films"
+        if urls is not None:
+            # Фильмы списка, которых ещё нет в индексе, попадают в страту с неизвестными атрибутами
+            self.db.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS candidates (url TEXT PRIMARY KEY, sample_key INTEGER) WITHOUT ROWID"
+            )
+            self.db.execute("DELETE FROM candidates")
+            self.db.executemany("INSERT OR IGNORE INTO candidates VALUES (?, ?)", ((u, _sample_key(u)) for u in urls))
+            source = f"(SELECT candidates.url, candidates.sample_key, {', '.join('films.' + c for c in by)} " \
+                     f"FROM candidates LEFT JOIN films USING (url))"
+        seed_key = _sample_key(str(seed))
+        # XOR через | и &: в SQLite нет оператора исключающего ИЛИ
+        query = f"""
+            SELECT url FROM (
+                SELECT url, {columns},
+                       ROW_NUMBER() OVER (PARTITION BY {columns}
+                                          ORDER BY (sample_key | :seed) - (sample_key & :seed)) AS position
+                FROM {source}
+            ) WHERE position <= :per_stratum
+            ORDER BY {columns}, position
+        """
+        return [row["url"] for row in self.db.execute(query, {"seed": seed_key, "per_stratum": per_stratum})]
+
+    def missing(self, urls: Iterable[str]) -> List[str]:
+        """URL из списка, которых ещё нет в индексе."""
+        known = {row["url"] for row in self.db.execute("SELECT url FROM films")}
+        return [u for u in urls if u not in known]
+
+
+def _check_columns(by: Sequence[str]) -> str:
+    unknown = [name for name in by if name not in STRATUM_COLUMNS]
+    if unknown or not by:
+        raise ValueError(f"Страты выбираются из {', '.join(STRATUM_COLUMNS)}, получено: {', '.join(by) or '—'}")
+    return ", ".join(by)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Индекс атрибутов фильмов")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("sync", help="Добавить фильмы из каталогов доменов")
+    stats_parser = commands.add_parser("stats", help="Размеры страт")
+    stats_parser.add_argument("--by", default=",".join(config.FILM_SAMPLE_STRATA))
+    sample_parser = commands.add_parser("sample", help="N фильмов на страту")
+    sample_parser.add_argument("per_stratum", type=int)
+    sample_parser.add_argument("--by", default=",".join(config.FILM_SAMPLE_STRATA))
+    sample_parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    index = FilmIndex()
+    if arguments.command == "sync":
+        for catalog_path in sorted(Path(config.CATALOG_DIR).glob("*.json")):
+            print(f"[INFO] {catalog_path.name}: {index.sync_catalog(str(catalog_path))} фильмов")
+    elif arguments.command == "stats":
+        for stratum in index.strata(arguments.by.split(",")):
+            print(stratum)
+    elif arguments.command == "sample":
+        for url in index.sample(arguments.per_stratum, arguments.by.split(","), seed=arguments.seed):
+            print(url)
+    index.close()
@@ -0,0 +1,62 @@
+"""
+Ленивый источник фильмов для потокового режима (--film-stream on).
+
+При обычной параметризации каждый фильм из --film-list умножается на все
+измерения матрицы, и pytest создаёт сотни тысяч тестов ещё до запуска первого
+браузера. В потоковом режиме параметр get_film_url получает одно значение —
+FilmStream, — и на каждую конфигурацию (устройство × сеть × ГЕО × браузер × ...)
+собирается один тест, который читает фильмы по одному уже во время выполнения.
+"""
+import json
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+def iter_film_urls(film_list_path: str, limit: Optional[int] = None) -> Iterator[str]:
+    """
+    URL фильмов из JSON (список или {"urls": [...]}) или TXT (по одному в строке).
+    TXT читается построчно, без загрузки всего файла.
+    """
+    path = Path(film_list_path)
+    if not path.exists():
+        raise FileNotFoundError(f"Файл не найден: {film_list_path}")
+    if path.suffix == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        urls = iter(data.get("urls", data) if isinstance(data, dict) else data)
+    elif path.suffix == ".txt":
+        urls = _iter_lines(path)
+    else:
+        raise ValueError(f"Поддерживаются только .json и .txt, получено: {path.suffix}")
+    for count, url in enumerate(urls):
+        if limit is not None and count >= limit:
+            break
+        yield url
+
+
+def _iter_lines(path: Path) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line.strip()
+
+
+class FilmStream:
+    """
+    Значение параметра get_film_url в потоковом режиме.
+    Каждый обход заново читает список, поэтому один объект безопасно
+    разделяется между тестами всех конфигураций.
+    """
+
+    def __init__(self, film_list_path: str, limit: Optional[int] = None):
+        self.film_list_path = film_list_path
+        self.limit = limit
+
+    def __iter__(self) -> Iterator[str]:
+        return iter_film_urls(self.film_list_path, self.limit)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"FilmStream({self.film_list_path!r}, limit={self.limit})"
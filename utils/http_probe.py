@@ -0,0 +1,224 @@
+"""
+HTTP-проба фильмов без браузера.
+
+Для каждого URL фильма одним GET через пул AsyncHttpClient измеряются DNS,
+TCP connect, TLS (для нового соединения), TTFB и размер HTML; если в HTML
+найдена ссылка на HLS-манифест (.m3u8), он тоже загружается. Результаты
+пишутся в историю проб (PROBE_HISTORY_FILE, формат utils/run_history.py) под
+ключом probe|<url> и в индекс фильмов (utils/film_index.py). Фильмы с
+недавней аномалией пробы — ошибка, медленный TTFB, слишком маленький HTML,
+недоступный манифест или рост метрик PROBE_REGRESSION_METRICS — планировщик
+--schedule history ставит в начало очереди браузерных тестов.
+
+Запуск из корня проекта:
+    python -m utils.http_probe data/goodmovie_films.json
+"""
+import argparse
+import asyncio
+import json
+import re
+import statistics
+import time
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import urljoin
+
+import config
+from utils.async_http import AsyncHttpClient, TokenBucket
+from utils.film_index import FilmIndex
+from utils.film_stream import iter_film_urls
+from utils.run_history import FAILING_STATUSES, RunHistory
+
+_MANIFEST_RE = re.compile(r"""["'(=]\s*((?:https?:)?[^"'()\s<>]+?\.m3u8(?:\?[^"'()\s<>]*)?)""")
+
+
+def probe_key(film_url: str) -> str:
+    """Ключ пробы фильма в истории проб."""
+    return f"probe|{film_url}"
+
+
+def find_manifest_url(html: str, page_url: str) -> Optional[str]:
+    """Первая ссылка на .m3u8 в HTML (атрибуты, скрипты, JSON с экранированными «/»)."""
+    match = _MANIFEST_RE.search(html.replace("\\/", "/"))
+    return urljoin(page_url, match.group(1)) if match else None
+
+
+_TIMING_METRICS = {"dns": "dnsResolveTime", "connect": "connectTime", "tls": "tlsTime",
+                   "reused": "connectionReused", "ttfb": "ttfb", "download": "downloadTime"}
+
+
+def _timing_metrics(timings: dict, prefix: str = "") -> dict:
+    """Фазы запроса в именах метрик отчёта; у переиспользованного соединения DNS, connect и TLS — 0."""
+    return {
+        (prefix + name[0].upper() + name[1:] if prefix else name): timings.get(source)
+        for source, name in _TIMING_METRICS.items()
+    }
+
+
+async def probe_film(client: AsyncHttpClient, film_url: str) -> dict:
+    """
+    Проба одного фильма: {"film_url", "status", "issues", "duration_sec", "metrics"}.
+    failed — ошибка запроса, не 200, слишком маленький HTML или сломанный манифест;
+    problematic — медленный TTFB.
+    """
+    started = time.perf_counter()
+    metrics, errors, warnings = {}, [], []
+    try:
+        response = await client.get(film_url)
+        metrics.update(_timing_metrics(response.timings))
+        metrics.update({
+            "httpStatus": response.status,
+            "htmlBytes": response.timings["size"],
+            "htmlTransferBytes": response.timings["transfer_size"],
+            "redirects": len(response.timings.get("redirects", [])),
+        })
+        if response.status != 200:
+            errors.append(f"HTTP {response.status}")
+        else:
+            if response.timings["size"] < config.PROBE_MIN_HTML_BYTES:
+                errors.append(f"HTML {response.timings['size']} байт")
+            if response.timings["ttfb"] >= config.PROBE_SLOW_TTFB_MS:
+                warnings.append(f"TTFB {response.timings['ttfb']:.0f} мс")
+            manifest_url = find_manifest_url(response.text, response.url)
+            if manifest_url:
+                metrics.update(await _probe_manifest(client, manifest_url, errors))
+    except Exception as e:
+        errors.append(f"{type(e).__name__}: {e}")
+    return {
+        "film_url": film_url,
+        "status": "failed" if errors else "problematic" if warnings else "passed",
+        "issues": errors + warnings,
+        "duration_sec": time.perf_counter() - started,
+        "metrics": metrics,
+    }
+
+
+async def _probe_manifest(client: AsyncHttpClient, manifest_url: str, errors: List[str]) -> dict:
+    metrics = {"manifestUrl": manifest_url}
+    try:
+        response = await client.get(manifest_url)
+    except Exception as e:
+        errors.append(f"манифест недоступен: {type(e).__name__}: {e}")
+        return metrics
+    metrics.update(_timing_metrics(response.timings, prefix="manifest"))
+    metrics.update({"manifestStatus": response.status, "manifestBytes": response.timings["size"]})
+    if response.status != 200:
+        errors.append(f"манифест: HTTP {response.status}")
+    elif not response.text.lstrip().startswith("#EXTM3U"):
+        errors.append("манифест без #EXTM3U")
+    else:
+        metrics["manifestVariants"] = response.text.count("#EXT-X-STREAM-INF")
+        metrics["manifestSegments"] = response.text.count("#EXTINF")
+    return metrics
+
+
+async def probe_films(
+    film_urls: Iterable[str],
+    concurrency: int = config.PROBE_CONCURRENCY,
+    rate: float = config.PROBE_RATE_LIMIT_RPS,
+    burst: float = config.PROBE_RATE_BURST,
+    client: Optional[AsyncHttpClient] = None,
+) -> List[dict]:
+    """Пробует фильмы пулом воркеров; результаты — в порядке завершения."""
+    own_client = client is None
+    if own_client:
+        client = AsyncHttpClient(max_connections_per_host=concurrency, rate_limiter=TokenBucket(rate, burst))
+    queue = iter(film_urls)
+    results = []
+
+    async def worker():
+        for film_url in queue:
+            results.append(await probe_film(client, film_url))
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        if own_client:
+            await client.close()
+    return results
+
+
+def record_probes(results: List[dict], history: RunHistory, index: Optional[FilmIndex] = None) -> None:
+    """Пишет результаты в историю проб и TTFB / размер HTML — в индекс фильмов."""
+    for result in results:
+        metrics = {
+            f"probe.{name}": value for name, value in result["metrics"].items()
+            if name in ("ttfb", "htmlBytes", "manifestTtfb") and value is not None
+        }
+        history.record(probe_key(result["film_url"]), result["status"], result["duration_sec"], metrics)
+    if index is not None:
+        index.observe_probes(results)
+
+
+def probe_anomalies(history: RunHistory, film_urls: Iterable[str], now: Optional[float] = None) -> Set[str]:
+    """
+    Фильмы, последняя проба которых не старше SCHEDULER_RECENT_FAILURE_DAYS и
+    неуспешна или показывает рост PROBE_REGRESSION_METRICS.
+    """
+    now = now if now is not None else time.time()
+    urls = set()
+    for film_url in film_urls:
+        key = probe_key(film_url)
+        last = history.last_run(key)
+        if last is None or now - last["ts"] > config.SCHEDULER_RECENT_FAILURE_DAYS * 86400:
+            continue
+        if last["status"] in FAILING_STATUSES or history.is_regressing(
+            key, config.PROBE_REGRESSION_METRICS, config.SCHEDULER_REGRESSION_RATIO
+        ):
+            urls.add(film_url)
+    return urls
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def summarize(results: List[dict]) -> Dict[str, object]:
+    ttfb = [r["metrics"]["ttfb"] for r in results if r["metrics"].get("ttfb") is not None]
+    return {
+        "films": len(results),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "problematic": sum(1 for r in results if r["status"] == "problematic"),
+        "with_manifest": sum(1 for r in results if "manifestUrl" in r["metrics"]),
+        "ttfb_p50": _percentile(ttfb, 50),
+        "ttfb_p95": _percentile(ttfb, 95),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP-проба фильмов без браузера")
+    parser.add_argument("film_list", help="Список фильмов (.json или .txt), как для --film-list")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=config.PROBE_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=config.PROBE_RATE_LIMIT_RPS, help="Запросов в секунду")
+    parser.add_argument("--output", default=None, help="Записать результаты проб в JSON")
+    arguments = parser.parse_args()
+
+    started = time.time()
+    results = asyncio.run(probe_films(
+        iter_film_urls(arguments.film_list, arguments.limit), arguments.concurrency, arguments.rate
+    ))
+    history = RunHistory(config.PROBE_HISTORY_FILE)
+    index = FilmIndex()
+    try:
+        record_probes(results, history, index)
+    finally:
+        index.close()
+    history.save()
+
+    summary = summarize(results)
+    print(
+        f"[INFO] Проба {summary['films']} фильмов за {time.time() - started:.0f} с: "
+        f"ошибок {summary['failed']}, проблемных {summary['problematic']}, с HLS-манифестом {summary['with_manifest']}; "
+        f"TTFB p50 {summary['ttfb_p50']} мс, p95 {summary['ttfb_p95']} мс"
+    )
+    anomalies = [r for r in results if r["status"] != "passed"]
+    for result in sorted(anomalies, key=lambda r: r["status"])[:20]:
+        print(f"  [{result['status']}] {result['film_url']}: {'; '.join(result['issues'])}")
+    print(f"[INFO] Аномалий по истории проб: {len(probe_anomalies(history, (r['film_url'] for r in results)))}")
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": results}, f, ensure_ascii=False, indent=2)
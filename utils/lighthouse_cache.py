@@ -0,0 +1,117 @@
+"""
+Кэш результатов Lighthouse.
+
+Ключ кэша — URL и фактические настройки эмуляции, с которыми работает
+раннер Lighthouse (см. lighthouse_runner.effective_emulation). Записи живут
+TTL секунд и хранятся на диске как LRU: при превышении лимита удаляются
+записи, к которым дольше всего не обращались.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import config
+
+
+def make_cache_key(url: str, emulation: dict) -> str:
+    """Строит ключ кэша по URL и настройкам эмуляции."""
+    payload = json.dumps({"url": url.strip(), "emulation": emulation}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LighthouseCache:
+    """
+    Дисковый LRU-кэш метрик Lighthouse с TTL.
+
+    Каждая запись — отдельный JSON-файл <key>.json, время последнего
+    обращения хранится в mtime файла.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = config.LIGHTHOUSE_CACHE_DIR,
+        ttl_sec: float = config.LIGHTHOUSE_CACHE_TTL_SEC,
+        max_entries: int = config.LIGHTHOUSE_CACHE_MAX_ENTRIES,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_sec > 0
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, url: str, emulation: dict) -> Optional[dict]:
+        """Возвращает метрики из кэша или None (и учитывает попадание/промах)."""
+        if not self.enabled:
+            return None
+        path = self._path(make_cache_key(url, emulation))
+        with self._lock:
+            entry = None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+            if entry and time.time() - entry.get("created_at", 0) <= self.ttl_sec:
+                os.utime(path)  # отмечаем обращение для LRU
+                self.hits += 1
+                return entry["metrics"]
+
+            if entry:
+                path.unlink(missing_ok=True)  # запись устарела
+            self.misses += 1
+            return None
+
+    def record_hit(self) -> None:
+        """Учитывает попадание, обслуженное без обращения к диску (например, аудит уже в работе)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.hits += 1
+
+    def put(self, url: str, emulation: dict, metrics: dict) -> None:
+        """Сохраняет метрики в кэш и вытесняет самые старые записи."""
+        if not self.enabled:
+            return
+        key = make_cache_key(url, emulation)
+        entry = {
+            "url": url,
+            "emulation": emulation,
+            "created_at": time.time(),
+            "metrics": metrics,
+        }
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_dir / f"{key}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = list(self.cache_dir.glob("*.json"))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda p: p.stat().st_mtime)
+        for path in entries[: len(entries) - self.max_entries]:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 1) if total else 0.0,
+        }
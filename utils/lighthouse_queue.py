@@ -0,0 +1,128 @@
+"""
+Фоновая очередь аудитов Lighthouse.
+
+Пользовательский сценарий ставит аудит в очередь (url, device, throttling)
+и сразу продолжает работу в Playwright. Пул воркеров выполняет аудиты
+параллельно, а результаты сливаются в шаги отчёта перед его финализацией.
+Повторные аудиты с теми же URL и эмуляцией обслуживаются из LighthouseCache.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import config
+from utils.lighthouse_cache import LighthouseCache, make_cache_key
+from utils.lighthouse_runner import (
+    effective_emulation,
+    run_lighthouse_for_url,
+    shutdown_lighthouse_workers,
+    extract_metrics_from_lighthouse,
+    summarize_lighthouse_metrics,
+)
+
+
+def _is_problematic_report(lh_report: dict) -> bool:
+    """Полный отчёт Lighthouse сохраняем только для проблемных страниц."""
+    return summarize_lighthouse_metrics(extract_metrics_from_lighthouse(lh_report))["is_problematic_page"]
+
+
+class LighthouseAuditQueue:
+    """
+    Очередь аудитов Lighthouse с пулом воркеров.
+
+    Результат каждого аудита — словарь метрик шага (метрики Lighthouse,
+    pagePerformanceIndex и is_problematic_page).
+    """
+
+    def __init__(self, max_workers: int = config.LIGHTHOUSE_WORKERS, cache: Optional[LighthouseCache] = None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lighthouse")
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.cache = cache
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, url: str, device: str, throttling: str) -> Future:
+        """
+        Ставит аудит в очередь и возвращает Future с метриками шага.
+
+        Если результат есть в кэше, Future возвращается уже завершённым;
+        если такой же аудит уже выполняется, возвращается его Future.
+        """
+        emulation = effective_emulation(device, throttling)
+        key = make_cache_key(url, emulation)
+
+        # Проверка «уже в работе», кэш и постановка — под одной блокировкой:
+        # иначе два одновременных вызова оба не находят аудит и запускают его дважды
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                if self.cache:
+                    self.cache.record_hit()
+                print(f"[INFO] Lighthouse: аудит {url} уже выполняется, ждём его результат")
+                return in_flight
+
+            if self.cache:
+                cached = self.cache.get(url, emulation)
+                if cached is not None:
+                    print(f"[INFO] Lighthouse: {url} ({device}, {throttling}) взят из кэша")
+                    future = Future()
+                    future.set_result(summarize_lighthouse_metrics(cached))
+                    return future
+
+            self.submitted += 1
+            future = self._executor.submit(self._run_audit, url, device, throttling, emulation, key)
+            self._in_flight[key] = future
+        print(f"[INFO] Lighthouse: аудит {url} ({device}, {throttling}) поставлен в очередь")
+        return future
+
+    def _run_audit(self, url: str, device: str, throttling: str, emulation: dict, key: str) -> dict:
+        try:
+            lh_report = run_lighthouse_for_url(
+                url, persist_if=_is_problematic_report, device=device, throttling=throttling
+            )
+            lh_metrics = extract_metrics_from_lighthouse(lh_report)
+            if lh_report.get("artifact"):
+                lh_metrics["lighthouseReport"] = lh_report["artifact"]
+        except Exception:
+            with self._lock:
+                self.failed += 1
+                self._in_flight.pop(key, None)
+            raise
+        if self.cache:
+            self.cache.put(url, emulation, lh_metrics)
+        with self._lock:
+            self.completed += 1
+            self._in_flight.pop(key, None)
+        return summarize_lighthouse_metrics(lh_metrics)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Останавливает пул потоков и воркеры Lighthouse."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        shutdown_lighthouse_workers()
+
+
+def merge_audit_results(pending: list, report: dict, timeout_sec: Optional[float] = None) -> None:
+    """
+    Дожидается аудитов из pending и сливает результаты в report["steps"].
+
+    Аргументы:
+        pending: список кортежей (step_name, url, future)
+        report: отчёт пользовательского сценария
+        timeout_sec: сколько ждать каждый аудит (по умолчанию LIGHTHOUSE_RESULT_TIMEOUT_SEC)
+    """
+    if timeout_sec is None:
+        timeout_sec = config.LIGHTHOUSE_RESULT_TIMEOUT_SEC
+
+    for step_name, url, future in pending:
+        step = report["steps"].setdefault(step_name, {})
+        try:
+            lh_data = future.result(timeout=timeout_sec)
+        except Exception as e:
+            print(f"[WARN] Lighthouse для {url} не выполнен: {e}")
+            step["lighthouseError"] = str(e)
+            continue
+        step.update(lh_data)
+        if lh_data["is_problematic_page"]:
+            report["is_problematic_flow"] = True
@@ -1,68 +1,344 @@
+"""
+Интеграция с Lighthouse через долгоживущие воркеры.
+
+Каждый воркер — это собственный headless Chromium и Node-процесс
+utils/lighthouse_worker.mjs, который вызывает программный API Lighthouse.
+Запросы передаются построчно в JSON через stdin/stdout, в ответ приходят
+только аудиты из LIGHTHOUSE_AUDITS. Воркеры переиспользуются между аудитами,
+поэтому запуск Node.js и загрузка модулей Lighthouse происходят один раз.
+
+Аудит запрашивается без скриншотов, а полный отчёт сохраняется только
+для проблемных страниц: gzip-файл с именем по sha256 содержимого
+в config.LIGHTHOUSE_ARTIFACTS_DIR.
+"""
+import atexit
+import gzip
 import subprocess
+import socket
+import shutil
+import threading
 import time
 import json
+import queue
+import os
 import tempfile
 from pathlib import Path
+from typing import Callable, Optional
 import config
 
-def run_lighthouse_for_url(url: str, timeout_sec: int = 60) -> dict:
-    """Запускает Lighthouse CLI и возвращает JSON-отчёт."""
-    chromium_path = config.CHROMIUM_PATH
-    
-    with tempfile.TemporaryDirectory() as tmp:
-        output = Path(tmp) / "lh_report.json"
-        
-        chrome_proc = subprocess.Popen([
+WORKER_SCRIPT = Path(__file__).with_name("lighthouse_worker.mjs")
+"""Скрипт Node-воркера Lighthouse"""
+
+LIGHTHOUSE_AUDITS = {
+    "lcp": "largest-contentful-paint",
+    "cls": "cumulative-layout-shift",
+    "tbt": "total-blocking-time",
+    "ttfb": "server-response-time",
+    "inp": "interaction-to-next-paint",  # вместо FID
+    "fcp": "first-contentful-paint",
+}
+"""Соответствие метрик отчёта аудитам Lighthouse"""
+
+SKIPPED_AUDITS = ["screenshot-thumbnails", "final-screenshot", "full-page-screenshot"]
+"""Тяжёлые аудиты со скриншотами, которые не нужны для метрик"""
+
+
+def _find_free_port() -> int:
+    """Возвращает свободный локальный порт (нужен для параллельных аудитов)."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def effective_emulation(device: str = None, throttling: str = None) -> dict:
+    """
+    Возвращает настройки эмуляции Lighthouse для ячейки матрицы (device, throttling).
+
+    Устройство задаёт form factor, эмуляцию экрана и замедление CPU,
+    режим сети — метод троттлинга (provided — без ограничений, simulate —
+    симуляция медленной сети). Эти же настройки являются частью ключа кэша.
+    По умолчанию используется мобильный профиль без ограничения сети.
+    """
+    device_profile = dict(config.LIGHTHOUSE_DEVICE_PROFILES.get(device or "Mobile", config.LIGHTHOUSE_DEVICE_PROFILES["Mobile"]))
+    network_profile = dict(config.LIGHTHOUSE_THROTTLING_PROFILES.get(
+        throttling or "No_throttling", config.LIGHTHOUSE_THROTTLING_PROFILES["No_throttling"]
+    ))
+    cpu_slowdown = device_profile.pop("cpuSlowdownMultiplier", 1)
+    throttling_method = network_profile.pop("throttlingMethod")
+
+    emulation = {**device_profile, "throttlingMethod": throttling_method}
+    if throttling_method != "provided":
+        emulation["throttling"] = {
+            "rttMs": network_profile.get("rttMs", 0),
+            "throughputKbps": network_profile.get("throughputKbps", 0),
+            "cpuSlowdownMultiplier": cpu_slowdown,
+        }
+    return emulation
+
+
+def _lighthouse_flags(emulation: dict) -> dict:
+    """Флаги Lighthouse для заданных настроек эмуляции."""
+    return {
+        "onlyCategories": ["performance"],
+        "skipAudits": SKIPPED_AUDITS,
+        "disableFullPageScreenshot": True,
+        **emulation,
+    }
+
+
+def _node_global_root() -> Optional[str]:
+    """Каталог глобальных npm-модулей (там лежит lighthouse, установленный через npm -g)."""
+    if os.environ.get("LIGHTHOUSE_NODE_ROOT"):
+        return os.environ["LIGHTHOUSE_NODE_ROOT"]
+    npm = shutil.which("npm")
+    if not npm:
+        return None
+    try:
+        return subprocess.run([npm, "root", "-g"], capture_output=True, text=True, timeout=30).stdout.strip() or None
+    except Exception:
+        return None
+
+
+class LighthouseWorker:
+    """
+    Долгоживущий воркер Lighthouse: собственный Chromium + Node-процесс.
+
+    Воркер обрабатывает один аудит за раз, поэтому для параллельных
+    аудитов используется пул воркеров (см. run_lighthouse_for_url).
+    """
+
+    def __init__(self, node_root: Optional[str] = None, start_timeout_sec: int = 30):
+        self.port = _find_free_port()
+        self._profile_dir = tempfile.mkdtemp(prefix="lh_profile_")
+        self._next_id = 0
+        self.last_audit_id = None
+        self._lines = queue.Queue()
+        self.node_proc = None
+
+        self.chrome_proc = subprocess.Popen([
             config.CHROMIUM_PATH,
             "--headless=new",
             "--no-sandbox",
             "--disable-gpu",
-            "--remote-debugging-port=9222",
+            f"--remote-debugging-port={self.port}",
+            f"--user-data-dir={self._profile_dir}",
             "--disable-dev-shm-usage",
             "--no-first-run",
             "--no-default-browser-check",
             "about:blank"
         ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        time.sleep(2)
-
-        cmd = [
-            "lighthouse",
-            url,
-            "--port=9222",
-            "--skip-autolaunch",
-            "--output=json",
-            f"--output-path={output}",
-            "--quiet",
-            f"--chrome-path={chromium_path}",
-            "--only-categories=performance",
-            "--throttling-method=provided"  # используем сеть из Playwright (если настроена)
-        ]
 
+        env = dict(os.environ)
+        if node_root:
+            env["LIGHTHOUSE_NODE_ROOT"] = node_root
+        try:
+            self.node_proc = subprocess.Popen(
+                ["node", str(WORKER_SCRIPT)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding="utf-8",
+                env=env,
+            )
+        except OSError as e:
+            self.close()
+            raise RuntimeError(f"Lighthouse worker failed to start: {e}")
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+
+        try:
+            ready = self._lines.get(timeout=start_timeout_sec)
+        except queue.Empty:
+            ready = None
+        if not ready or not json.loads(ready).get("ready") or not self._wait_for_chrome(start_timeout_sec):
+            self.close()
+            raise RuntimeError("Lighthouse worker failed to start (is lighthouse installed?)")
+
+    def _wait_for_chrome(self, timeout_sec: int) -> bool:
+        """Ждёт, пока Chromium откроет порт удалённой отладки."""
+        deadline = time.time() + timeout_sec
+        while time.time() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                    return True
+            except OSError:
+                time.sleep(0.2)
+        return False
+
+    def _read_stdout(self):
+        for line in self.node_proc.stdout:
+            self._lines.put(line)
+        self._lines.put(None)  # процесс завершился
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.node_proc is not None
+            and self.node_proc.poll() is None
+            and self.chrome_proc.poll() is None
+        )
+
+    def _request(self, payload: dict, timeout_sec: int) -> dict:
+        """Отправляет запрос воркеру и ждёт ответ с тем же id."""
+        self.node_proc.stdin.write(json.dumps(payload) + "\n")
+        self.node_proc.stdin.flush()
+
+        deadline = time.time() + timeout_sec
+        while True:
+            try:
+                line = self._lines.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                self.close()  # воркер завис на аудите — пересоздадим при следующем запросе
+                raise RuntimeError(f"Lighthouse timed out after {timeout_sec}s")
+            if line is None:
+                raise RuntimeError("Lighthouse worker exited unexpectedly")
+            response = json.loads(line)
+            if response.get("id") != payload["id"]:
+                continue  # запоздавший ответ на прерванный запрос
+            if "error" in response:
+                raise RuntimeError(f"Lighthouse failed: {response['error']}")
+            return response
+
+    def audit(self, url: str, flags: dict, timeout_sec: int) -> dict:
+        """Выполняет аудит и возвращает урезанный отчёт (только LIGHTHOUSE_AUDITS)."""
+        self._next_id += 1
+        self.last_audit_id = self._next_id
+        response = self._request({
+            "id": self._next_id,
+            "url": url,
+            "port": self.port,
+            "flags": flags,
+            "audits": list(LIGHTHOUSE_AUDITS.values()),
+        }, timeout_sec)
+        return response["lhr"]
+
+    def persist_last_report(self, artifacts_dir: str, timeout_sec: int = 30) -> str:
+        """Сохраняет полный отчёт последнего аудита (gzip, имя по sha256) и возвращает путь."""
+        response = self._request({
+            "cmd": "persist",
+            "id": self.last_audit_id,
+            "dir": str(artifacts_dir),
+        }, timeout_sec)
+        return response["path"]
+
+    def close(self):
+        for proc in (self.node_proc, self.chrome_proc):
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        shutil.rmtree(self._profile_dir, ignore_errors=True)
+
+
+_idle_workers = queue.LifoQueue()
+_all_workers = []
+_workers_lock = threading.Lock()
+_node_root = None
+
+
+def _acquire_worker() -> LighthouseWorker:
+    global _node_root
+    while True:
         try:
-            subprocess.run(cmd, check=True, timeout=timeout_sec, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-            with open(output, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except subprocess.TimeoutExpired:
-            raise RuntimeError(f"Lighthouse timed out after {timeout_sec}s")
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Lighthouse failed: {e.stderr.decode() if e.stderr else 'unknown error'}")
-        except Exception as e:
-            raise RuntimeError(f"Unexpected error: {e}")
-        finally:
-            chrome_proc.terminate()
-            chrome_proc.wait(timeout=5)
+            worker = _idle_workers.get_nowait()
+        except queue.Empty:
+            break
+        if worker.alive:
+            return worker
+        worker.close()
+
+    with _workers_lock:
+        if _node_root is None:
+            _node_root = _node_global_root() or ""
+        worker = LighthouseWorker(node_root=_node_root or None)
+        _all_workers.append(worker)
+    return worker
+
+
+def _release_worker(worker: LighthouseWorker):
+    if worker.alive:
+        _idle_workers.put(worker)
+    else:
+        worker.close()
+        with _workers_lock:
+            if worker in _all_workers:
+                _all_workers.remove(worker)
+
+
+def shutdown_lighthouse_workers():
+    """Останавливает все воркеры Lighthouse (вызывается в конце сессии и при выходе)."""
+    with _workers_lock:
+        workers = list(_all_workers)
+        _all_workers.clear()
+    while not _idle_workers.empty():
+        _idle_workers.get_nowait()
+    for worker in workers:
+        worker.close()
+
+
+atexit.register(shutdown_lighthouse_workers)
+
+
+def run_lighthouse_for_url(
+    url: str,
+    timeout_sec: int = config.LIGHTHOUSE_TIMEOUT_SEC,
+    persist_if: Optional[Callable[[dict], bool]] = None,
+    device: Optional[str] = None,
+    throttling: Optional[str] = None,
+) -> dict:
+    """
+    Выполняет аудит Lighthouse через свободный воркер пула и возвращает урезанный JSON-отчёт
+    (аудиты LIGHTHOUSE_AUDITS и оценка категории performance).
+
+    device и throttling выбирают эмуляцию устройства и сети (см. effective_emulation).
+    Если persist_if(отчёт) истинно, полный отчёт сохраняется в
+    config.LIGHTHOUSE_ARTIFACTS_DIR, а путь к нему кладётся в ключ "artifact".
+    """
+    worker = _acquire_worker()
+    try:
+        lh_report = worker.audit(url, _lighthouse_flags(effective_emulation(device, throttling)), timeout_sec)
+        if persist_if is not None and persist_if(lh_report):
+            try:
+                lh_report["artifact"] = worker.persist_last_report(config.LIGHTHOUSE_ARTIFACTS_DIR)
+            except RuntimeError as e:
+                print(f"[WARN] Не удалось сохранить полный отчёт Lighthouse для {url}: {e}")
+        return lh_report
+    except RuntimeError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Unexpected error: {e}")
+    finally:
+        _release_worker(worker)
 
 
 def extract_metrics_from_lighthouse(report: dict) -> dict:
     """Извлекает числовые метрики из Lighthouse-отчёта."""
     a = report.get("audits", {})
     return {
-        "lcp": a.get("largest-contentful-paint", {}).get("numericValue"),
-        "cls": a.get("cumulative-layout-shift", {}).get("numericValue"),
-        "tbt": a.get("total-blocking-time", {}).get("numericValue"),
-        "ttfb": a.get("server-response-time", {}).get("numericValue"),
-        "inp": a.get("interaction-to-next-paint", {}).get("numericValue"),  # вместо FID
-        "fcp": a.get("first-contentful-paint", {}).get("numericValue"),
+        **{metric: a.get(audit_id, {}).get("numericValue") for metric, audit_id in LIGHTHOUSE_AUDITS.items()},
         "performance_score": report.get("categories", {}).get("performance", {}).get("score")
-    }
\ No newline at end of file
+    }
+
+
+def load_lighthouse_artifact(path: str) -> dict:
+    """Читает сохранённый полный отчёт Lighthouse (.json.gz)."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def summarize_lighthouse_metrics(lh_metrics: dict) -> dict:
+    """Дополняет метрики Lighthouse значением pagePerformanceIndex и признаком проблемной страницы."""
+    ppi = config.calculate_page_performance_index(
+        lcp=lh_metrics.get("lcp"),
+        cls=lh_metrics.get("cls"),
+        tbt=lh_metrics.get("tbt"),
+        ttfb=lh_metrics.get("ttfb"),
+        fid=lh_metrics.get("inp")  # используем INP как замену FID
+    )
+    return {
+        **lh_metrics,
+        "pagePerformanceIndex": ppi,
+        "is_problematic_page": ppi < config.TARGET_PAGE_PERFORMANCE_INDEX
+    }
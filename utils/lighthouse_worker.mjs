@@ -0,0 +1,114 @@
+// Долгоживущий воркер Lighthouse.
+//
+// Читает запросы аудита из stdin (по одному JSON в строке) и пишет ответы в stdout:
+//   запрос: {"id": 1, "url": "...", "port": 9222, "flags": {...}, "audits": ["largest-contentful-paint", ...]}
+//   ответ:  {"id": 1, "lhr": {"audits": {...}, "categories": {"performance": {"score": 0.9}}}}
+//           {"id": 1, "error": "..."}
+// В ответ попадают только запрошенные аудиты, полный отчёт в Python не передаётся.
+// Полный отчёт последнего аудита хранится в памяти воркера и по команде
+//   {"cmd": "persist", "id": 1, "dir": "reports/lighthouse"}
+// сохраняется как <dir>/<sha256[:2]>/<sha256>.json.gz, ответ: {"id": 1, "path": "...", "sha256": "..."}.
+// stdout зарезервирован под протокол, логи Lighthouse идут в stderr.
+
+import { createHash } from 'node:crypto';
+import { createWriteStream } from 'node:fs';
+import { mkdir, rename, stat, unlink } from 'node:fs/promises';
+import { createInterface } from 'node:readline';
+import { join } from 'node:path';
+import { Readable } from 'node:stream';
+import { pipeline } from 'node:stream/promises';
+import { pathToFileURL } from 'node:url';
+import { createGzip } from 'node:zlib';
+
+async function loadLighthouse() {
+  try {
+    return (await import('lighthouse')).default;
+  } catch (e) {
+    // Lighthouse установлен глобально (npm install -g lighthouse)
+    const root = process.env.LIGHTHOUSE_NODE_ROOT;
+    if (!root) throw e;
+    const entry = pathToFileURL(join(root, 'lighthouse', 'core', 'index.js')).href;
+    return (await import(entry)).default;
+  }
+}
+
+function trimReport(lhr, auditIds) {
+  const audits = {};
+  for (const id of auditIds) {
+    const audit = lhr.audits[id];
+    if (audit) audits[id] = { numericValue: audit.numericValue };
+  }
+  const performance = lhr.categories.performance;
+  return {
+    audits,
+    categories: { performance: { score: performance ? performance.score : null } },
+  };
+}
+
+async function persistReport(lhr, dir) {
+  const json = JSON.stringify(lhr);
+  const sha256 = createHash('sha256').update(json).digest('hex');
+  const targetDir = join(dir, sha256.slice(0, 2));
+  const target = join(targetDir, `${sha256}.json.gz`);
+  try {
+    await stat(target);
+    return { path: target, sha256 };  // такой отчёт уже сохранён
+  } catch (e) {
+    // файла нет — записываем
+  }
+  await mkdir(targetDir, { recursive: true });
+  const tmp = `${target}.${process.pid}.tmp`;
+  try {
+    await pipeline(Readable.from([json]), createGzip(), createWriteStream(tmp));
+    await rename(tmp, target);
+  } catch (e) {
+    await unlink(tmp).catch(() => {});
+    throw e;
+  }
+  return { path: target, sha256 };
+}
+
+function reply(message) {
+  process.stdout.write(JSON.stringify(message) + '\n');
+}
+
+const lighthouse = await loadLighthouse();
+reply({ ready: true });
+
+// Аудиты выполняются строго по одному: глобальное состояние Lighthouse
+// не рассчитано на параллельные прогоны в одном процессе.
+let chain = Promise.resolve();
+let last = { id: null, lhr: null };
+const rl = createInterface({ input: process.stdin });
+
+rl.on('line', (line) => {
+  if (!line.trim()) return;
+  chain = chain.then(async () => {
+    let request;
+    try {
+      request = JSON.parse(line);
+    } catch (e) {
+      reply({ id: null, error: `bad request: ${e.message}` });
+      return;
+    }
+    try {
+      if (request.cmd === 'persist') {
+        if (last.id !== request.id || !last.lhr) throw new Error(`no report for audit ${request.id}`);
+        reply({ id: request.id, ...(await persistReport(last.lhr, request.dir)) });
+        last = { id: null, lhr: null };
+        return;
+      }
+      last = { id: null, lhr: null };  // отпускаем предыдущий отчёт до нового аудита
+      const flags = { ...request.flags, port: request.port, output: 'json', logLevel: 'error' };
+      const result = await lighthouse(request.url, flags);
+      if (!result || !result.lhr) throw new Error('Lighthouse returned no result');
+      if (result.lhr.runtimeError) throw new Error(result.lhr.runtimeError.message);
+      last = { id: request.id, lhr: result.lhr };
+      reply({ id: request.id, lhr: trimReport(result.lhr, request.audits || []) });
+    } catch (e) {
+      reply({ id: request.id, error: String(e && e.stack ? e.stack : e) });
+    }
+  });
+});
+
+rl.on('close', () => chain.then(() => process.exit(0)));
@@ -0,0 +1,181 @@
+"""
+Планировщик тестовой матрицы на покрывающих массивах.
+
+Полное декартово произведение параметров (устройство × сеть × ГЕО × браузер ×
+способ оплаты × фильм) быстро становится неподъёмным. Покрывающий массив
+силы t содержит каждую комбинацию значений любых t измерений хотя бы
+в одной строке: при t=2 (pairwise) проверяются все парные взаимодействия
+за малую долю прогонов.
+
+Строки строятся жадно (в духе AETG): строка начинается с ещё не покрытого
+t-набора и достраивается значениями, покрывающими больше всего непокрытых
+t-наборов. Обязательные комбинации (must_cover) попадают в план первыми.
+"""
+import itertools
+import math
+import random
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+class MatrixPlan:
+    """Результат планирования: строки плана и коэффициент сокращения."""
+
+    def __init__(self, dimensions: Dict[str, Sequence], rows: List[dict], strength: int):
+        self.dimensions = dimensions
+        self.rows = rows
+        self.strength = strength
+
+    @property
+    def full_size(self) -> int:
+        return math.prod(len(values) for values in self.dimensions.values())
+
+    @property
+    def reduction_factor(self) -> float:
+        return self.full_size / len(self.rows) if self.rows else 1.0
+
+    def describe(self) -> str:
+        kind = "полная матрица" if self.strength <= 0 else f"{self.strength}-wise"
+        return f"{kind}: {self.full_size} → {len(self.rows)} комбинаций (×{self.reduction_factor:.1f})"
+
+
+class _CoverageState:
+    """
+    Непокрытые t-наборы с индексом «все значения, кроме одного»:
+    by_missing[(combo, pos)][остальные значения] = значения измерения combo[pos],
+    которые ещё не покрыты вместе с ними. Это позволяет выбирать значение
+    измерения, не перебирая все его значения (важно для тысяч фильмов).
+    """
+
+    def __init__(self, sizes: List[int], strength: int):
+        # Измерения с одним значением покрыты в любой строке — в t-наборах их не учитываем
+        active = [d for d, size in enumerate(sizes) if size > 1]
+        self.combos = list(itertools.combinations(active, min(strength, len(active))))
+        self.combos_by_dim = {d: [c for c in self.combos if d in c] for d in range(len(sizes))}
+        self.uncovered = {}
+        self.by_missing = {}
+        self.remaining = [Counter() for _ in sizes]
+        self.total = 0
+        for combo in self.combos:
+            tuples = set(itertools.product(*(range(sizes[d]) for d in combo)))
+            self.uncovered[combo] = tuples
+            self.total += len(tuples)
+            for pos in range(len(combo)):
+                index = self.by_missing.setdefault((combo, pos), {})
+                for values in tuples:
+                    index.setdefault(values[:pos] + values[pos + 1:], set()).add(values[pos])
+            for values in tuples:
+                for d, v in zip(combo, values):
+                    self.remaining[d][v] += 1
+
+    def first_uncovered(self) -> Optional[tuple]:
+        for combo in self.combos:
+            if self.uncovered[combo]:
+                return combo, next(iter(self.uncovered[combo]))
+        return None
+
+    def gains(self, d: int, assigned: dict) -> Counter:
+        """Сколько непокрытых t-наборов закроет каждое значение измерения d при уже выбранных значениях."""
+        gains = Counter()
+        for combo in self.combos_by_dim[d]:
+            if any(c != d and c not in assigned for c in combo):
+                continue
+            pos = combo.index(d)
+            other = tuple(assigned[c] for c in combo if c != d)
+            for v in self.by_missing[(combo, pos)].get(other, ()):
+                gains[v] += 1
+        return gains
+
+    def row_gain(self, row: dict) -> int:
+        return sum(tuple(row[d] for d in combo) in self.uncovered[combo] for combo in self.combos)
+
+    def cover(self, row: dict) -> None:
+        for combo in self.combos:
+            values = tuple(row[d] for d in combo)
+            if values not in self.uncovered[combo]:
+                continue
+            self.uncovered[combo].discard(values)
+            self.total -= 1
+            for pos, d in enumerate(combo):
+                index = self.by_missing[(combo, pos)]
+                other = values[:pos] + values[pos + 1:]
+                index[other].discard(values[pos])
+                if not index[other]:
+                    del index[other]
+                self.remaining[d][values[pos]] -= 1
+
+
+def _complete_row(state: _CoverageState, sizes: List[int], fixed: dict, rng: random.Random) -> dict:
+    row = dict(fixed)
+    order = [d for d in range(len(sizes)) if d not in row]
+    rng.shuffle(order)
+    for d in order:
+        gains = state.gains(d, row)
+        if gains:
+            best = max(gains.values())
+            options = [v for v, g in gains.items() if g == best]
+        else:
+            # Ничего не закрываем сразу — берём значение с наибольшим числом непокрытых наборов
+            remaining = state.remaining[d]
+            best = max((remaining[v] for v in range(sizes[d])), default=0)
+            options = [v for v in range(sizes[d]) if remaining[v] == best]
+        row[d] = rng.choice(sorted(options))
+    return row
+
+
+def covering_array(
+    dimensions: Dict[str, Sequence],
+    strength: int = 2,
+    must_cover: Iterable[dict] = (),
+    seed: int = 0,
+    candidates: int = 3,
+) -> MatrixPlan:
+    """
+    Строит покрывающий массив силы strength над dimensions ({измерение: значения}).
+
+    must_cover — частичные комбинации {измерение: значение}, которые обязательно
+    войдут в план (недостающие измерения достраиваются жадно); комбинации
+    с неизвестными измерениями или значениями пропускаются.
+    strength <= 0 или не меньше числа измерений — полное декартово произведение.
+    """
+    names = list(dimensions)
+    values = [list(dimensions[name]) for name in names]
+    sizes = [len(v) for v in values]
+    if strength <= 0 or strength >= len(names) or 0 in sizes:
+        rows = [dict(zip(names, combo)) for combo in itertools.product(*values)]
+        return MatrixPlan(dimensions, rows, 0 if strength >= len(names) else strength)
+
+    rng = random.Random(seed)
+    state = _CoverageState(sizes, strength)
+    plan_rows = []
+
+    for combination in must_cover:
+        fixed = {}
+        for name, value in combination.items():
+            if name not in dimensions:
+                continue
+            d = names.index(name)
+            if value not in values[d]:
+                fixed = None
+                break
+            fixed[d] = values[d].index(value)
+        if not fixed:
+            continue
+        row = _complete_row(state, sizes, fixed, rng)
+        state.cover(row)
+        plan_rows.append(row)
+
+    while state.total:
+        combo, seed_values = state.first_uncovered()
+        fixed = dict(zip(combo, seed_values))
+        best_row, best_gain = None, -1
+        for _ in range(candidates):
+            row = _complete_row(state, sizes, fixed, rng)
+            gain = state.row_gain(row)
+            if gain > best_gain:
+                best_row, best_gain = row, gain
+        state.cover(best_row)
+        plan_rows.append(best_row)
+
+    rows = [{names[d]: values[d][v] for d, v in sorted(row.items())} for row in plan_rows]
+    return MatrixPlan(dimensions, rows, strength)
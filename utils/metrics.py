@@ -218,6 +218,11 @@ import time
 #     raise TimeoutError(f"Player ready not detected within {timeout} seconds")
 
 def collect_network_metrics(page, target_domain = "calls7.com"):
+    """
+    Фиксирует DNS, connect и TTFB первого ответа, URL которого содержит target_domain.
+    Возвращаемый словарь заполняется асинхронно, после совпадения слушатель снимается.
+    Для полного водопада по шагам используйте utils.network_capture.NetworkCapture.
+    """
     client = page.context.new_cdp_session(page)
     client.send("Network.enable")
 
@@ -229,7 +234,6 @@ def collect_network_metrics(page, target_domain = "calls7.com"):
     }
 
     def on_response_received(event):
-        request_id = event["requestId"]
         resp = event.get("response", {})
         url_requested = resp.get("url", "")
         if target_domain in url_requested and not result["found"]:
@@ -237,14 +241,20 @@ def collect_network_metrics(page, target_domain = "calls7.com"):
             if timing:
                 dns = max(0, timing.get("dnsEnd", 0) - timing.get("dnsStart", 0))
                 connect = max(0, timing.get("connectEnd", 0) - timing.get("connectStart", 0))
-                ttfb = max(0, timing.get("sendEnd", 0) - (timing.get("requestTime", 0) * 1000))
+                # TTFB — от отправки запроса до получения заголовков ответа
+                ttfb = max(0, timing.get("receiveHeadersEnd", 0) - timing.get("sendEnd", 0))
                 result.update({
                     "dnsResolveTime": dns,
                     "connectTime": connect,
                     "ttfb": ttfb,
                     "found": True
                 })
-            client.send("Network.disable")  # останавливаем после первого совпадения
+            # останавливаемся после первого совпадения
+            client.remove_listener("Network.responseReceived", on_response_received)
+            try:
+                client.detach()
+            except Exception:
+                pass
 
     client.on("Network.responseReceived", on_response_received)
 
@@ -385,6 +395,11 @@ def wait_for_load_player_finished(page):
     raise TimeoutError("[Dc] loadPlayer finished не обнаружено за 30 сек")
 
 def inject_hls_buffering_listener(page):
+    """
+    Устаревший счётчик буферизации для старых тестов.
+    Патчит Hls.prototype.attachMedia после загрузки страницы и не видит уже подключённый плеер —
+    в BaseUserFlowTest используется движок QoE из utils/video_qoe.py.
+    """
     page.evaluate("""
         window.__rebufferCount = 0;
         window.__rebufferStart = null;
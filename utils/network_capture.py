@@ -0,0 +1,251 @@
+"""
+Захват сетевого водопада по шагам пользовательского сценария (только Chromium, через CDP).
+
+Для каждого запроса фиксируются URL, тип ресурса, фазы DNS/connect/TLS/TTFB/загрузки,
+размер, протокол, статус кэша и инициатор. Завершённые запросы хранятся в компактной
+колоночной таблице RequestTable (array.array + таблица строк), по которой строятся
+итоги по шагам и время критического пути.
+"""
+import gzip
+import json
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+
+CACHE_STATUSES = ["network", "memory", "disk", "prefetch", "service_worker"]
+"""Статусы кэша в порядке их кодов в колонке cache"""
+
+RENDER_BLOCKING_TYPES = {"Document", "Stylesheet", "Script", "Font"}
+"""Типы ресурсов, учитываемые в критическом пути"""
+
+
+class RequestTable:
+    """
+    Колоночная таблица запросов.
+
+    Строковые значения (URL, тип, протокол, инициатор, шаг) хранятся один раз
+    в таблице строк, в колонках — их индексы. Времена — в миллисекундах,
+    start/end отсчитываются от первого запроса захвата.
+    """
+
+    INT_COLUMNS = ("step", "url", "type", "protocol", "initiator", "status", "cache", "failed")
+    FLOAT_COLUMNS = ("start", "end", "dns", "connect", "tls", "ttfb", "download")
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._string_index: Dict[str, int] = {}
+        self.int_columns = {name: array("i") for name in self.INT_COLUMNS}
+        self.float_columns = {name: array("d") for name in self.FLOAT_COLUMNS}
+        self.bytes = array("q")
+
+    def __len__(self) -> int:
+        return len(self.bytes)
+
+    def intern(self, value: Optional[str]) -> int:
+        value = value or ""
+        index = self._string_index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(value)
+            self._string_index[value] = index
+        return index
+
+    def append(self, row: dict) -> None:
+        for name in ("step", "url", "type", "protocol", "initiator"):
+            self.int_columns[name].append(self.intern(row.get(name)))
+        self.int_columns["status"].append(int(row.get("status") or 0))
+        self.int_columns["cache"].append(CACHE_STATUSES.index(row.get("cache", "network")))
+        self.int_columns["failed"].append(1 if row.get("failed") else 0)
+        for name in self.FLOAT_COLUMNS:
+            self.float_columns[name].append(float(row.get(name) or 0.0))
+        self.bytes.append(int(row.get("bytes") or 0))
+
+    def row(self, i: int) -> dict:
+        row = {name: self.strings[self.int_columns[name][i]] for name in ("step", "url", "type", "protocol", "initiator")}
+        row["status"] = self.int_columns["status"][i]
+        row["cache"] = CACHE_STATUSES[self.int_columns["cache"][i]]
+        row["failed"] = bool(self.int_columns["failed"][i])
+        row.update({name: self.float_columns[name][i] for name in self.FLOAT_COLUMNS})
+        row["bytes"] = self.bytes[i]
+        return row
+
+    def rows(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def to_dict(self) -> dict:
+        """Колоночное представление для сохранения в JSON."""
+        return {
+            "strings": self.strings,
+            **{name: col.tolist() for name, col in self.int_columns.items()},
+            **{name: [round(v, 1) for v in col] for name, col in self.float_columns.items()},
+            "bytes": self.bytes.tolist(),
+        }
+
+    def save(self, path: str) -> str:
+        """Сохраняет таблицу в gzip-JSON и возвращает путь."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        return str(path)
+
+
+def _phase(timing: dict, start_key: str, end_key: str) -> float:
+    start, end = timing.get(start_key, -1), timing.get(end_key, -1)
+    if start is None or end is None or start < 0 or end < 0:
+        return 0.0
+    return max(0.0, end - start)
+
+
+class NetworkCapture:
+    """
+    Захват всех запросов страницы через CDP с разбиением по шагам сценария.
+
+    Использование:
+        capture = NetworkCapture(page)
+        capture.set_step("main_page")
+        ...
+        summary = capture.summarize()
+        capture.stop()
+    """
+
+    def __init__(self, page):
+        self.table = RequestTable()
+        self.step = "unknown"
+        self._pending: Dict[str, dict] = {}
+        self._origin_ms: Optional[float] = None
+        self._client = page.context.new_cdp_session(page)
+        self._handlers = {
+            "Network.requestWillBeSent": self._on_request,
+            "Network.responseReceived": self._on_response,
+            "Network.requestServedFromCache": self._on_served_from_cache,
+            "Network.loadingFinished": self._on_finished,
+            "Network.loadingFailed": self._on_failed,
+        }
+        for event, handler in self._handlers.items():
+            self._client.on(event, handler)
+        self._client.send("Network.enable")
+
+    def set_step(self, step_name: str) -> None:
+        """Все следующие запросы будут отнесены к шагу step_name."""
+        self.step = step_name
+
+    def _relative(self, timestamp_sec: float) -> float:
+        ms = timestamp_sec * 1000
+        if self._origin_ms is None:
+            self._origin_ms = ms
+        return ms - self._origin_ms
+
+    def _on_request(self, event):
+        request_id = event["requestId"]
+        if request_id in self._pending and event.get("redirectResponse"):
+            # Редирект: закрываем предыдущий запрос и начинаем новый с тем же id
+            self._pending[request_id]["end"] = self._relative(event["timestamp"])
+            self.table.append(self._pending.pop(request_id))
+        self._pending[request_id] = {
+            "step": self.step,
+            "url": event.get("request", {}).get("url", ""),
+            "type": event.get("type", "Other"),
+            "initiator": event.get("initiator", {}).get("type", "other"),
+            "start": self._relative(event["timestamp"]),
+            "cache": "network",
+        }
+
+    def _on_served_from_cache(self, event):
+        row = self._pending.get(event["requestId"])
+        if row:
+            row["cache"] = "memory"
+
+    def _on_response(self, event):
+        row = self._pending.get(event["requestId"])
+        if row is None:
+            return
+        resp = event.get("response", {})
+        row["status"] = resp.get("status")
+        row["protocol"] = resp.get("protocol")
+        if resp.get("fromServiceWorker"):
+            row["cache"] = "service_worker"
+        elif resp.get("fromPrefetchCache"):
+            row["cache"] = "prefetch"
+        elif resp.get("fromDiskCache"):
+            row["cache"] = "disk"
+
+        timing = resp.get("timing")
+        if timing:
+            row["dns"] = _phase(timing, "dnsStart", "dnsEnd")
+            row["connect"] = _phase(timing, "connectStart", "connectEnd")
+            row["tls"] = _phase(timing, "sslStart", "sslEnd")
+            # TTFB — от отправки запроса до получения заголовков ответа
+            row["ttfb"] = _phase(timing, "sendEnd", "receiveHeadersEnd")
+            row["headers_end"] = timing["requestTime"] * 1000 + timing.get("receiveHeadersEnd", 0)
+
+    def _finish(self, event, failed: bool):
+        row = self._pending.pop(event["requestId"], None)
+        if row is None:
+            return
+        end_ms = event["timestamp"] * 1000
+        row["end"] = self._relative(event["timestamp"])
+        headers_end = row.pop("headers_end", None)
+        if headers_end is not None:
+            row["download"] = max(0.0, end_ms - headers_end)
+        row["bytes"] = event.get("encodedDataLength", 0)
+        row["failed"] = failed
+        self.table.append(row)
+
+    def _on_finished(self, event):
+        self._finish(event, failed=False)
+
+    def _on_failed(self, event):
+        self._finish(event, failed=True)
+
+    def summarize(self) -> dict:
+        """Итоги по шагам: число запросов, байты, кэш, ошибки, разбивка по типам и критический путь."""
+        steps = {}
+        for row in self.table.rows():
+            s = steps.setdefault(row["step"], {
+                "requests": 0, "bytes": 0, "cached": 0, "failed": 0,
+                "by_type": {}, "protocols": {}, "document": None,
+                "_first_start": None, "_critical_end": None,
+            })
+            s["requests"] += 1
+            s["bytes"] += row["bytes"]
+            s["cached"] += row["cache"] != "network"
+            s["failed"] += row["failed"]
+            by_type = s["by_type"].setdefault(row["type"], {"requests": 0, "bytes": 0})
+            by_type["requests"] += 1
+            by_type["bytes"] += row["bytes"]
+            if row["protocol"]:
+                s["protocols"][row["protocol"]] = s["protocols"].get(row["protocol"], 0) + 1
+
+            if s["_first_start"] is None or row["start"] < s["_first_start"]:
+                s["_first_start"] = row["start"]
+            if row["type"] == "Document" and s["document"] is None:
+                s["document"] = {
+                    "url": row["url"],
+                    "dnsResolveTime": round(row["dns"], 1),
+                    "connectTime": round(row["connect"], 1),
+                    "tlsTime": round(row["tls"], 1),
+                    "ttfb": round(row["ttfb"], 1),
+                    "downloadTime": round(row["download"], 1),
+                }
+            blocking = row["type"] in RENDER_BLOCKING_TYPES and row["initiator"] in ("parser", "other")
+            if blocking and not row["failed"] and (s["_critical_end"] is None or row["end"] > s["_critical_end"]):
+                s["_critical_end"] = row["end"]
+
+        for s in steps.values():
+            first, critical_end = s.pop("_first_start"), s.pop("_critical_end")
+            s["criticalPathTime"] = round(critical_end - first, 1) if critical_end is not None else None
+        return steps
+
+    def stop(self) -> None:
+        """Отключает обработчики и закрывает CDP-сессию."""
+        for event, handler in self._handlers.items():
+            try:
+                self._client.remove_listener(event, handler)
+            except Exception:
+                pass
+        try:
+            self._client.send("Network.disable")
+            self._client.detach()
+        except Exception:
+            pass
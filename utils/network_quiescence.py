@@ -0,0 +1,115 @@
+"""
+Ожидание "сетевой тишины" без учёта медиапотока.
+
+page.wait_for_load_state("networkidle") на странице фильма почти никогда не
+срабатывает вовремя: HLS-плеер постоянно догружает сегменты и манифесты,
+а аналитика шлёт маячки. NetworkQuiescenceMonitor отслеживает запросы
+в полёте, исключая медиа, манифесты, сегменты, long-poll и аналитику
+(шаблоны в config), и ждёт, пока сеть не будет тихой заданное окно времени.
+
+Монитор работает через события Playwright (request/requestfinished/requestfailed),
+поэтому подходит для всех браузеров.
+"""
+import re
+import time
+import weakref
+from typing import List, Optional
+
+import config
+
+_monitors = weakref.WeakKeyDictionary()
+
+
+class NetworkQuiescenceMonitor:
+    """
+    Следит за запросами страницы и ждёт окно сетевой тишины.
+
+    Запрос не учитывается, если его тип ресурса входит в ignore_resource_types,
+    URL подходит под один из ignore_patterns или он висит дольше long_poll_ms
+    (считаем его long-poll соединением).
+    """
+
+    def __init__(
+        self,
+        page,
+        ignore_patterns: Optional[List[str]] = None,
+        ignore_resource_types: Optional[List[str]] = None,
+        long_poll_ms: int = config.NETWORK_QUIET_LONG_POLL_MS,
+    ):
+        self._page = page
+        self._patterns = [re.compile(p, re.IGNORECASE) for p in (
+            config.NETWORK_QUIET_IGNORE_PATTERNS if ignore_patterns is None else ignore_patterns
+        )]
+        self._resource_types = set(
+            config.NETWORK_QUIET_IGNORE_RESOURCE_TYPES if ignore_resource_types is None else ignore_resource_types
+        )
+        self._long_poll_sec = long_poll_ms / 1000
+        self._in_flight = {}
+        self._last_activity = time.monotonic()
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_done)
+        page.on("requestfailed", self._on_done)
+
+    def is_ignored(self, request) -> bool:
+        if request.resource_type in self._resource_types:
+            return True
+        url = request.url
+        return any(p.search(url) for p in self._patterns)
+
+    def _on_request(self, request):
+        if self.is_ignored(request):
+            return
+        now = time.monotonic()
+        self._in_flight[request] = now
+        self._last_activity = now
+
+    def _on_done(self, request):
+        if self._in_flight.pop(request, None) is not None:
+            self._last_activity = time.monotonic()
+
+    def pending(self) -> list:
+        """Запросы, которые сейчас мешают тишине (без long-poll)."""
+        now = time.monotonic()
+        return [r for r, started in self._in_flight.items() if now - started < self._long_poll_sec]
+
+    def wait(
+        self,
+        quiet_ms: int = config.NETWORK_QUIET_WINDOW_MS,
+        timeout_ms: int = config.NETWORK_QUIET_TIMEOUT_MS,
+    ) -> int:
+        """
+        Ждёт, пока quiet_ms подряд не будет учитываемых запросов в полёте.
+
+        Возвращает, сколько миллисекунд пришлось ждать. По истечении
+        timeout_ms не падает, а пишет предупреждение со списком запросов.
+        """
+        start = time.monotonic()
+        while True:
+            now = time.monotonic()
+            waited_ms = round((now - start) * 1000)
+            pending = self.pending()
+            if not pending and (now - self._last_activity) * 1000 >= quiet_ms:
+                return waited_ms
+            if waited_ms >= timeout_ms:
+                urls = ", ".join(r.url for r in pending[:5])
+                print(f"[WARN] Сеть не затихла за {timeout_ms} мс, в полёте {len(pending)}: {urls}")
+                return waited_ms
+            self._page.wait_for_timeout(config.NETWORK_QUIET_POLL_MS)
+
+
+def attach_network_quiescence(page) -> NetworkQuiescenceMonitor:
+    """Подключает монитор к странице (лучше сразу после создания, чтобы видеть все запросы)."""
+    monitor = _monitors.get(page)
+    if monitor is None:
+        monitor = NetworkQuiescenceMonitor(page)
+        _monitors[page] = monitor
+    return monitor
+
+
+def wait_for_network_quiet(page, quiet_ms: int = config.NETWORK_QUIET_WINDOW_MS,
+                           timeout_ms: int = config.NETWORK_QUIET_TIMEOUT_MS) -> int:
+    """
+    Замена page.wait_for_load_state("networkidle"), не зависящая от медиапотока.
+    Возвращает время ожидания в мс.
+    """
+    return attach_network_quiescence(page).wait(quiet_ms=quiet_ms, timeout_ms=timeout_ms)
@@ -0,0 +1,243 @@
+"""
+Декларативный конвейер шагов пользовательского сценария.
+
+Каждый шаг (PipelineStep) объявляет:
+- requires   — шаги, без успешного выполнения которых он не имеет смысла;
+- produces   — метрики, которые он кладёт в report["steps"][report_step];
+- timeout_sec, retries — бюджет времени и число повторов;
+- critical   — падение шага делает весь сценарий упавшим;
+- background — шаг не трогает страницу и может выполняться параллельно
+               со следующими шагами (например, ожидание результатов Lighthouse).
+
+StepPipeline выполняет шаги в объявленном порядке, замеряет их по монотонным
+часам и сохраняет частичные результаты: упавший шаг пропускает только
+зависящие от него шаги, остальные продолжают выполняться.
+
+Фоновый шаг работает с копией отчёта: его изменения переносятся в отчёт
+сценария только если шаг завершился вовремя. Зависший поток, который
+продолжает работу после таймаута, не пишет в отчёт, уже сохранённый на диск.
+"""
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterable, List, Optional
+
+import allure
+
+
+class StepTimeoutError(Exception):
+    """Шаг не уложился в свой timeout_sec."""
+
+
+class FlowContext:
+    """
+    Общее состояние сценария, передаваемое в каждый шаг.
+
+    values — словарь для передачи объектов между шагами (iframe, время старта и т.п.).
+    """
+
+    def __init__(self, page, request, report, film_url, device, throttling, geo, browser_type, pay_method):
+        self.page = page
+        self.request = request
+        self.report = report
+        self.film_url = film_url
+        self.device = device
+        self.throttling = throttling
+        self.geo = geo
+        self.browser_type = browser_type
+        self.pay_method = pay_method
+        self.values: Dict[str, object] = {}
+
+
+class PipelineStep:
+    """
+    Описание шага конвейера.
+
+    func(ctx) возвращает словарь метрик (или None); он сливается в
+    report["steps"][report_step]. Если шаг упал или пропущен, объявленные
+    в produces метрики записываются как None, чтобы структура отчёта не менялась.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[FlowContext], Optional[dict]],
+        requires: Iterable[str] = (),
+        produces: Iterable[str] = (),
+        report_step: Optional[str] = None,
+        timeout_sec: Optional[float] = None,
+        retries: int = 0,
+        critical: bool = True,
+        background: bool = False,
+        title: Optional[str] = None,
+    ):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.produces = tuple(produces)
+        self.report_step = report_step
+        self.timeout_sec = timeout_sec
+        self.retries = retries
+        self.critical = critical
+        self.background = background
+        self.title = title or name
+
+    def __repr__(self) -> str:
+        return f"PipelineStep({self.name!r})"
+
+
+class StepPipeline:
+    """
+    Выполняет список PipelineStep и возвращает журнал выполнения.
+
+    Журнал: {step_name: {"status": ok|failed|timeout|skipped, "duration_ms",
+    "attempts", "error"}}. Первое исключение упавшего или пропущенного
+    критичного шага доступно в self.critical_error; timeout (шаг выполнен,
+    но дольше timeout_sec) сценарий не валит.
+
+    Для шагов со страницей таймаут проверяется по факту завершения: синхронный
+    Playwright нельзя прервать из другого потока, поэтому ожидания внутри шага
+    должны быть ограничены собственными таймаутами Playwright. Фоновые шаги
+    выполняются в пуле потоков и ждутся не дольше timeout_sec.
+    """
+
+    def __init__(self, steps: List[PipelineStep], on_step_start: Optional[Callable[[PipelineStep], None]] = None):
+        self.steps = steps
+        self.on_step_start = on_step_start
+        self.journal: Dict[str, dict] = {}
+        self.critical_error: Optional[BaseException] = None
+        self._validate()
+
+    def _validate(self) -> None:
+        seen = set()
+        for step in self.steps:
+            if step.name in seen:
+                raise ValueError(f"Шаг {step.name} объявлен дважды")
+            missing = [name for name in step.requires if name not in seen]
+            if missing:
+                raise ValueError(f"Шаг {step.name} зависит от необъявленных ранее шагов: {missing}")
+            seen.add(step.name)
+
+    def run(self, ctx: FlowContext) -> Dict[str, dict]:
+        background = {}
+        executor = ThreadPoolExecutor(thread_name_prefix="pipeline")
+        try:
+            for step in self.steps:
+                # Фоновый шаг, от которого зависит текущий, нужно дождаться
+                for name in step.requires:
+                    if name in background:
+                        self._finish_background(background.pop(name), ctx)
+                # Шаг со страницей, не уложившийся в бюджет, свои метрики отдал — зависимые шаги выполняем
+                blocked = [name for name in step.requires if self.journal[name]["status"] not in ("ok", "timeout")]
+                if blocked:
+                    self._record(step, ctx, "skipped", 0, 0, f"не выполнены шаги: {', '.join(blocked)}")
+                    continue
+                if step.background:
+                    started = time.monotonic()
+                    # Копия контекста с собственным отчётом; values и страница общие
+                    background_ctx = copy.copy(ctx)
+                    background_ctx.report = copy.deepcopy(ctx.report)
+                    snapshot = copy.deepcopy(ctx.report)
+                    future = executor.submit(self._call, step, background_ctx)
+                    background[step.name] = (step, started, future, background_ctx.report, snapshot)
+                    continue
+                self._run_foreground(step, ctx)
+
+            for entry in background.values():
+                self._finish_background(entry, ctx)
+        finally:
+            # Зависший фоновый шаг не должен держать сценарий
+            executor.shutdown(wait=False, cancel_futures=True)
+        return self.journal
+
+    def _call(self, step: PipelineStep, ctx: FlowContext) -> Optional[dict]:
+        if self.on_step_start and not step.background:
+            self.on_step_start(step)
+        return step.func(ctx)
+
+    def _run_foreground(self, step: PipelineStep, ctx: FlowContext) -> None:
+        attempts = 0
+        started = time.monotonic()
+        with allure.step(step.title):
+            while True:
+                attempts += 1
+                attempt_started = time.monotonic()
+                try:
+                    result = self._call(step, ctx)
+                except Exception as e:
+                    if attempts <= step.retries:
+                        print(f"[WARN] Шаг {step.name} упал (попытка {attempts}), повторяем: {e}")
+                        continue
+                    self._record(step, ctx, "failed", started, attempts, e)
+                    return
+                self._merge(step, ctx, result)
+                elapsed = time.monotonic() - attempt_started
+                if step.timeout_sec is not None and elapsed > step.timeout_sec:
+                    error = StepTimeoutError(
+                        f"Шаг {step.name} занял {elapsed:.1f} с при бюджете {step.timeout_sec} с"
+                    )
+                    self._record(step, ctx, "timeout", started, attempts, error)
+                    return
+                self._record(step, ctx, "ok", started, attempts)
+                return
+
+    def _finish_background(self, entry, ctx: FlowContext) -> None:
+        step, started, future, background_report, snapshot = entry
+        try:
+            result = future.result(timeout=step.timeout_sec)
+        except FutureTimeoutError:
+            future.cancel()
+            # Результата нет, поэтому для зависимых шагов это падение, а не перерасход бюджета
+            error = StepTimeoutError(f"Фоновый шаг {step.name} не завершился за {step.timeout_sec} с")
+            self._record(step, ctx, "failed", started, 1, error)
+            return
+        except Exception as e:
+            self._record(step, ctx, "failed", started, 1, e)
+            return
+        _merge_report_changes(ctx.report, snapshot, background_report)
+        self._merge(step, ctx, result)
+        self._record(step, ctx, "ok", started, 1)
+
+    def _merge(self, step: PipelineStep, ctx: FlowContext, result: Optional[dict]) -> None:
+        if step.report_step and result:
+            ctx.report["steps"].setdefault(step.report_step, {}).update(result)
+
+    def _record(self, step: PipelineStep, ctx: FlowContext, status: str, started: float, attempts: int, error=None) -> None:
+        duration_ms = round((time.monotonic() - started) * 1000) if started else 0
+        self.journal[step.name] = {
+            "status": status,
+            "duration_ms": duration_ms,
+            "attempts": attempts,
+            "error": str(error) if error is not None else None,
+        }
+        if status == "ok":
+            return
+        # Частичный результат: объявленные метрики, которых нет, — None
+        if step.report_step and step.produces:
+            target = ctx.report["steps"].setdefault(step.report_step, {})
+            for metric in step.produces:
+                target.setdefault(metric, None)
+        level = "[INFO]" if status == "skipped" else "[WARN]"
+        print(f"{level} Шаг {step.name}: {status} ({error})")
+        # Перерасход бюджета только отмечается в журнале: метрики шага получены, зависимые шаги выполняются.
+        # Критичный шаг, пропущенный из-за упавшей зависимости, тоже валит сценарий
+        if status in ("failed", "skipped") and step.critical and self.critical_error is None:
+            self.critical_error = error if isinstance(error, BaseException) else Exception(str(error))
+
+
+def _merge_report_changes(report: dict, snapshot: dict, changed: dict) -> None:
+    """
+    Переносит в report то, что фоновый шаг изменил в своей копии changed
+    относительно snapshot (состояния на момент запуска шага): метрики шагов —
+    поштучно, остальные поля — целиком. Изменения основного потока за это
+    время сохраняются.
+    """
+    for key, value in changed.items():
+        if key == "steps":
+            for step_name, metrics in value.items():
+                before = snapshot.get("steps", {}).get(step_name, {})
+                updates = {name: v for name, v in metrics.items() if name not in before or before[name] != v}
+                if updates:
+                    report["steps"].setdefault(step_name, {}).update(updates)
+        elif key not in snapshot or snapshot[key] != value:
+            report[key] = value
@@ -0,0 +1,121 @@
+"""
+История прогонов тестов между сессиями.
+
+Для каждого теста (nodeid: тестовая функция + фильм + конфигурация) хранятся
+последние RUN_HISTORY_MAX_RUNS прогонов: время, статус (passed / problematic /
+failed), длительность и ключевые метрики. История используется планировщиком
+очереди (utils/scheduler.py) и хранится в одном JSON-файле.
+"""
+import json
+import os
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import config
+
+FAILING_STATUSES = ("failed", "problematic")
+"""Статусы, которые считаются неуспешным прогоном"""
+
+
+class RunHistory:
+    """Последние прогоны по ключу теста с атомарным сохранением на диск."""
+
+    def __init__(self, path: str = config.RUN_HISTORY_FILE, max_runs: int = config.RUN_HISTORY_MAX_RUNS):
+        self.path = Path(path)
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        self._runs: Dict[str, List[dict]] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._runs = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Не удалось прочитать историю прогонов {self.path}: {e}")
+
+    def record(self, key: str, status: str, duration_sec: float, metrics: Optional[dict] = None,
+               timestamp: Optional[float] = None) -> None:
+        run = {
+            "ts": round(timestamp if timestamp is not None else time.time(), 1),
+            "status": status,
+            "duration_sec": round(duration_sec, 1),
+            "metrics": metrics or {},
+        }
+        with self._lock:
+            runs = self._runs.setdefault(key, [])
+            runs.append(run)
+            del runs[:-self.max_runs]
+            self._dirty = True
+
+    def merge(self, other: "RunHistory") -> None:
+        """Добавляет прогоны другой истории (например, другого шарда): без повторов, по времени, последние max_runs."""
+        with self._lock:
+            for key, other_runs in other._runs.items():
+                runs = self._runs.setdefault(key, [])
+                seen = {json.dumps(run, sort_keys=True) for run in runs}
+                runs.extend(run for run in other_runs if json.dumps(run, sort_keys=True) not in seen)
+                runs.sort(key=lambda run: run["ts"])
+                del runs[:-self.max_runs]
+                self._dirty = True
+
+    def runs(self, key: str) -> List[dict]:
+        return list(self._runs.get(key, []))
+
+    def last_run(self, key: str) -> Optional[dict]:
+        runs = self._runs.get(key)
+        return runs[-1] if runs else None
+
+    def mean_duration(self, key: str) -> Optional[float]:
+        durations = [r["duration_sec"] for r in self._runs.get(key, []) if r["status"] != "skipped"]
+        return statistics.fmean(durations) if durations else None
+
+    def median_duration(self) -> Optional[float]:
+        """Медиана длительностей по всей истории (оценка для тестов без истории)."""
+        durations = [r["duration_sec"] for runs in self._runs.values() for r in runs if r["status"] != "skipped"]
+        return statistics.median(durations) if durations else None
+
+    def is_regressing(self, key: str, metrics: List[str], ratio: float) -> bool:
+        """Последнее значение хотя бы одной метрики больше медианы предыдущих прогонов в ratio раз."""
+        runs = self._runs.get(key, [])
+        if len(runs) < 3:
+            return False
+        last, previous = runs[-1]["metrics"], runs[:-1]
+        for metric in metrics:
+            value = last.get(metric)
+            history = [r["metrics"][metric] for r in previous if r["metrics"].get(metric) is not None]
+            if value is not None and history and value > statistics.median(history) * ratio:
+                return True
+        return False
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._runs, ensure_ascii=False)
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def report_metrics(reports: List[dict], metrics: List[str]) -> dict:
+    """Средние значения метрик «шаг.метрика» по отчётам (в пакетном режиме — по фильмам пакета)."""
+    result = {}
+    for metric in metrics:
+        step, name = metric.split(".", 1)
+        values = [
+            r.get("steps", {}).get(step, {}).get(name) for r in reports
+        ]
+        values = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        if values:
+            result[metric] = round(statistics.fmean(values), 1)
+    return result
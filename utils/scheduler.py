@@ -0,0 +1,103 @@
+"""
+Приоритетная очередь тестов по истории прогонов.
+
+Порядок:
+1. недавно упавшие, проблемные или регрессирующие тесты, затем тесты фильмов
+   с недавней аномалией HTTP-пробы (utils/http_probe.py);
+2. тесты без истории или давно не запускавшиеся — сначала фильмы, недавно
+   появившиеся в каталоге (utils/film_catalog.py), затем самые старые;
+3. остальные — в случайном порядке.
+
+С бюджетом времени в очередь берутся тесты по приоритету, пока их
+оценочная длительность (среднее по истории, иначе медиана всей истории,
+иначе SCHEDULER_DEFAULT_TEST_SEC) укладывается в бюджет.
+"""
+import random
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+
+import config
+from utils.run_history import FAILING_STATUSES, RunHistory
+
+TIER_NAMES = {0: "падения, регрессии и аномалии пробы", 1: "новые и давно не запускавшиеся", 2: "случайная выборка"}
+"""Названия уровней приоритета для сводки"""
+
+
+def parse_duration(value: str) -> float:
+    """Разбирает длительность: "2h", "90m", "45s", "1h30m" или число секунд."""
+    value = value.strip().lower()
+    if re.fullmatch(r"\d+(\.\d+)?", value):
+        return float(value)
+    parts = re.findall(r"(\d+(?:\.\d+)?)\s*([hms])", value)
+    if not parts or "".join(n + u for n, u in parts) != value.replace(" ", ""):
+        raise ValueError(f"Не удалось разобрать длительность: {value}")
+    return sum(float(n) * {"h": 3600, "m": 60, "s": 1}[u] for n, u in parts)
+
+
+class PriorityScheduler:
+    """Расставляет приоритеты тестам и отбирает их под бюджет времени."""
+
+    def __init__(self, history: RunHistory, seed: int = 0, now: Optional[float] = None):
+        self.history = history
+        self.rng = random.Random(seed)
+        self.now = now if now is not None else time.time()
+        self.default_duration = history.median_duration() or config.SCHEDULER_DEFAULT_TEST_SEC
+
+    def tier(self, key: str) -> int:
+        last = self.history.last_run(key)
+        if last is None:
+            return 1
+        age_days = (self.now - last["ts"]) / 86400
+        if last["status"] in FAILING_STATUSES and age_days <= config.SCHEDULER_RECENT_FAILURE_DAYS:
+            return 0
+        if self.history.is_regressing(key, config.SCHEDULER_REGRESSION_METRICS, config.SCHEDULER_REGRESSION_RATIO):
+            return 0
+        if age_days >= config.SCHEDULER_STALE_DAYS:
+            return 1
+        return 2
+
+    def estimate(self, key: str) -> float:
+        return self.history.mean_duration(key) or self.default_duration
+
+    def order(self, items: list, key_of: Callable[[object], str],
+              is_new: Optional[Callable[[object], bool]] = None,
+              is_anomalous: Optional[Callable[[object], bool]] = None) -> List[Tuple[object, int]]:
+        """
+        Возвращает [(item, уровень)] в порядке приоритета.
+        is_new(item) — фильм недавно появился в каталоге: такие тесты идут первыми на уровне 1.
+        is_anomalous(item) — у фильма аномалия HTTP-пробы: тест поднимается на уровень 0 после собственных падений.
+        """
+        tiers = {0: [], 1: [], 2: []}
+        promoted = set()
+        for item in items:
+            tier = self.tier(key_of(item))
+            if tier > 0 and is_anomalous and is_anomalous(item):
+                tier = 0
+                promoted.add(id(item))
+            tiers[tier].append(item)
+        # Падения: сначала самые свежие, затем аномалии пробы; давно не запускавшиеся: сначала новые фильмы,
+        # без истории, затем самые старые
+        tiers[0].sort(key=lambda item: (
+            id(item) in promoted, -(self.history.last_run(key_of(item)) or {"ts": 0})["ts"]
+        ))
+        tiers[1].sort(key=lambda item: (
+            not (is_new and is_new(item)), (self.history.last_run(key_of(item)) or {"ts": 0})["ts"]
+        ))
+        self.rng.shuffle(tiers[2])
+        return [(item, tier) for tier in (0, 1, 2) for item in tiers[tier]]
+
+    def fit_budget(self, ordered: List[Tuple[object, int]], key_of: Callable[[object], str],
+                   budget_sec: Optional[float]) -> Tuple[list, list]:
+        """Делит упорядоченные тесты на (выбранные, отложенные) по бюджету времени."""
+        if budget_sec is None:
+            return [item for item, _ in ordered], []
+        selected, postponed, planned = [], [], 0.0
+        for item, _ in ordered:
+            estimate = self.estimate(key_of(item))
+            if planned + estimate <= budget_sec:
+                selected.append(item)
+                planned += estimate
+            else:
+                postponed.append(item)
+        return selected, postponed
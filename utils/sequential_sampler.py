@@ -0,0 +1,141 @@
+"""
+Последовательная выборка фильмов для прогонов по --film-list.
+
+Фильмы проходятся в случайном стратифицированном порядке: внутри кластера
+(тест × устройство × сеть × ГЕО × браузер) — в перемешанном порядке,
+между кластерами — по очереди, чтобы оценки всех кластеров уточнялись
+равномерно. После каждой порции из SEQUENTIAL_BATCH_SIZE фильмов
+для кластера считается доверительный интервал ключевых метрик; когда
+относительная ширина всех интервалов меньше допуска, оставшиеся фильмы
+кластера пропускаются, а сэкономленное время браузера учитывается в сводке.
+"""
+import math
+import random
+import statistics
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import config
+
+
+def t_critical(df: int, confidence: float) -> float:
+    """Квантиль t-распределения (разложение Корниша — Фишера от нормального квантиля)."""
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    if df <= 0:
+        return math.inf
+    return (
+        z
+        + (z ** 3 + z) / (4 * df)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+    )
+
+
+def confidence_interval(values: List[float], confidence: float) -> Optional[Tuple[float, float]]:
+    """Среднее и полуширина доверительного интервала (None, если значений меньше двух)."""
+    if len(values) < 2:
+        return None
+    mean = statistics.fmean(values)
+    half_width = t_critical(len(values) - 1, confidence) * statistics.stdev(values) / math.sqrt(len(values))
+    return mean, half_width
+
+
+def stratified_order(items: list, cluster_of: Callable[[object], Hashable], seed: int = 0, shuffle: bool = True) -> list:
+    """
+    Перемешивает элементы внутри кластеров и чередует кластеры по кругу.
+    shuffle=False сохраняет исходный порядок внутри кластера (например, приоритеты планировщика).
+    """
+    rng = random.Random(seed)
+    clusters = defaultdict(list)
+    for item in items:
+        clusters[cluster_of(item)].append(item)
+    queues = list(clusters.values())
+    if shuffle:
+        for queue in queues:
+            rng.shuffle(queue)
+    return list(_round_robin(queues))
+
+
+def _round_robin(queues: List[list]):
+    longest = max((len(q) for q in queues), default=0)
+    for i in range(longest):
+        for queue in queues:
+            if i < len(queue):
+                yield queue[i]
+
+
+class SequentialSampler:
+    """
+    Решает, нужно ли ещё запускать фильмы кластера.
+
+    add() получает отчёты пройденного теста и время его выполнения;
+    is_stopped() — истина, когда для всех ключевых метрик набралось
+    min_samples значений и относительная ширина интервала (2·полуширина / среднее)
+    не больше rel_tolerance. Решение пересматривается раз в batch_size отчётов.
+    """
+
+    def __init__(
+        self,
+        metrics: List[str] = config.SEQUENTIAL_KEY_METRICS,
+        rel_tolerance: float = config.SEQUENTIAL_REL_TOLERANCE,
+        confidence: float = config.SEQUENTIAL_CONFIDENCE,
+        min_samples: int = config.SEQUENTIAL_MIN_SAMPLES,
+        batch_size: int = config.SEQUENTIAL_BATCH_SIZE,
+    ):
+        self.metrics = metrics
+        self.rel_tolerance = rel_tolerance
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.batch_size = batch_size
+        self._values: Dict[Hashable, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        self._reports = defaultdict(int)
+        self._durations = defaultdict(list)
+        self._stopped: Dict[Hashable, dict] = {}
+        self._skipped = defaultdict(int)
+
+    def add(self, cluster: Hashable, reports: List[dict], duration_sec: float) -> None:
+        self._durations[cluster].append(duration_sec)
+        for report in reports:
+            self._reports[cluster] += 1
+            for metric in self.metrics:
+                step, name = metric.split(".", 1)
+                value = report.get("steps", {}).get(step, {}).get(name)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._values[cluster][metric].append(value)
+            if self._reports[cluster] % self.batch_size == 0:
+                self._evaluate(cluster)
+
+    def _evaluate(self, cluster: Hashable) -> None:
+        if cluster in self._stopped:
+            return
+        intervals = {}
+        for metric in self.metrics:
+            values = self._values[cluster][metric]
+            if len(values) < self.min_samples:
+                return
+            mean, half_width = confidence_interval(values, self.confidence)
+            relative_width = 2 * half_width / abs(mean) if mean else math.inf
+            if relative_width > self.rel_tolerance:
+                return
+            intervals[metric] = {"mean": round(mean, 1), "half_width": round(half_width, 1), "n": len(values)}
+        self._stopped[cluster] = intervals
+        print(f"[INFO] Кластер {cluster}: оценка устоялась после {self._reports[cluster]} фильмов {intervals}")
+
+    def is_stopped(self, cluster: Hashable) -> bool:
+        return cluster in self._stopped
+
+    def record_skip(self, cluster: Hashable, count: int = 1) -> None:
+        self._skipped[cluster] += count
+
+    def summary(self) -> dict:
+        """Пропущено тестов, остановлено кластеров и сэкономленное время браузера (по среднему времени теста кластера)."""
+        saved_sec = 0.0
+        for cluster, skipped in self._skipped.items():
+            durations = self._durations.get(cluster)
+            if durations:
+                saved_sec += skipped * statistics.fmean(durations)
+        return {
+            "stopped_clusters": len(self._stopped),
+            "skipped_tests": sum(self._skipped.values()),
+            "saved_browser_sec": round(saved_sec, 1),
+        }
@@ -0,0 +1,141 @@
+"""
+Детерминированное разбиение матрицы тестов между машинами (--shard i/N).
+
+Каждый тест получает стабильный хеш ключа (тестовая функция + URL фильма +
+конфигурация), не зависящий от процесса и порядка сбора. Тесты распределяются
+жадно по правилу LPT (longest processing time first): сначала самые долгие,
+каждый — на наименее загруженный шард; равные оценки упорядочиваются по хешу.
+
+Оценки длительности берутся только из общей истории, переданной явно
+(--shard-history): локальная .cache/history у каждой машины своя и после
+первого прогона расходится, а с ней и план. Без общей истории все тесты
+стоят SCHEDULER_DEFAULT_TEST_SEC на фильм. При одинаковых списке фильмов,
+опциях и общей истории все машины строят один и тот же план и получают
+непересекающиеся части; отпечаток плана учитывает и ключи, и оценки.
+
+Результаты шардов объединяются командой
+    python -m utils.sharding merge .cache/checkpoints/<session>-shard*.jsonl \
+        --history shard1/runs.json shard2/runs.json
+которая собирает отчёты из чекпоинтов шардов в общий агрегат сессии и
+объединяет истории прогонов шардов в SHARD_HISTORY_FILE — её передают
+всем машинам следующего прогона в --shard-history.
+"""
+import argparse
+import hashlib
+import heapq
+import re
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import config
+from utils.checkpoint import CheckpointStore
+from utils.run_history import RunHistory
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Разбирает "i/N" (шарды нумеруются с 1)."""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", value)
+    if not match:
+        raise ValueError(f"Ожидается шард в виде i/N: {value}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise ValueError(f"Номер шарда должен быть от 1 до {count}: {value}")
+    return index, count
+
+
+def stable_hash(key: str) -> int:
+    """Хеш, одинаковый на всех машинах (в отличие от hash() с PYTHONHASHSEED)."""
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+def assign_shards(keys: Sequence[str], costs: Sequence[float], count: int,
+                  cost_step: float = config.SHARD_COST_STEP_SEC) -> List[int]:
+    """
+    Номер шарда (0..count-1) для каждого ключа по LPT.
+
+    Оценки округляются до cost_step секунд: небольшие расхождения истории
+    между машинами не меняют порядок и, следовательно, план.
+    """
+    rounded = [round_cost(cost, cost_step) for cost in costs]
+    order = sorted(range(len(keys)), key=lambda i: (-rounded[i], stable_hash(keys[i]), keys[i]))
+    loads = [(0.0, shard) for shard in range(count)]
+    assignment = [0] * len(keys)
+    for i in order:
+        load, shard = heapq.heappop(loads)
+        assignment[i] = shard
+        heapq.heappush(loads, (load + rounded[i], shard))
+    return assignment
+
+
+def round_cost(cost: float, cost_step: float = config.SHARD_COST_STEP_SEC) -> float:
+    """Оценка, округлённая до cost_step секунд."""
+    return round(cost / cost_step) * cost_step if cost_step else cost
+
+
+def plan_fingerprint(keys: Sequence[str], assignment: Sequence[int], costs: Sequence[float],
+                     cost_step: float = config.SHARD_COST_STEP_SEC) -> str:
+    """
+    Отпечаток плана: совпадает на всех машинах, если они разбили матрицу
+    одинаково и по одинаковым оценкам.
+    """
+    digest = hashlib.sha1()
+    for key, shard, cost in sorted(zip(keys, assignment, (round_cost(c, cost_step) for c in costs))):
+        digest.update(f"{key}\t{shard}\t{cost:g}\n".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def merge_checkpoints(paths: Sequence[str]) -> Dict[str, List[dict]]:
+    """Отчёты из чекпоинтов шардов по тестовым функциям; тест из нескольких шардов учитывается один раз."""
+    entries = {}
+    for path in map(Path, paths):
+        for key, entry in CheckpointStore(path.stem, str(path.parent)).load().items():
+            if key in entries:
+                print(f"[WARN] {key} есть в нескольких шардах, используется {path.name}")
+            entries[key] = entry
+    reports_by_test = {}
+    for key, entry in entries.items():
+        test_name = key.split("::")[-1].split("[")[0]
+        reports_by_test.setdefault(test_name, []).extend(entry["reports"])
+    return reports_by_test
+
+
+def merge_histories(paths: Sequence[str], output: str) -> RunHistory:
+    """Объединяет истории прогонов шардов с уже накопленной общей историей output."""
+    merged = RunHistory(output)
+    for path in paths:
+        if not Path(path).exists():
+            print(f"[WARN] Нет истории прогонов {path}")
+            continue
+        merged.merge(RunHistory(path))
+    merged.save()
+    return merged
+
+
+def _merge_command(args: argparse.Namespace) -> None:
+    import aggregator
+
+    if args.history:
+        merge_histories(args.history, args.history_output)
+        print(f"[INFO] Истории {len(args.history)} шардов объединены в {args.history_output} (передайте в --shard-history)")
+
+    merged = aggregator.MultiTestRunAggregator()
+    reports_by_test = merge_checkpoints(args.checkpoints)
+    for test_name, reports in reports_by_test.items():
+        for report in reports:
+            merged.add_report(test_name, report)
+        merged.save_summary(test_name)
+        print(f"[INFO] {test_name}: {len(reports)} отчётов из {len(args.checkpoints)} шардов")
+    if not reports_by_test:
+        print("[WARN] В чекпоинтах шардов нет отчётов")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Объединение результатов шардов в общий агрегат сессии")
+    commands = parser.add_subparsers(dest="command", required=True)
+    merge_parser = commands.add_parser("merge", help="Собрать RUN_SUMMARY по чекпоинтам шардов")
+    merge_parser.add_argument("checkpoints", nargs="+", help="Файлы .cache/checkpoints/<session>-shard*.jsonl")
+    merge_parser.add_argument("--history", nargs="+", default=[], help="Истории прогонов шардов (.cache/history/runs.json каждой машины)")
+    merge_parser.add_argument("--history-output", default=config.SHARD_HISTORY_FILE, help="Общая история для --shard-history")
+    arguments = parser.parse_args()
+    if arguments.command == "merge":
+        _merge_command(arguments)
@@ -0,0 +1,77 @@
+"""
+Снимки состояния сайта (Playwright storage_state) для тёплого старта.
+
+Прогрев (warm-up) открывает главную страницу домена в отдельном контексте
+с теми же настройками устройства, включает vidu_log и сохраняет cookies
+и localStorage в файл <домен>_<устройство>.json. Тесты в режиме warm
+создают контекст из этого снимка и пропускают установочную навигацию
+(главную страницу). Снимок живёт STORAGE_STATE_TTL_SEC секунд.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import config
+
+
+class StorageStateStore:
+    """Дисковое хранилище снимков storage_state по домену и устройству."""
+
+    def __init__(self, state_dir: str = config.STORAGE_STATE_DIR, ttl_sec: float = config.STORAGE_STATE_TTL_SEC):
+        self.state_dir = Path(state_dir)
+        self.ttl_sec = ttl_sec
+        self._lock = threading.Lock()
+
+    def path(self, domain: str, device: str) -> Path:
+        return self.state_dir / f"{domain}_{device}.json"
+
+    def get(self, domain: str, device: str) -> Optional[str]:
+        """Путь к свежему снимку или None."""
+        path = self.path(domain, device)
+        try:
+            age = time.time() - path.stat().st_mtime
+        except OSError:
+            return None
+        return str(path) if age <= self.ttl_sec else None
+
+    def warm_up(self, browser, context_args: dict, base_url: str, domain: str, device: str) -> Optional[str]:
+        """
+        Прогревочный сценарий: главная страница + vidu_log, затем сохранение снимка.
+        Возвращает путь к снимку или None, если прогрев не удался.
+        """
+        path = self.path(domain, device)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        context = browser.new_context(**context_args)
+        try:
+            page = context.new_page()
+            page.goto(base_url, timeout=30000)
+            page.wait_for_load_state("load")
+            page.evaluate("() => { localStorage.setItem('vidu_log', '1'); }")
+            tmp_path = path.with_suffix(".tmp")
+            context.storage_state(path=str(tmp_path))
+            os.replace(tmp_path, path)
+            print(f"[INFO] Снимок состояния {domain}/{device} сохранён: {path}")
+            return str(path)
+        except Exception as e:
+            print(f"[WARN] Прогрев {base_url} не удался, старт будет холодным: {e}")
+            return None
+        finally:
+            context.close()
+
+    def ensure(self, browser, context_args: dict, base_url: str, domain: str, device: str) -> Optional[str]:
+        """Возвращает свежий снимок, при необходимости выполняя прогрев."""
+        with self._lock:
+            return self.get(domain, device) or self.warm_up(browser, context_args, base_url, domain, device)
+
+    @staticmethod
+    def cookies(state_path: str) -> list:
+        """Cookies из снимка (для восстановления между фильмами пакета)."""
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("cookies", [])
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Не удалось прочитать снимок {state_path}: {e}")
+            return []
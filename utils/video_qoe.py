@@ -0,0 +1,315 @@
+"""
+Движок QoE видео: сегментные метрики hls.js и события HTMLVideoElement.
+
+Скрипт ставится через context.add_init_script до загрузки страницы, поэтому
+видит и hls.js, и плеер с самого начала (в отличие от inject_hls_buffering_listener,
+который патчит Hls.prototype.attachMedia уже после загрузки страницы).
+
+В странице накапливаются:
+- счётчики: сегменты (время загрузки, байты), переключения качества,
+  ошибки hls.js, остановки воспроизведения (rebuffer) и время просмотра;
+- ограниченный кольцевой буфер последних событий (QOE_EVENT_BUFFER_SIZE).
+
+Всё собирается одним вызовом collect_video_qoe(page).
+
+Отдельно фиксируется момент отрисовки первого кадра после play
+(requestVideoFrameCallback, либо timeupdate со сдвигом currentTime),
+его читает wait_for_first_frame(page).
+"""
+import json
+from typing import Optional
+
+import allure
+
+import config
+
+QOE_INIT_SCRIPT = """
+(() => {
+    if (window.__qoe) return;
+    const LIMIT = %(limit)d;
+    const now = () => performance.now();
+    const qoe = window.__qoe = {
+        events: [], next: 0, total: 0,
+        segments: 0, segmentBytes: 0, segmentMs: 0, minKbps: null,
+        levels: 0, level: null, bitrate: null, switches: 0, bitrateSum: 0, bitrateSamples: 0,
+        manifestMs: null, errors: 0, fatalErrors: 0,
+        firstPlaying: null, stallStart: null, stallCount: 0, stallMs: 0,
+        playRequested: null, firstFrame: null, firstFrameSource: null,
+    };
+
+    function push(type, data) {
+        const event = Object.assign({ type: type, t: Math.round(now()) }, data);
+        if (qoe.events.length < LIMIT) qoe.events.push(event);
+        else qoe.events[qoe.next] = event;
+        qoe.next = (qoe.next + 1) %% LIMIT;
+        qoe.total += 1;
+    }
+
+    // --- hls.js ---
+    function loadingStats(stats) {
+        // hls.js >= 1.0: stats.loading.{start,end}; 0.x: trequest/tload
+        if (!stats) return null;
+        if (stats.loading) return { ms: stats.loading.end - stats.loading.start, bytes: stats.loaded || stats.total || 0 };
+        if (stats.tload) return { ms: stats.tload - stats.trequest, bytes: stats.loaded || stats.total || 0 };
+        return null;
+    }
+
+    function levelBitrate(hls, index) {
+        const level = hls.levels && hls.levels[index];
+        return level ? Math.round((level.bitrate || level.maxBitrate || 0) / 1000) : null;
+    }
+
+    const hooked = new WeakSet();
+    function hookInstance(hls, Events) {
+        if (hooked.has(hls) || typeof hls.on !== 'function') return;
+        hooked.add(hls);
+        hls.on(Events.MANIFEST_LOADED, (e, data) => {
+            const st = loadingStats(data && data.stats);
+            qoe.levels = data && data.levels ? data.levels.length : 0;
+            qoe.manifestMs = st ? Math.round(st.ms) : null;
+            push('manifest', { levels: qoe.levels, ms: qoe.manifestMs });
+        });
+        hls.on(Events.LEVEL_SWITCHED, (e, data) => {
+            const bitrate = levelBitrate(hls, data.level);
+            if (qoe.level !== null && qoe.level !== data.level) qoe.switches += 1;
+            push('level', { from: qoe.level, to: data.level, kbps: bitrate });
+            qoe.level = data.level;
+            qoe.bitrate = bitrate;
+        });
+        hls.on(Events.FRAG_LOADED, (e, data) => {
+            const frag = data && data.frag;
+            if (!frag || (frag.type && frag.type !== 'main')) return;
+            const st = loadingStats(frag.stats || data.stats);
+            if (!st || st.ms <= 0) return;
+            const kbps = Math.round(st.bytes * 8 / st.ms);
+            qoe.segments += 1;
+            qoe.segmentBytes += st.bytes;
+            qoe.segmentMs += st.ms;
+            qoe.minKbps = qoe.minKbps === null ? kbps : Math.min(qoe.minKbps, kbps);
+            const bitrate = levelBitrate(hls, frag.level);
+            if (bitrate) { qoe.bitrateSum += bitrate; qoe.bitrateSamples += 1; }
+            push('segment', { sn: frag.sn, level: frag.level, ms: Math.round(st.ms), bytes: st.bytes, kbps: kbps, duration: frag.duration });
+        });
+        hls.on(Events.ERROR, (e, data) => {
+            qoe.errors += 1;
+            if (data && data.fatal) qoe.fatalErrors += 1;
+            push('error', { kind: data && data.type, details: data && data.details, fatal: !!(data && data.fatal) });
+        });
+    }
+
+    function patchHls(Hls) {
+        if (!Hls || !Hls.prototype || Hls.prototype.__qoePatched) return;
+        Hls.prototype.__qoePatched = true;
+        const Events = Hls.Events || {};
+        // Экземпляр подхватываем при первом обращении плеера к loadSource/attachMedia
+        ['attachMedia', 'loadSource'].forEach((name) => {
+            const original = Hls.prototype[name];
+            if (typeof original !== 'function') return;
+            Hls.prototype[name] = function () {
+                try { hookInstance(this, Events); } catch (e) {}
+                return original.apply(this, arguments);
+            };
+        });
+    }
+
+    let hlsRef = window.Hls;
+    patchHls(hlsRef);
+    try {
+        Object.defineProperty(window, 'Hls', {
+            configurable: true,
+            enumerable: true,
+            get() { return hlsRef; },
+            set(value) { hlsRef = value; patchHls(value); },
+        });
+    } catch (e) {}
+
+    // --- Первый кадр: requestVideoFrameCallback, иначе timeupdate + сдвиг currentTime ---
+    // Все отметки — performance.now(), т.е. мс от navigationStart текущей страницы.
+    function recordFirstFrame(t, source) {
+        if (qoe.firstFrame !== null) return;
+        qoe.firstFrame = t;
+        qoe.firstFrameSource = source;
+        push('first_frame', { source: source, at: Math.round(t) });
+    }
+
+    const armed = new WeakSet();
+    function armFirstFrame(video) {
+        if (qoe.firstFrame !== null || armed.has(video)) return;
+        armed.add(video);
+        if (typeof video.requestVideoFrameCallback === 'function') {
+            video.requestVideoFrameCallback((t, meta) => {
+                recordFirstFrame(meta && meta.expectedDisplayTime ? meta.expectedDisplayTime : t, 'rvfc');
+            });
+            return;
+        }
+        const startTime = video.currentTime;
+        const onTimeUpdate = () => {
+            if (video.currentTime <= startTime) return;
+            video.removeEventListener('timeupdate', onTimeUpdate);
+            recordFirstFrame(now(), 'timeupdate');
+        };
+        video.addEventListener('timeupdate', onTimeUpdate);
+    }
+
+    document.addEventListener('play', (e) => {
+        if (!(e.target instanceof HTMLVideoElement)) return;
+        if (qoe.playRequested === null) qoe.playRequested = now();
+        armFirstFrame(e.target);
+    }, true);
+
+    // --- HTMLVideoElement: события не всплывают, поэтому слушаем в фазе захвата ---
+    document.addEventListener('playing', (e) => {
+        if (!(e.target instanceof HTMLVideoElement)) return;
+        if (qoe.firstPlaying === null) qoe.firstPlaying = now();
+        if (qoe.stallStart !== null) {
+            const ms = now() - qoe.stallStart;
+            qoe.stallCount += 1;
+            qoe.stallMs += ms;
+            qoe.stallStart = null;
+            push('stall', { ms: Math.round(ms) });
+        }
+    }, true);
+    document.addEventListener('waiting', (e) => {
+        const video = e.target;
+        if (!(video instanceof HTMLVideoElement)) return;
+        // Ожидание до старта и при перемотке — не остановка воспроизведения
+        if (qoe.firstPlaying === null || video.seeking || qoe.stallStart !== null) return;
+        qoe.stallStart = now();
+    }, true);
+
+    qoe.collect = () => {
+        let dropped = 0, frames = 0;
+        document.querySelectorAll('video').forEach((video) => {
+            if (typeof video.getVideoPlaybackQuality === 'function') {
+                const q = video.getVideoPlaybackQuality();
+                dropped += q.droppedVideoFrames;
+                frames += q.totalVideoFrames;
+            } else if ('webkitDroppedFrameCount' in video) {
+                dropped += video.webkitDroppedFrameCount;
+                frames += video.webkitDecodedFrameCount || 0;
+            }
+        });
+        const t = now();
+        const ongoing = qoe.stallStart !== null ? t - qoe.stallStart : 0;
+        const ordered = qoe.events.length < LIMIT
+            ? qoe.events.slice()
+            : qoe.events.slice(qoe.next).concat(qoe.events.slice(0, qoe.next));
+        return {
+            segments: qoe.segments, segmentBytes: qoe.segmentBytes, segmentMs: qoe.segmentMs, minKbps: qoe.minKbps,
+            levels: qoe.levels, bitrate: qoe.bitrate, switches: qoe.switches,
+            avgBitrate: qoe.bitrateSamples ? qoe.bitrateSum / qoe.bitrateSamples : null,
+            manifestMs: qoe.manifestMs, errors: qoe.errors, fatalErrors: qoe.fatalErrors,
+            stallCount: qoe.stallCount + (ongoing ? 1 : 0), stallMs: qoe.stallMs + ongoing,
+            watchMs: qoe.firstPlaying === null ? 0 : t - qoe.firstPlaying,
+            droppedFrames: dropped, totalFrames: frames,
+            events: ordered, eventsTotal: qoe.total,
+        };
+    };
+
+    qoe.firstFrameInfo = () => ({
+        firstFrame: qoe.firstFrame, source: qoe.firstFrameSource, playRequested: qoe.playRequested,
+    });
+})();
+"""
+
+
+CLOCK_DEPENDENT_METRICS = (
+    "rebufferDuration", "qoeStallRatio", "qoeAvgSegmentLoadTime", "qoeAvgThroughput",
+    "qoeMinThroughput", "qoeManifestLoadTime",
+)
+"""Поля QoE, измеренные по performance.now(): поддельные часы (--popup-fast-forward clock) добавляют в них симулированное время"""
+
+
+def install_video_qoe(context, buffer_size: int = config.QOE_EVENT_BUFFER_SIZE) -> None:
+    """Ставит движок QoE в контекст браузера (действует на все последующие страницы)."""
+    context.add_init_script(QOE_INIT_SCRIPT % {"limit": buffer_size})
+
+
+def summarize_video_qoe(raw: dict) -> dict:
+    """
+    Превращает сырые счётчики движка в поля шага film_page.
+
+    rebufferCount/rebufferDuration считаются по парам waiting → playing после
+    старта воспроизведения; qoeStallRatio — доля времени просмотра в остановках.
+    """
+    segments = raw.get("segments", 0)
+    segment_ms = raw.get("segmentMs", 0)
+    watch_ms = raw.get("watchMs", 0)
+    stall_ms = raw.get("stallMs", 0)
+    total_frames = raw.get("totalFrames", 0)
+    avg_bitrate = raw.get("avgBitrate")
+    return {
+        "rebufferCount": raw.get("stallCount", 0),
+        "rebufferDuration": round(stall_ms),
+        "qoeStallRatio": round(stall_ms / watch_ms * 100, 2) if watch_ms else None,
+        "qoeSegmentsLoaded": segments,
+        "qoeAvgSegmentLoadTime": round(segment_ms / segments) if segments else None,
+        "qoeAvgThroughput": round(raw.get("segmentBytes", 0) * 8 / segment_ms) if segment_ms else None,
+        "qoeMinThroughput": raw.get("minKbps"),
+        "qoeManifestLoadTime": raw.get("manifestMs"),
+        "qoeBitrateSwitches": raw.get("switches", 0),
+        "qoeAvgBitrate": round(avg_bitrate) if avg_bitrate is not None else None,
+        "qoeLastBitrate": raw.get("bitrate"),
+        "qoeDroppedFrames": raw.get("droppedFrames", 0),
+        "qoeDroppedFramesRatio": round(raw.get("droppedFrames", 0) / total_frames * 100, 2) if total_frames else None,
+        "qoeErrors": raw.get("errors", 0),
+        "qoeFatalErrors": raw.get("fatalErrors", 0),
+    }
+
+
+def is_video_playing(page) -> bool:
+    """Проверяет, воспроизводится ли уже видео на странице (например, при автозапуске)."""
+    return page.evaluate("""
+        () => Array.from(document.querySelectorAll('video')).some(v => !v.paused && !v.ended)
+    """)
+
+
+def wait_for_first_frame(page, timeout_ms: int = config.FIRST_FRAME_TIMEOUT_MS) -> dict:
+    """
+    Ждёт отрисовки первого кадра после старта воспроизведения.
+
+    Возвращает:
+        timeToFirstFrame: мс от navigationStart до первого кадра
+        firstFrameAfterPlay: мс от события play до первого кадра
+        firstFrameSource: "rvfc" (requestVideoFrameCallback) или "timeupdate"
+    Если кадр не отрисован за timeout_ms, все значения — None.
+    """
+    result = {"timeToFirstFrame": None, "firstFrameAfterPlay": None, "firstFrameSource": None}
+    try:
+        page.wait_for_function(
+            "() => window.__qoe && window.__qoe.firstFrame !== null",
+            timeout=timeout_ms,
+        )
+    except Exception as e:
+        print(f"[WARN] Первый кадр видео не зафиксирован за {timeout_ms} мс: {e}")
+        return result
+
+    info = page.evaluate("() => window.__qoe.firstFrameInfo()")
+    first_frame = info["firstFrame"]
+    play_requested = info.get("playRequested")
+    result.update({
+        "timeToFirstFrame": round(first_frame),
+        "firstFrameAfterPlay": round(first_frame - play_requested) if play_requested is not None else None,
+        "firstFrameSource": info.get("source"),
+    })
+    return result
+
+
+def collect_video_qoe(page, attach: bool = True) -> Optional[dict]:
+    """
+    Забирает данные движка одним вызовом evaluate и возвращает поля QoE.
+
+    Если движок не установлен на странице, возвращает None.
+    При attach=True последние события буфера прикладываются к allure-отчёту.
+    """
+    raw = page.evaluate("() => window.__qoe ? window.__qoe.collect() : null")
+    if raw is None:
+        print("[WARN] Движок QoE не найден на странице")
+        return None
+    if attach and raw.get("events"):
+        allure.attach(
+            json.dumps(raw["events"], ensure_ascii=False, indent=2),
+            name=f"QoE events ({len(raw['events'])} из {raw.get('eventsTotal', 0)})",
+            attachment_type=allure.attachment_type.JSON,
+        )
+    return summarize_video_qoe(raw)